@@ -0,0 +1,91 @@
+"""
+Recall-vs-latency report for the FAISS index types used by LocalVectorStoreService.
+
+Builds each index type over a synthetic clustered corpus (embedding-like: points
+scattered around random centroids), then measures recall@k against exact flat
+search and the mean single-query latency for a sweep of search parameters.
+Use it to pick nlist/nprobe, M/efSearch and PQ settings for a corpus size.
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_ann_recall --corpus-size 200000 --dim 256
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from src.services.ann_index import IndexConfig, apply_search_params, build_index
+
+def make_corpus(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size=n)
+    return centroids[assignments] + 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def measure(index, queries: np.ndarray, k: int):
+    """Single-query latency (how /chat searches) plus the results for recall."""
+    results = np.empty((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for i, q in enumerate(queries):
+        _, results[i] = index.search(q[None, :], k)
+    return (time.perf_counter() - start) / len(queries) * 1000, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    faiss.omp_set_num_threads(args.threads)
+
+    corpus = make_corpus(args.corpus_size, args.dim, clusters=max(16, args.corpus_size // 500))
+    queries = make_corpus(args.queries, args.dim, clusters=max(16, args.corpus_size // 500), seed=1)
+
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(corpus)
+    _, truth = exact.search(queries, args.k)
+
+    pq_m = next(m for m in (32, 16, 8, 4, 2, 1) if args.dim % m == 0)
+    sweeps = [
+        (IndexConfig("flat"), [{}]),
+        (IndexConfig("ivf_flat", nlist=args.nlist), [{"nprobe": p} for p in (1, 4, 16, 64)]),
+        (IndexConfig("hnsw", hnsw_m=32, ef_construction=200), [{"ef_search": e} for e in (16, 64, 256)]),
+        (IndexConfig("ivf_pq", nlist=args.nlist, pq_m=pq_m), [{"nprobe": p} for p in (4, 16, 64)]),
+    ]
+
+    rows = []
+    print(f"corpus={args.corpus_size} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'index':<10} {'params':<16} {'build s':>8} {'recall@k':>9} {'ms/query':>9}")
+    for config, params_list in sweeps:
+        train_sample = corpus[: min(len(corpus), 50 * config.nlist)]
+        start = time.perf_counter()
+        index = build_index(config, train_sample)
+        index.add(corpus)
+        build_s = time.perf_counter() - start
+        for params in params_list:
+            for name, value in params.items():
+                setattr(config, name, value)
+            apply_search_params(index, config)
+            latency_ms, found = measure(index, queries, args.k)
+            recall = recall_at_k(found, truth)
+            label = ",".join(f"{k}={v}" for k, v in params.items()) or "-"
+            print(f"{config.index_type:<10} {label:<16} {build_s:>8.2f} {recall:>9.3f} {latency_ms:>9.3f}")
+            rows.append({"index_type": config.index_type, "params": params, "build_s": build_s,
+                         "recall_at_k": recall, "latency_ms": latency_ms})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Concurrency benchmark for the async /chat path.
+
+Runs the real FastAPI app in-process (httpx + ASGI transport) against a small
+synthetic index and an LLM with simulated network latency, and reports
+throughput at increasing numbers of concurrent clients. With a non-blocking
+request path, throughput should grow roughly linearly with concurrency until
+CPU-bound work saturates.
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_chat_concurrency --requests 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import httpx
+from langchain_core.documents import Document
+
+from main import app
+from src.dependencies import get_llm_service, get_vector_dao
+from src.dao.vector_dao import VectorDAO
+from src.services.embeddings import LocalEmbeddingService
+from src.services.llm import LocalGenAIService
+from src.services.vector_search import LocalVectorStoreService
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, total_requests: int) -> float:
+    """Send ``total_requests`` chats with ``concurrency`` clients; returns requests/sec."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(f"question {i}")
+
+    async def worker():
+        while True:
+            try:
+                query = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            response = await client.post("/api/v1/chat", json={"query": query})
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total_requests / (time.perf_counter() - start)
+
+async def main(levels, total_requests: int, latency_s: float, corpus_size: int):
+    with tempfile.TemporaryDirectory() as index_dir:
+        vector_svc = LocalVectorStoreService(LocalEmbeddingService(), index_path=index_dir)
+        vector_svc.add_documents(
+            [Document(page_content=f"Synthetic chunk {i}", metadata={"source": f"doc{i % 50}.txt"})
+             for i in range(corpus_size)],
+            persist=False,
+        )
+        vector_dao = VectorDAO(vector_svc)
+        llm_service = LocalGenAIService(latency_s=latency_s)
+        app.dependency_overrides[get_vector_dao] = lambda: vector_dao
+        app.dependency_overrides[get_llm_service] = lambda: llm_service
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Warm-up builds and caches the chain
+            await run_level(client, 1, 5)
+            print(f"LLM latency {latency_s * 1000:.0f} ms, corpus {corpus_size} chunks, {total_requests} requests per level")
+            print(f"{'clients':>8} {'req/s':>10} {'speedup':>8}")
+            baseline = None
+            for concurrency in levels:
+                rps = await run_level(client, concurrency, total_requests)
+                baseline = baseline or rps
+                print(f"{concurrency:>8} {rps:>10.1f} {rps / baseline:>7.1f}x")
+        app.dependency_overrides.clear()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated LLM latency in seconds")
+    parser.add_argument("--corpus-size", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.levels, args.requests, args.latency, args.corpus_size))
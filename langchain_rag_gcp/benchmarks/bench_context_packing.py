@@ -0,0 +1,117 @@
+"""
+Prompt size with and without context packing.
+
+Ingests a synthetic knowledge base (1000-char chunks with 200-char overlap, and
+a share of documents that are lightly edited copies of others, as wikis and
+ticket exports tend to have) into a LocalVectorStoreService with the hashing
+embeddings, then for each query retrieves the top k chunks and compares:
+
+- naive:   the chunks joined as retrieved (the old format_docs)
+- packed:  ContextPacker: adjacent chunks merged, near-duplicates dropped,
+           packed into the token budget
+
+It reports mean context tokens, packing time, and how often the content of the
+chunk the query was drawn from is still in the context (80% of its word
+shingles, so a kept near-duplicate counts).
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_context_packing --docs 500 --k 8 --max-tokens 2000
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.ingestion.pipeline import IngestionPipeline
+from src.services.context import ContextPacker, estimate_tokens
+from src.services.embeddings import HashingEmbeddingService
+from src.services.vector_search import LocalVectorStoreService
+
+def make_documents(n: int, words: int, vocab_size: int, copy_rate: float, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    texts = []
+    for i in range(n):
+        if texts and rng.random() < copy_rate:
+            # A lightly edited copy of an earlier document
+            base = rng.choice(texts).split()
+            for _ in range(max(1, len(base) // 50)):
+                base[rng.randrange(len(base))] = rng.choice(vocab)
+            texts.append(" ".join(base))
+            continue
+        sentences = []
+        for _ in range(words // 12):
+            sentences.append(" ".join(rng.choices(vocab, weights=weights, k=12)) + ".")
+        texts.append(" ".join(sentences))
+    return texts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--words", type=int, default=1200, help="Words per document")
+    parser.add_argument("--vocab", type=int, default=5000)
+    parser.add_argument("--copy-rate", type=float, default=0.2, help="Share of documents that are edited copies")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    pipeline = IngestionPipeline.__new__(IngestionPipeline)
+    pipeline.text_splitter = splitter
+    chunks = []
+    for i, text in enumerate(make_documents(args.docs, args.words, args.vocab, args.copy_rate)):
+        chunks += pipeline.split_content(f"doc-{i}.txt", text.encode("utf-8"))
+
+    rng = random.Random(1)
+    packer = ContextPacker(max_tokens=args.max_tokens)
+    with tempfile.TemporaryDirectory() as index_dir:
+        store = LocalVectorStoreService(HashingEmbeddingService(), index_path=index_dir)
+        store.add_documents(chunks, persist=False)
+        targets = [rng.randrange(len(chunks)) for _ in range(args.queries)]
+        queries = [" ".join(rng.sample(chunks[t].page_content.split(), 12)) for t in targets]
+        retrieved = store.similarity_search_batch(queries, k=args.k)
+
+    naive_tokens, packed_tokens, pack_ms, naive_kept, packed_kept = [], [], [], 0, 0
+    for target, docs in zip(targets, retrieved):
+        naive = "\n\n".join(d.page_content for d in docs)
+        start = time.perf_counter()
+        packed = packer.format(docs)
+        pack_ms.append((time.perf_counter() - start) * 1000)
+        naive_tokens.append(estimate_tokens(naive))
+        packed_tokens.append(estimate_tokens(packed))
+        # The target's content is in the context: most of its word shingles appear
+        # (a kept near-duplicate from an edited copy counts)
+        wanted = packer._shingles(chunks[target].page_content)
+        naive_kept += np.isin(wanted, packer._shingles(naive)).mean() >= 0.8
+        packed_kept += np.isin(wanted, packer._shingles(packed)).mean() >= 0.8
+
+    result = {
+        "chunks": len(chunks),
+        "naive_tokens": float(np.mean(naive_tokens)),
+        "packed_tokens": float(np.mean(packed_tokens)),
+        "reduction": 1 - float(np.mean(packed_tokens)) / float(np.mean(naive_tokens)),
+        "pack_ms_p50": float(np.percentile(pack_ms, 50)),
+        "pack_ms_p99": float(np.percentile(pack_ms, 99)),
+        "target_in_context_naive": naive_kept / len(targets),
+        "target_in_context_packed": packed_kept / len(targets),
+    }
+    print(f"{len(chunks)} chunks, k={args.k}, budget {args.max_tokens} tokens, {args.queries} queries")
+    print(f"context tokens: naive {result['naive_tokens']:.0f}, packed {result['packed_tokens']:.0f} "
+          f"({result['reduction'] * 100:.1f}% fewer)")
+    print(f"packing: p50 {result['pack_ms_p50']:.2f} ms, p99 {result['pack_ms_p99']:.2f} ms")
+    print(f"source chunk in context: naive {result['target_in_context_naive']:.3f}, "
+          f"packed {result['target_in_context_packed']:.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": result}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
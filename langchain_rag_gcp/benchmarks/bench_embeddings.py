@@ -0,0 +1,95 @@
+"""
+Throughput and retrieval sanity check for the local embedding backends.
+
+Times ``embed_documents`` at several batch sizes for HashingEmbeddings (the
+deterministic default) and FakeEmbeddings (random vectors), then checks that the
+vectors are usable for retrieval: each query is a shuffled half of one corpus
+text plus noise words, and hit@1 is the share of queries whose nearest text
+(by cosine) is the one they were drawn from. Random vectors score ~1/corpus.
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_embeddings --texts 20000 --batch-sizes 1 32 256 2048
+"""
+import argparse
+import hashlib
+import json
+import random
+import time
+
+import numpy as np
+from langchain_community.embeddings import FakeEmbeddings
+
+from src.services.embeddings import HashingEmbeddings
+
+def make_texts(n: int, words: int, vocab_size: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"word{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    return [" ".join(rng.choices(vocab, weights=weights, k=words)) for _ in range(n)]
+
+def throughput(model, texts, batch_size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        model.embed_documents(texts[i:i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+def hit_at_1(model, corpus, queries, sources) -> float:
+    docs = np.asarray(model.embed_documents(corpus), dtype=np.float32)
+    found = np.asarray(model.embed_documents(queries), dtype=np.float32)
+    docs /= np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    found /= np.maximum(np.linalg.norm(found, axis=1, keepdims=True), 1e-12)
+    return float(np.mean((found @ docs.T).argmax(axis=1) == sources))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=20_000)
+    parser.add_argument("--words", type=int, default=150, help="Words per text")
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 256, 2048])
+    parser.add_argument("--corpus", type=int, default=5_000, help="Texts searched in the hit@1 check")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts, args.words, args.vocab)
+    models = {"hashing": HashingEmbeddings(size=args.dim), "fake": FakeEmbeddings(size=args.dim)}
+
+    rows = []
+    print(f"{'model':>8} {'batch':>6} {'texts/s':>10}")
+    for name, model in models.items():
+        for batch_size in args.batch_sizes:
+            # Batch size 1 is slow for every backend; a slice is enough to time it
+            sample = texts if batch_size > 1 else texts[:2000]
+            rate = throughput(model, sample, batch_size)
+            print(f"{name:>8} {batch_size:>6} {rate:>10.0f}")
+            rows.append({"model": name, "batch_size": batch_size, "texts_per_s": rate})
+
+    rng = random.Random(1)
+    corpus = texts[:args.corpus]
+    sources = np.array([rng.randrange(len(corpus)) for _ in range(args.queries)])
+    noise = make_texts(args.queries, args.words // 4, args.vocab, seed=2)
+    queries = []
+    for source, extra in zip(sources, noise):
+        words = corpus[source].split()
+        rng.shuffle(words)
+        queries.append(" ".join(words[:len(words) // 2]) + " " + extra)
+
+    quality = {name: hit_at_1(model, corpus, queries, sources) for name, model in models.items()}
+    for name, score in quality.items():
+        print(f"{name:>8} hit@1 {score:.3f}")
+
+    # Same text, same vector: a fresh instance reproduces the digest exactly
+    digest = lambda m: hashlib.sha256(np.asarray(m.embed_documents(texts[:100]), dtype=np.float32).tobytes()).hexdigest()
+    deterministic = digest(models["hashing"]) == digest(HashingEmbeddings(size=args.dim))
+    print(f"hashing deterministic across instances: {deterministic}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"args": vars(args), "results": rows, "hit_at_1": quality, "deterministic": deterministic},
+                f, indent=2,
+            )
+
+if __name__ == "__main__":
+    main()
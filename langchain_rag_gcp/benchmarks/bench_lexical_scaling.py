@@ -0,0 +1,79 @@
+"""
+BM25 query latency vs. corpus size for the in-process lexical index.
+
+Builds BM25Index over growing synthetic corpora (Zipf-distributed vocabulary plus
+unique ticket IDs in a fraction of the chunks) and times three query shapes:
+
+- id:        a ticket ID alone, the case hybrid retrieval exists for. Pruning
+             stops after the ID's postings, so latency stays flat as the corpus grows.
+- id+words:  an ID plus common words. The ID fills one slot; the rest of the top k
+             comes from the common words, so block-max pruning reduces but cannot
+             remove the dependence on corpus size.
+- common:    common words only (worst case, roughly linear).
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_lexical_scaling --sizes 10000 50000 200000
+"""
+import argparse
+import json
+import random
+import time
+
+from src.services.lexical_index import BM25Index
+
+def make_corpus(n: int, vocab_size: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    texts = []
+    for i in range(n):
+        words = rng.choices(vocab, weights=weights, k=rng.randint(40, 120))
+        if i % 10 == 0:
+            words.append(f"TCK-{i:07d}")
+        texts.append(" ".join(words))
+    return texts
+
+def make_queries(n_corpus: int, count: int, with_words: bool, seed: int = 1):
+    rng = random.Random(seed)
+    ids = [f"TCK-{rng.randrange(0, n_corpus, 10):07d}" for _ in range(count)]
+    if not with_words:
+        return ids
+    # An ID plus a couple of very common words, like "status of TCK-0001230 refund"
+    return [f"{ticket} term0 term1 term{rng.randint(2, 50)}" for ticket in ids]
+
+def time_queries(index: BM25Index, queries, k: int) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, k)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'docs':>9} {'build s':>8} {'id ms':>8} {'id+words ms':>12} {'common ms':>10}")
+    for size in args.sizes:
+        texts = make_corpus(size, args.vocab)
+        start = time.perf_counter()
+        index = BM25Index()
+        index.add([f"doc-{i}" for i in range(size)], texts)
+        build_s = time.perf_counter() - start
+
+        id_ms = time_queries(index, make_queries(size, args.queries, with_words=False), args.k)
+        mixed_ms = time_queries(index, make_queries(size, args.queries, with_words=True), args.k)
+        common_ms = time_queries(index, ["term0 term1 term2"] * max(1, args.queries // 10), args.k)
+        print(f"{size:>9} {build_s:>8.2f} {id_ms:>8.3f} {mixed_ms:>12.3f} {common_ms:>10.3f}")
+        rows.append({"docs": size, "build_s": build_s, "id_ms": id_ms, "id_words_ms": mixed_ms, "common_ms": common_ms})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
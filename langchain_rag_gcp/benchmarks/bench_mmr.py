@@ -0,0 +1,123 @@
+"""
+Cost and effect of MMR re-ranking on top of vector search.
+
+Indexes a synthetic corpus in which every passage has a few near-identical
+variants (re-posted FAQ answers, overlapping chunks) with the hashing embeddings,
+then for each query compares plain top-k with mmr_search over ``fetch_k``
+candidates:
+
+- latency per query (search + candidate vectors + re-ranking)
+- re-ranking alone (reranking.rerank on the fetched candidates)
+- redundancy: mean pairwise cosine among the k results, and the share of
+  results that are variants of an earlier result
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_mmr --passages 5000 --fetch-k 200 --k 5
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.services.embeddings import HashingEmbeddingService
+from src.services.reranking import rerank
+from src.services.vector_search import LocalVectorStoreService
+
+def make_passages(n: int, variants: int, words: int, vocab_size: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    docs = []
+    for i in range(n):
+        base = rng.choices(vocab, weights=weights, k=words)
+        for v in range(variants):
+            text = list(base)
+            for _ in range(max(1, words // 20)):
+                text[rng.randrange(words)] = rng.choice(vocab)
+            docs.append(Document(page_content=" ".join(text), id=f"p{i}-v{v}"))
+    return docs
+
+def redundancy(embeddings, docs):
+    if len(docs) < 2:
+        return 0.0, 0.0
+    vectors = np.asarray(embeddings.embed_documents([d.page_content for d in docs]))
+    similarity = vectors @ vectors.T
+    pairwise = similarity[np.triu_indices(len(docs), 1)].mean()
+    groups = [d.id.split("-")[0] for d in docs]
+    repeats = sum(group in groups[:i] for i, group in enumerate(groups)) / len(docs)
+    return float(pairwise), repeats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--passages", type=int, default=5000, help="Distinct passages (each with --variants copies)")
+    parser.add_argument("--variants", type=int, default=3)
+    parser.add_argument("--words", type=int, default=60)
+    parser.add_argument("--vocab", type=int, default=20_000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--fetch-k", type=int, default=200)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    docs = make_passages(args.passages, args.variants, args.words, args.vocab)
+    embed_svc = HashingEmbeddingService()
+    embeddings = embed_svc.get_embeddings_model()
+    rng = random.Random(1)
+    queries = [" ".join(rng.sample(rng.choice(docs).page_content.split(), 10)) for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        store = LocalVectorStoreService(embed_svc, index_path=index_dir)
+        store.add_documents(docs, persist=False)
+        for q in queries:
+            # Warm the query-embedding path so both modes measure search cost
+            embeddings.embed_query(q)
+
+        rows = {}
+        for mode in ("similarity", "mmr"):
+            latencies, pairwise, repeats = [], [], []
+            for q in queries:
+                start = time.perf_counter()
+                if mode == "mmr":
+                    found = store.mmr_search(q, k=args.k, fetch_k=args.fetch_k, lambda_mult=args.lambda_mult)
+                else:
+                    found = store.similarity_search(q, k=args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                p, r = redundancy(embeddings, found)
+                pairwise.append(p)
+                repeats.append(r)
+            rows[mode] = {
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "mean_pairwise_cosine": float(np.mean(pairwise)),
+                "repeated_passages": float(np.mean(repeats)),
+            }
+
+        rerank_ms = []
+        for q in queries:
+            query_vector = embeddings.embed_query(q)
+            candidates, vectors = store.search_candidates(query_vector, args.fetch_k)
+            start = time.perf_counter()
+            rerank(q, query_vector, [d for d, _ in candidates], vectors, args.k, args.lambda_mult)
+            rerank_ms.append((time.perf_counter() - start) * 1000)
+        rows["rerank_only"] = {
+            "p50_ms": float(np.percentile(rerank_ms, 50)),
+            "p99_ms": float(np.percentile(rerank_ms, 99)),
+        }
+
+    print(f"{args.passages} passages x {args.variants} variants, k={args.k}, fetch_k={args.fetch_k}, lambda={args.lambda_mult}")
+    print(f"{'mode':>12} {'p50 ms':>8} {'p99 ms':>8} {'pair cos':>9} {'repeats':>8}")
+    for mode, row in rows.items():
+        print(f"{mode:>12} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+              f"{row.get('mean_pairwise_cosine', float('nan')):>9.3f} {row.get('repeated_passages', float('nan')):>8.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+End-to-end RAG performance suite with machine-readable results.
+
+Generates a synthetic corpus (Zipf-distributed vocabulary, each document with a
+few words of its own so questions have a right answer), then measures:
+
+- ingestion:  files/sec and chunks/sec through IngestionPipeline into a fresh
+              LocalVectorStoreService, snapshot write time and index size on disk
+- index:      embedding and FAISS build time for the chunk vectors alone
+- recall:     recall@k of the configured index type against exact search over
+              the same vectors (1.0 for "flat" by construction)
+- chat:       /chat latency p50/p95/p99 and throughput at each concurrency level,
+              through the real FastAPI app with a simulated LLM latency
+
+Everything is written to one JSON file (with the git commit, Python and CPU
+count) so runs can be compared; ``--baseline old.json`` prints the relative
+change of every metric against an earlier run.
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_rag_suite --docs 2000 --index-type hnsw --output results.json
+    python -m benchmarks.bench_rag_suite --docs 2000 --index-type hnsw --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+import faiss
+import httpx
+import numpy as np
+
+from main import app
+from src.dependencies import get_answer_cache, get_embedding_service, get_llm_service, get_vector_dao
+from src.dao.document_dao import DocumentDAO
+from src.dao.vector_dao import VectorDAO
+from src.ingestion.pipeline import IngestionPipeline
+from src.services.ann_index import IndexConfig, build_index
+from src.services.answer_cache import SemanticAnswerCache
+from src.services.embeddings import HashingEmbeddingService
+from src.services.llm import LocalGenAIService
+from src.services.storage import LocalStorageService
+from src.services.vector_search import LocalVectorStoreService
+
+def make_corpus(storage: LocalStorageService, docs: int, words: int, vocab_size: int, seed: int = 0):
+    """Write ``docs`` files into ``storage``; returns their texts."""
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    texts = []
+    for i in range(docs):
+        body = rng.choices(vocab, weights=weights, k=words)
+        # A handful of words only this document uses
+        body += [f"doc{i}topic{j}" for j in range(5)]
+        rng.shuffle(body)
+        text = " ".join(body)
+        storage.upload_file(f"corpus/{i // 1000:03d}/doc-{i:06d}.txt", text.encode("utf-8"))
+        texts.append(text)
+    return texts
+
+def make_queries(texts, count: int, seed: int = 1):
+    """A question per sampled document: a few of its words, including one of its own."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        i = rng.randrange(len(texts))
+        words = rng.sample(texts[i].split(), 6)
+        queries.append(" ".join(words + [f"doc{i}topic{rng.randrange(5)}"]))
+    return queries
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def stored_chunks(service: LocalVectorStoreService):
+    """(ids, texts) of every stored chunk in index position order."""
+    store = service.vector_store
+    ids = [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+    return ids, [store.docstore.search(doc_id).page_content for doc_id in ids]
+
+def bench_ingestion(args, workdir: str, embed_svc):
+    storage = LocalStorageService(base_path=os.path.join(workdir, "raw"))
+    start = time.perf_counter()
+    texts = make_corpus(storage, args.docs, args.words, args.vocab)
+    corpus_s = time.perf_counter() - start
+
+    index_path = os.path.join(workdir, "index")
+    vector_svc = LocalVectorStoreService(
+        embed_svc, index_path=index_path, index_config=IndexConfig(index_type=args.index_type)
+    )
+    pipeline = IngestionPipeline(DocumentDAO(storage), VectorDAO(vector_svc))
+    report = pipeline.run_full_ingestion(parallel=True, embed_batch_size=args.embed_batch_size)
+    # The run persisted at the end; time one more full snapshot on its own
+    start = time.perf_counter()
+    vector_svc.persistence.write_snapshot(vector_svc.vector_store)
+    snapshot_s = time.perf_counter() - start
+    result = {
+        "corpus_s": corpus_s,
+        "files": report.files,
+        "chunks": report.chunks,
+        "failed": report.failed,
+        "elapsed_s": report.elapsed_s,
+        "files_per_sec": report.files_per_sec,
+        "chunks_per_sec": report.chunks_per_sec,
+        "snapshot_s": snapshot_s,
+        "index_bytes": dir_size(index_path),
+        "raw_bytes": dir_size(storage.base_path),
+    }
+    return vector_svc, texts, result
+
+def bench_index(args, vector_svc: LocalVectorStoreService, embeddings):
+    ids, chunk_texts = stored_chunks(vector_svc)
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(chunk_texts), dtype=np.float32)
+    embed_s = time.perf_counter() - start
+    start = time.perf_counter()
+    index = build_index(IndexConfig(index_type=args.index_type), vectors)
+    index.add(vectors)
+    build_s = time.perf_counter() - start
+    result = {
+        "vectors": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "embed_s": embed_s,
+        "embed_per_sec": len(vectors) / embed_s if embed_s > 0 else 0.0,
+        "build_s": build_s,
+    }
+    return ids, vectors, result
+
+def bench_recall(args, vector_svc: LocalVectorStoreService, embeddings, ids, vectors, queries):
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(query_vectors, args.k)
+
+    start = time.perf_counter()
+    found = vector_svc.similarity_search_by_vectors_with_score(query_vectors.tolist(), args.k)
+    search_ms = (time.perf_counter() - start) / len(queries) * 1000
+    hits = sum(
+        len({doc.id for doc, _ in row} & {ids[p] for p in positions if p >= 0})
+        for row, positions in zip(found, truth)
+    )
+    return {"k": args.k, "queries": len(queries), "recall_at_k": hits / truth.size, "batch_search_ms_per_query": search_ms}
+
+async def run_level(client: httpx.AsyncClient, queries, concurrency: int):
+    """Send ``queries`` with ``concurrency`` clients; returns per-request latencies (ms) and elapsed s."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for query in queries:
+        queue.put_nowait(query)
+    latencies = []
+
+    async def worker():
+        while True:
+            try:
+                query = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            response = await client.post("/api/v1/chat", json={"query": query})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+async def bench_chat(args, vector_svc: LocalVectorStoreService, embed_svc, queries):
+    vector_dao = VectorDAO(vector_svc)
+    llm_service = LocalGenAIService(latency_s=args.latency)
+    app.dependency_overrides[get_vector_dao] = lambda: vector_dao
+    app.dependency_overrides[get_llm_service] = lambda: llm_service
+    app.dependency_overrides[get_embedding_service] = lambda: embed_svc
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Warm-up builds and caches the chain
+            await run_level(client, ["warm up"] * 5, 1)
+            for level, concurrency in enumerate(args.concurrency):
+                # A fresh answer cache and unseen queries per level, so every request
+                # runs the whole chain
+                answer_cache = SemanticAnswerCache()
+                app.dependency_overrides[get_answer_cache] = lambda: answer_cache
+                level_queries = queries[level * args.requests:(level + 1) * args.requests]
+                latencies, elapsed = await run_level(client, level_queries, concurrency)
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                rows.append({
+                    "concurrency": concurrency,
+                    "requests": len(latencies),
+                    "req_per_sec": len(latencies) / elapsed,
+                    "p50_ms": float(p50),
+                    "p95_ms": float(p95),
+                    "p99_ms": float(p99),
+                    "max_ms": float(max(latencies)),
+                })
+    finally:
+        app.dependency_overrides.clear()
+    return rows
+
+def environment(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "faiss": faiss.__version__,
+        "args": vars(args),
+    }
+
+def flatten(results, prefix: str = ""):
+    """{"a": {"b": 1}} -> {"a.b": 1}; chat levels are keyed by concurrency."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, list):
+            for row in value:
+                flat.update(flatten({k: v for k, v in row.items() if k != "concurrency"}, f"{prefix}{key}.c{row['concurrency']}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+def compare(baseline, results) -> None:
+    old, new = flatten(baseline["results"]), flatten(results)
+    print(f"\n{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in sorted(new.keys() & old.keys()):
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+        print(f"{key:<40} {old[key]:>12.4g} {new[key]:>12.4g} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=400, help="Words per document")
+    parser.add_argument("--vocab", type=int, default=20_000)
+    parser.add_argument("--index-type", default="flat", choices=["flat", "hnsw", "ivf_flat", "ivf_pq"])
+    parser.add_argument("--embed-batch-size", type=int, default=512)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500, help="Queries for recall@k")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="/chat requests per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated LLM latency in seconds")
+    parser.add_argument("--output", default="rag_suite_results.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    embed_svc = HashingEmbeddingService()
+    embeddings = embed_svc.get_embeddings_model()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        vector_svc, texts, results["ingestion"] = bench_ingestion(args, workdir, embed_svc)
+        ing = results["ingestion"]
+        print(
+            f"ingestion: {ing['files']} files, {ing['chunks']} chunks in {ing['elapsed_s']:.2f}s "
+            f"({ing['files_per_sec']:.0f} files/s, {ing['chunks_per_sec']:.0f} chunks/s), "
+            f"snapshot {ing['snapshot_s']:.2f}s, {ing['index_bytes'] / 2 ** 20:.1f} MiB on disk"
+        )
+
+        ids, vectors, results["index"] = bench_index(args, vector_svc, embeddings)
+        idx = results["index"]
+        print(f"index: embed {idx['embed_s']:.2f}s ({idx['embed_per_sec']:.0f}/s), {args.index_type} build {idx['build_s']:.2f}s")
+
+        queries = make_queries(texts, max(args.queries, args.requests * len(args.concurrency)))
+        results["recall"] = bench_recall(args, vector_svc, embeddings, ids, vectors, queries[:args.queries])
+        print(
+            f"recall@{args.k}: {results['recall']['recall_at_k']:.3f} "
+            f"({results['recall']['batch_search_ms_per_query']:.3f} ms/query batched)"
+        )
+
+        results["chat"] = asyncio.run(bench_chat(args, vector_svc, embed_svc, queries))
+        print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for row in results["chat"]:
+            print(f"{row['concurrency']:>8} {row['req_per_sec']:>8.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+
+    output = {"environment": environment(args), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Single-index vs. sharded scatter-gather query latency.
+
+Loads the same synthetic corpus into one LocalVectorStoreService and into
+ShardedVectorStoreService with 2, 4 and 8 shards (flat indexes, so results are
+identical), then times single queries and a batch. FAISS releases the GIL while
+scanning, so shard searches run on separate cores; the gain is bounded by the
+number of cores and by the per-query merge in Python.
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_sharded_search --corpus-size 200000 --dim 256
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.services.embeddings import EmbeddingService
+from src.services.sharded_vector_search import ShardedVectorStoreService
+from src.services.vector_search import LocalVectorStoreService
+
+class PrecomputedEmbeddings(Embeddings):
+    """Documents are "doc-<row>" and map to a row of a fixed matrix; queries are random."""
+
+    def __init__(self, corpus: np.ndarray, seed: int = 1):
+        self.corpus = corpus
+        self.rng = np.random.default_rng(seed)
+
+    def embed_documents(self, texts):
+        if texts and not texts[0].startswith("doc-"):
+            # Batch search embeds its queries through embed_documents
+            return [self.embed_query(t) for t in texts]
+        return self.corpus[[int(t[4:]) for t in texts]]
+
+    def embed_query(self, text):
+        return self.rng.normal(size=self.corpus.shape[1]).astype(np.float32).tolist()
+
+class PrecomputedEmbeddingService(EmbeddingService):
+    def __init__(self, corpus: np.ndarray):
+        self.model = PrecomputedEmbeddings(corpus)
+
+    def get_embeddings_model(self) -> Embeddings:
+        return self.model
+
+def load(service, n: int, batch: int = 20_000) -> None:
+    for start in range(0, n, batch):
+        service.add_documents(
+            [Document(page_content=f"doc-{i}", id=f"id-{i}") for i in range(start, min(n, start + batch))],
+            persist=False,
+        )
+
+def time_queries(service, queries, k: int) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        service.similarity_search(q, k=k)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-size", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads per search")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    faiss.omp_set_num_threads(args.threads)
+
+    corpus = np.random.default_rng(0).normal(size=(args.corpus_size, args.dim)).astype(np.float32)
+    embed_svc = PrecomputedEmbeddingService(corpus)
+    queries = [f"query {i}" for i in range(args.queries)]
+
+    rows = []
+    print(f"corpus={args.corpus_size} dim={args.dim} k={args.k} faiss_threads={args.threads}")
+    print(f"{'shards':>6} {'ms/query':>9} {'batch ms/query':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        services = [(1, LocalVectorStoreService(embed_svc, index_path=f"{tmp}/single"))]
+        services += [
+            (n, ShardedVectorStoreService(embed_svc, index_path=f"{tmp}/sharded-{n}", num_shards=n))
+            for n in args.shards
+        ]
+        for shards, service in services:
+            load(service, args.corpus_size)
+            single_ms = time_queries(service, queries, args.k)
+            start = time.perf_counter()
+            service.similarity_search_batch(queries, k=args.k)
+            batch_ms = (time.perf_counter() - start) / len(queries) * 1000
+            print(f"{shards:>6} {single_ms:>9.3f} {batch_ms:>15.3f}")
+            rows.append({"shards": shards, "ms_per_query": single_ms, "batch_ms_per_query": batch_ms})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"corpus_size": args.corpus_size, "dim": args.dim, "results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Host memory of several API workers serving one vector index.
+
+Builds an index of synthetic documents with the hashing embeddings, snapshots it
+and appends ``--log-tail`` more documents to the append log only (writes
+acknowledged since the last snapshot, as after an ingestion job). Then, for each
+worker count and mode, starts that many worker processes which open the index and
+run searches, and reads their memory from /proc/<pid>/smaps_rollup:
+
+- private:  mmap=False, every worker reads its own copy of the index
+- mapped:   mmap=True, shared=False; every worker replays the log tail, which
+            copies the mapped index into its own memory
+- shared:   shared=True; the first worker is the leader (replays the log and
+            publishes a snapshot), the others map that snapshot read-only
+
+PSS (proportional set size) splits shared pages between the processes mapping
+them, so the sum over workers is what they cost the host. USS is the memory
+private to one worker.
+
+In shared mode it also measures how long followers take to serve an update: the
+leader adds ``--update-docs`` documents and flushes, and each follower reports
+when its count includes them.
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_shared_index --docs 50000 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from langchain_core.documents import Document
+
+from src.services.embeddings import HashingEmbeddingService
+from src.services.vector_search import LocalVectorStoreService
+
+MODES = ("private", "mapped", "shared")
+
+CHILD = r"""
+import random, sys, time
+from langchain_core.documents import Document
+from src.services.embeddings import HashingEmbeddingService
+from src.services.vector_search import LocalVectorStoreService
+
+index_path, mode, queries = sys.argv[1], sys.argv[2], int(sys.argv[3])
+kwargs = {"private": {"mmap": False}, "mapped": {}, "shared": {"shared": True, "refresh_interval_s": 0.05}}[mode]
+store = LocalVectorStoreService(HashingEmbeddingService(), index_path=index_path, **kwargs)
+rng = random.Random(0)
+vocab = [f"term{i}" for i in range(20_000)]
+for _ in range(queries):
+    store.similarity_search(" ".join(rng.choices(vocab, k=8)), k=5)
+print(f"ready {int(store.is_leader)} {store.count()}", flush=True)
+for line in sys.stdin:
+    command, arg = line.split()
+    if command == "add":
+        start = store.count()
+        store.add_documents([Document(page_content=" ".join(rng.choices(vocab, k=80)), id=f"update-{start + i}")
+                             for i in range(int(arg))])
+        store.flush()
+        print(f"added {time.time()}", flush=True)
+    elif command == "wait":
+        while store.count() < int(arg):
+            time.sleep(0.001)
+        print(f"seen {time.time()}", flush=True)
+    elif command == "exit":
+        break
+store.close()
+"""
+
+def make_docs(n: int, start: int = 0, words: int = 80, vocab_size: int = 20_000, seed: int = 0):
+    rng = random.Random(seed + start)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    return [
+        Document(page_content=" ".join(rng.choices(vocab, k=words)), metadata={"source": f"doc-{i}.txt"}, id=f"doc-{i}")
+        for i in range(start, start + n)
+    ]
+
+def memory_kb(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r", encoding="ascii") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+def start_worker(index_path: str, mode: str, queries: int) -> subprocess.Popen:
+    code = CHILD
+    worker = subprocess.Popen(
+        [sys.executable, "-c", code, index_path, mode, str(queries)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        env=dict(os.environ, PYTHONPATH=os.getcwd()),
+    )
+    line = worker.stdout.readline().split()
+    if not line or line[0] != "ready":
+        raise RuntimeError(f"worker failed to start ({mode})")
+    worker.is_leader = line[1] == "1"
+    worker.count = int(line[2])
+    return worker
+
+def send(worker: subprocess.Popen, command: str) -> str:
+    worker.stdin.write(command + "\n")
+    worker.stdin.flush()
+    return worker.stdout.readline()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=50_000, help="Documents in the snapshot")
+    parser.add_argument("--log-tail", type=int, default=1000, help="Documents only in the append log")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--queries", type=int, default=50, help="Searches per worker before measuring")
+    parser.add_argument("--update-docs", type=int, default=100)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    embed = HashingEmbeddingService()
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        template = os.path.join(workdir, "template")
+        # No automatic flush: the log tail has to stay out of the snapshot
+        store = LocalVectorStoreService(embed, index_path=template, flush_every=10**9, flush_interval_s=float("inf"))
+        store.add_documents(make_docs(args.docs), persist=False)
+        store.flush()
+        if args.log_tail:
+            store.add_documents(make_docs(args.log_tail, start=args.docs), persist=True)
+        store.close()
+        expected = args.docs + args.log_tail
+
+        for mode in MODES:
+            for count in args.workers:
+                # Each run starts from the same files (the shared leader rewrites them)
+                index_path = os.path.join(workdir, f"{mode}-{count}")
+                shutil.copytree(template, index_path)
+                workers = [start_worker(index_path, mode, args.queries) for _ in range(count)]
+                try:
+                    assert all(w.count == expected for w in workers), [w.count for w in workers]
+                    memory = [memory_kb(w.pid) for w in workers]
+                    row = {
+                        "mode": mode,
+                        "workers": count,
+                        "pss_total_mb": sum(m["pss"] for m in memory) / 1024,
+                        "rss_per_worker_mb": statistics.mean(m["rss"] for m in memory) / 1024,
+                        "uss_per_worker_mb": statistics.mean(m["uss"] for m in memory) / 1024,
+                    }
+                    followers = [w for w in workers if not w.is_leader]
+                    if mode == "shared" and followers:
+                        leader = next(w for w in workers if w.is_leader)
+                        target = expected + args.update_docs
+                        for follower in followers:
+                            follower.stdin.write(f"wait {target}\n")
+                            follower.stdin.flush()
+                        added = float(send(leader, f"add {args.update_docs}").split()[1])
+                        seen = [float(f.stdout.readline().split()[1]) for f in followers]
+                        row["update_visible_ms"] = max(0.0, statistics.median(seen) - added) * 1000
+                    rows.append(row)
+                finally:
+                    for w in workers:
+                        try:
+                            send(w, "exit 0")
+                        except (BrokenPipeError, ValueError):
+                            pass
+                        w.wait()
+                shutil.rmtree(index_path, ignore_errors=True)
+
+    print(f"{args.docs} documents + {args.log_tail} in the log, {embed.model_name}")
+    print(f"{'mode':>8} {'workers':>8} {'host PSS MB':>12} {'RSS/worker':>11} {'USS/worker':>11} {'update ms':>10}")
+    for row in rows:
+        update = f"{row['update_visible_ms']:.0f}" if "update_visible_ms" in row else "-"
+        print(f"{row['mode']:>8} {row['workers']:>8} {row['pss_total_mb']:>12.0f} "
+              f"{row['rss_per_worker_mb']:>11.0f} {row['uss_per_worker_mb']:>11.0f} {update:>10}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
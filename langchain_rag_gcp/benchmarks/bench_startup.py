@@ -0,0 +1,145 @@
+"""
+Import time and cold-start latency of the API.
+
+Builds an index of synthetic documents with the hashing embeddings under
+<tmp>/data/vector_index (the default index path, relative to the working
+directory), then runs each measurement in a fresh interpreter started there:
+
+- import:  time to ``import main``, and which heavy modules it loaded
+           (FAISS, langchain_community, the LangSmith tracing stack, text splitters)
+- lazy:    app without the lifespan hook: latency of the first and second
+           /chat request (the first one builds the index and the chain)
+- warm:    app with the lifespan hook: time until /ready returns 200, then
+           latency of the first and second /chat request
+
+Requests go through fastapi's TestClient, so the numbers exclude the server and
+network but include everything the process does on a cold start.
+
+With --max-import-ms, the benchmark exits with status 1 if the median import time
+is above it or if importing main loads any of the heavy modules, so it can guard
+against regressions in CI.
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_startup --docs 20000 --runs 5 --max-import-ms 1000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from langchain_core.documents import Document
+
+from src.services.embeddings import HashingEmbeddingService
+from src.services.vector_search import LocalVectorStoreService
+
+HEAVY_MODULES = ("faiss", "langchain_community", "langsmith.run_trees", "langchain_text_splitters")
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+result = {"import_ms": (imported - start) * 1000,
+          "heavy": [m for m in HEAVY_MODULES if m in sys.modules]}
+mode = sys.argv[1]
+if mode != "import":
+    from fastapi.testclient import TestClient
+
+    def chat(client):
+        t = time.perf_counter()
+        response = client.post("/api/v1/chat", json={"query": QUERY})
+        assert response.status_code == 200, response.text
+        return (time.perf_counter() - t) * 1000
+
+    if mode == "lazy":
+        client = TestClient(main.app)
+        result["first_chat_ms"] = chat(client)
+        result["second_chat_ms"] = chat(client)
+    else:
+        with TestClient(main.app) as client:
+            while client.get("/ready").status_code != 200:
+                if client.get("/ready").json()["status"] == "failed":
+                    raise SystemExit(client.get("/ready").text)
+                time.sleep(0.005)
+            result["ready_ms"] = (time.perf_counter() - imported) * 1000
+            result["steps"] = client.get("/ready").json()["steps"]
+            result["first_chat_ms"] = chat(client)
+            result["second_chat_ms"] = chat(client)
+print(json.dumps(result))
+"""
+
+def build_index(directory: str, n: int, words: int = 80, vocab_size: int = 20_000, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    docs = [
+        Document(page_content=" ".join(rng.choices(vocab, k=words)), metadata={"source": f"doc-{i}.txt"}, id=f"doc-{i}")
+        for i in range(n)
+    ]
+    store = LocalVectorStoreService(HashingEmbeddingService(), index_path=os.path.join(directory, "data", "vector_index"))
+    store.add_documents(docs)
+    store.persist()
+    return docs[0].page_content.split()[:8]
+
+def run_child(mode: str, cwd: str, query: str) -> dict:
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\nQUERY = {query!r}\n" + CHILD
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    out = subprocess.run([sys.executable, "-c", code, mode], cwd=cwd, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def median(rows, key):
+    return statistics.median(row[key] for row in rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20_000, help="Documents in the index loaded at startup")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per mode; medians are reported")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if the median import time is above this")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        query = " ".join(build_index(workdir, args.docs))
+        for mode in ("import", "lazy", "warm"):
+            rows = [run_child(mode, workdir, query) for _ in range(args.runs)]
+            summary = {"import_ms": median(rows, "import_ms"), "heavy_modules": rows[0]["heavy"]}
+            for key in ("ready_ms", "first_chat_ms", "second_chat_ms"):
+                if key in rows[0]:
+                    summary[key] = median(rows, key)
+            if "steps" in rows[0]:
+                summary["steps_ms"] = {
+                    step: statistics.median(row["steps"][step] for row in rows) * 1000 for step in rows[0]["steps"]
+                }
+            results[mode] = summary
+
+    print(f"{args.docs} documents in the index, median of {args.runs} fresh processes")
+    print(f"import main: {results['import']['import_ms']:.0f} ms, "
+          f"heavy modules loaded: {', '.join(results['import']['heavy_modules']) or 'none'}")
+    lazy, warm = results["lazy"], results["warm"]
+    print(f"without warm-up: first /chat {lazy['first_chat_ms']:.0f} ms, second {lazy['second_chat_ms']:.1f} ms")
+    steps = ", ".join(f"{step} {ms:.0f} ms" for step, ms in warm["steps_ms"].items())
+    print(f"with warm-up:    ready after {warm['ready_ms']:.0f} ms ({steps}); "
+          f"first /chat {warm['first_chat_ms']:.1f} ms, second {warm['second_chat_ms']:.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+    if args.max_import_ms is not None:
+        failures = []
+        if results["import"]["import_ms"] > args.max_import_ms:
+            failures.append(f"import took {results['import']['import_ms']:.0f} ms (limit {args.max_import_ms:.0f} ms)")
+        if results["import"]["heavy_modules"]:
+            failures.append(f"import loaded {', '.join(results['import']['heavy_modules'])}")
+        if failures:
+            print("REGRESSION: " + "; ".join(failures))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Listing cost of LocalStorageService on a large directory tree.
+
+Creates ``--files`` small files spread over ``--dirs`` subdirectories, then times:
+a full recursive listing (names, sizes, mtimes), the same listing with os.walk +
+os.stat (the straightforward alternative), a prefix listing of one subdirectory,
+paging through everything, and changed_since after touching a single file, with
+and without directory pruning.
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_storage_listing --files 100000 --dirs 500
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from src.services.storage import LocalStorageService
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+def walk_and_stat(root: str):
+    files = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            stat = os.stat(path)
+            files.append((os.path.relpath(path, root), stat.st_size, stat.st_mtime_ns))
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--dirs", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = LocalStorageService(base_path=tmp)
+        for i in range(args.files):
+            directory = os.path.join(tmp, f"dir-{i % args.dirs:05d}")
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"file-{i:07d}.txt"), "wb") as f:
+                f.write(b"x")
+        checkpoint = time.time_ns()
+        time.sleep(0.01)
+        storage.upload_file("dir-00007/changed.txt", b"new")
+
+        def page_through():
+            count, token = 0, None
+            while True:
+                page = storage.list_page(page_size=args.page_size, page_token=token)
+                count += len(page.files)
+                token = page.next_page_token
+                if token is None:
+                    return count
+
+        results = {}
+        for label, fn in [
+            ("iter_files", lambda: sum(1 for _ in storage.iter_files())),
+            ("os.walk + stat", lambda: len(walk_and_stat(tmp))),
+            ("prefix (1 dir)", lambda: sum(1 for _ in storage.iter_files(prefix="dir-00003/"))),
+            (f"paged ({args.page_size}/page)", page_through),
+            ("changed_since", lambda: sum(1 for _ in storage.changed_since(checkpoint))),
+            ("changed_since (prune_dirs)", lambda: sum(1 for _ in storage.changed_since(checkpoint, prune_dirs=True))),
+        ]:
+            count, ms = timed(fn)
+            results[label] = {"files": count, "ms": ms}
+            print(f"{label:<26} {count:>8} files {ms:>10.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"files": args.files, "dirs": args.dirs, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Peak memory of whole-file vs. streamed chunking for growing files.
+
+Writes synthetic log files of increasing size, then measures the peak Python
+allocation (tracemalloc) of splitting each one with IngestionPipeline.split_content
+(whole file in memory) and with IngestionPipeline.iter_chunks (streamed). Chunks
+are consumed and dropped, as the batched embed/store loop does, so the numbers
+show the read/decode/split cost only.
+
+Usage (from the langchain_rag_gcp directory):
+    python -m benchmarks.bench_streaming_ingest --sizes-mb 16 64 256
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+
+from src.dao.document_dao import DocumentDAO
+from src.ingestion.manifest import IngestionManifest
+from src.ingestion.pipeline import IngestionPipeline
+from src.services.storage import LocalStorageService
+
+def write_log(storage: LocalStorageService, name: str, size_mb: int) -> None:
+    rng = random.Random(0)
+    words = ["request", "served", "error", "timeout", "user", "café", "retry", "ok", "✓"]
+    lines = [" ".join(rng.choice(words) for _ in range(12)) for _ in range(2000)]
+    block = ("\n".join(lines) + "\n\n").encode()
+    with open(f"{storage.base_path}/{name}", "wb") as f:
+        for _ in range(size_mb * (1 << 20) // len(block) + 1):
+            f.write(block)
+
+def measure(run) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return chunks, elapsed, peak / (1 << 20)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'file MB':>8} {'chunks':>8} {'whole peak MB':>14} {'whole s':>8} {'stream peak MB':>15} {'stream s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = LocalStorageService(base_path=tmp)
+        pipeline = IngestionPipeline(DocumentDAO(storage), vector_dao=None)
+        for size_mb in args.sizes_mb:
+            name = f"log-{size_mb}.txt"
+            write_log(storage, name, size_mb)
+
+            def whole():
+                return len(pipeline.split_content(name, storage.read_file(name)))
+
+            def streamed():
+                with storage.open_stream(name) as stream:
+                    content_hash = IngestionManifest.content_hash_stream(stream)
+                return sum(1 for _ in pipeline.iter_chunks(name, content_hash))
+
+            chunks, whole_s, whole_mb = measure(whole)
+            _, stream_s, stream_mb = measure(streamed)
+            print(f"{size_mb:>8} {chunks:>8} {whole_mb:>14.1f} {whole_s:>8.2f} {stream_mb:>15.1f} {stream_s:>9.2f}")
+            rows.append({
+                "file_mb": size_mb, "chunks": chunks,
+                "whole_peak_mb": whole_mb, "whole_s": whole_s,
+                "stream_peak_mb": stream_mb, "stream_s": stream_s,
+            })
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,120 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
 try:
     from .src.api.routes import router as chat_router
+    from .src.api.ingestion_routes import router as ingestion_router
+    from .src.dependencies import (
+        get_answer_cache, get_embedding_service, get_ingestion_jobs, get_vector_dao, get_vector_service,
+    )
+    from .src.services.metrics import CONTENT_TYPE, REGISTRY
+    from .src.startup import WarmupState, warm_up
 except ImportError:
     from src.api.routes import router as chat_router
+    from src.api.ingestion_routes import router as ingestion_router
+    from src.dependencies import (
+        get_answer_cache, get_embedding_service, get_ingestion_jobs, get_vector_dao, get_vector_service,
+    )
+    from src.services.metrics import CONTENT_TYPE, REGISTRY
+    from src.startup import WarmupState, warm_up
 
-app = FastAPI(title="LangChain RAG GCP Simulation")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in a thread so the port opens at once; /ready turns 200 when it's done.
+    # Overridden dependencies are warmed instead of the defaults they replace.
+    app.state.warmup = WarmupState()
+    app.state.warmup_task = asyncio.create_task(
+        asyncio.to_thread(warm_up, app.state.warmup, lambda factory: app.dependency_overrides.get(factory, factory))
+    )
+    yield
+    jobs = _created(get_ingestion_jobs)
+    if jobs is not None:
+        jobs.shutdown()
+    vector_service = _created(get_vector_service)
+    if vector_service is not None and hasattr(vector_service, "close"):
+        # Releases the shared index's leader lock so another worker can take over at once
+        vector_service.close()
+    # Closed services must not be handed out again if the app is restarted in-process
+    for factory in (get_ingestion_jobs, get_vector_dao, get_vector_service):
+        factory.cache_clear()
+
+app = FastAPI(title="LangChain RAG GCP Simulation", lifespan=lifespan)
 
 app.include_router(chat_router, prefix="/api/v1")
+app.include_router(ingestion_router, prefix="/api/v1")
+
+def _created(factory):
+    # Gauges read the singletons only once the app has built them; a scrape must
+    # not load the index or start the job pool
+    return factory() if factory.cache_info().currsize else None
+
+def _cache_stat(factory, key: str, read=lambda service: service):
+    def gauge():
+        service = _created(factory)
+        return None if service is None else read(service).stats()[key]
+    return gauge
+
+def _job_statuses():
+    jobs = _created(get_ingestion_jobs)
+    if jobs is None:
+        return None
+    counts = {(status,): 0 for status in ("queued", "running", "succeeded", "failed", "cancelled")}
+    for job in jobs.list():
+        counts[(job.status,)] += 1
+    return counts
+
+REGISTRY.gauge("rag_index_vectors", "Vectors in the serving index.",
+               lambda: None if _created(get_vector_service) is None else get_vector_service().count())
+REGISTRY.gauge("rag_index_version", "Version of the serving index; changes on every add or delete.",
+               lambda: None if _created(get_vector_service) is None else get_vector_service().index_version)
+REGISTRY.gauge("rag_index_writable", "1 if this process writes the index, 0 for a read-only replica.",
+               lambda: None if _created(get_vector_service) is None else int(get_vector_service().is_writable))
+REGISTRY.gauge("rag_query_embedding_cache_hit_ratio", "Hit rate of the query-embedding LRU cache.",
+               _cache_stat(get_embedding_service, "hit_rate", lambda service: service.cache))
+REGISTRY.gauge("rag_query_embedding_cache_bytes", "Vector bytes held by the query-embedding cache.",
+               _cache_stat(get_embedding_service, "bytes", lambda service: service.cache))
+REGISTRY.gauge("rag_answer_cache_hit_ratio", "Hit rate of the semantic answer cache.",
+               _cache_stat(get_answer_cache, "hit_rate"))
+REGISTRY.gauge("rag_answer_cache_entries", "Live entries in the semantic answer cache.",
+               _cache_stat(get_answer_cache, "entries"))
+def _warmup_state():
+    # Set by the lifespan hook; absent when the app runs without it
+    return getattr(app.state, "warmup", None)
+
+def _ready():
+    state = _warmup_state()
+    return int(state is not None and state.ready)
+
+def _warmup_steps():
+    state = _warmup_state()
+    return None if state is None else {(name,): seconds for name, seconds in state.snapshot()["steps"].items()}
+
+REGISTRY.gauge("rag_ready", "1 once the startup warm-up has finished.", _ready)
+REGISTRY.gauge("rag_warmup_step_seconds", "Duration of each finished startup warm-up step.", _warmup_steps, ("step",))
+REGISTRY.gauge("rag_ingestion_jobs", "Ingestion jobs kept in memory, by status.", _job_statuses, ("status",))
 
 @app.get("/")
 async def root():
     return {
         "message": "LangChain RAG GCP Simulation API",
         "docs": "/docs",
-        "chat_endpoint": "/api/v1/chat"
+        "chat_endpoint": "/api/v1/chat",
+        "ingest_jobs_endpoint": "/api/v1/ingest/jobs",
+        "metrics_endpoint": "/metrics",
+        "ready_endpoint": "/ready"
     }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: per-stage and per-service latency histograms, index and cache gauges."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the index is loaded and the models are warm, 503 before or on failure."""
+    state = _warmup_state()
+    if state is None:
+        # Started without the lifespan hook (e.g. a bare TestClient): nothing warms up
+        return JSONResponse({"status": "pending", "steps": {}, "error": None, "elapsed_s": None}, status_code=503)
+    return JSONResponse(state.snapshot(), status_code=200 if state.ready else 503)
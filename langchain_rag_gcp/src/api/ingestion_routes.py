@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field, field_validator
+from typing import TYPE_CHECKING, List, Optional
+
+from ..dependencies import get_ingestion_jobs
+from ..services.storage import check_file_name
+
+if TYPE_CHECKING:
+    # The job manager module pulls in the ingestion pipeline and text splitters
+    from ..ingestion.jobs import IngestionJob, IngestionJobManager
+
+router = APIRouter()
+
+# Upper bound for explicit file lists in one job; use a prefix for larger sets
+MAX_JOB_FILES = 10_000
+
+class IngestJobRequest(BaseModel):
+    # Explicit files (paths relative to the storage root), or every file under prefix
+    files: Optional[List[str]] = Field(None, min_length=1, max_length=MAX_JOB_FILES)
+    prefix: str = ""
+    # With a prefix: only files modified after this time.time_ns() timestamp
+    changed_since_ns: Optional[int] = Field(None, ge=0)
+    embed_batch_size: int = Field(512, ge=1, le=4096)
+
+    @field_validator("files")
+    @classmethod
+    def _unique_files(cls, files: Optional[List[str]]) -> Optional[List[str]]:
+        # Names must stay under the storage root; a file listed twice is ingested
+        # once, in its first position
+        if files is None:
+            return None
+        return list(dict.fromkeys(check_file_name(name) for name in files))
+
+class IngestJobStatus(BaseModel):
+    id: str
+    status: str
+    error: Optional[str]
+    prefix: str
+    total_files: Optional[int]
+    files_done: int
+    files_skipped: int
+    files_failed: int
+    chunks: int
+    deleted_chunks: int
+    elapsed_s: float
+    files_per_sec: float
+    chunks_per_sec: float
+    eta_s: Optional[float]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+def _status(job: "IngestionJob") -> IngestJobStatus:
+    return IngestJobStatus(**job.to_dict())
+
+def _get_job(jobs: "IngestionJobManager", job_id: str) -> "IngestionJob":
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job {job_id}")
+    return job
+
+@router.post("/ingest/jobs", response_model=IngestJobStatus, status_code=202)
+async def submit_ingest_job(request: IngestJobRequest, jobs: "IngestionJobManager" = Depends(get_ingestion_jobs)):
+    """
+    Queue an ingestion job and return immediately. Poll ``GET /ingest/jobs/{id}``
+    for progress; documents become searchable while the job runs. Answers 409 from
+    a worker that only serves a read-only replica of a shared index.
+    """
+    try:
+        job = jobs.submit(
+            files=request.files,
+            prefix=request.prefix,
+            embed_batch_size=request.embed_batch_size,
+            changed_since_ns=request.changed_since_ns,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _status(job)
+
+@router.get("/ingest/jobs", response_model=List[IngestJobStatus])
+async def list_ingest_jobs(jobs: "IngestionJobManager" = Depends(get_ingestion_jobs)):
+    return [_status(job) for job in jobs.list()]
+
+@router.get("/ingest/jobs/{job_id}", response_model=IngestJobStatus)
+async def get_ingest_job(job_id: str, jobs: "IngestionJobManager" = Depends(get_ingestion_jobs)):
+    return _status(_get_job(jobs, job_id))
+
+@router.delete("/ingest/jobs/{job_id}", response_model=IngestJobStatus)
+async def cancel_ingest_job(job_id: str, jobs: "IngestionJobManager" = Depends(get_ingestion_jobs)):
+    """Cancel a job: queued jobs never start, running ones stop between files."""
+    _get_job(jobs, job_id)
+    return _status(jobs.cancel(job_id))
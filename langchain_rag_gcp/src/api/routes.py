@@ -1,72 +1,298 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List, Optional
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import TYPE_CHECKING, Any, List, NamedTuple, Optional
 
-from ..services.llm import GenAIService
-from ..dao.vector_dao import VectorDAO
+from ..services.metrics import StageTimer, stage
+
+if TYPE_CHECKING:
+    # Only for annotations: importing these loads langchain_community, FAISS and
+    # the LangChain tracing stack, which is left to the first request or warm-up
+    from langchain_core.runnables import Runnable
+    from ..services.llm import GenAIService
+    from ..services.embeddings import EmbeddingService
+    from ..services.answer_cache import SemanticAnswerCache
+    from ..dao.vector_dao import VectorDAO
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     query: str
-    
+
 class ChatResponse(BaseModel):
     answer: str
     sources: List[str]
 
-# Dependency injection for services will be handled via app state or closure if simple, 
-# but for now let's assume they are injected or available.
-# To keep it clean, we can define a get_rag_chain dependency.
+# Upper bounds for /chat/batch
+MAX_BATCH_QUERIES = 1000
+MAX_BATCH_CONCURRENCY = 64
+
+class BatchChatRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_QUERIES)
+    # LLM calls in flight at once
+    max_concurrency: int = Field(8, ge=1, le=MAX_BATCH_CONCURRENCY)
+
+class BatchChatResult(BaseModel):
+    query: str
+    answer: str
+    sources: List[str]
+    generation_ms: float
+    latency_ms: float
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
+    retrieval_ms: float
+    total_ms: float
 
-def get_rag_chain(vector_dao: VectorDAO, llm_service: GenAIService):
+class RAGChain(NamedTuple):
     """
-    Construct the RAG chain.
+    The runnable pieces of the RAG pipeline.
+
+    ``chain`` maps ``{"question", "query_vector"}`` to ``{"docs", "question", "answer"}``
+    so the retrieved documents are captured during the run instead of being searched
+    for again. It searches with the query embedding the route already computed for
+    the answer cache, so each query is embedded once. ``retriever`` searches from
+    the question text alone.
     """
-    retriever = vector_dao.get_retriever(search_kwargs={"k": 3})
-    llm = llm_service.get_llm()
-    
-    template = """Answer the question based only on the following context:
+    chain: "Runnable"
+    retriever: Any
+    answer_chain: "Runnable"
+
+RAG_TEMPLATE = """Answer the question based only on the following context:
     {context}
-    
+
     Question: {question}
     """
-    prompt = ChatPromptTemplate.from_template(template)
-    
-    def format_docs(docs):
-        return "\n\n".join([d.page_content for d in docs])
-
-    chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
+
+# Documents retrieved per query
+RETRIEVER_K = 3
+
+def format_docs(docs):
+    # Adjacent chunks merged, near-duplicates dropped, packed into the token budget
+    return get_context_packer().format(docs)
+
+def build_rag_chain(vector_dao: "VectorDAO", llm_service: "GenAIService") -> RAGChain:
+    """
+    Construct the RAG chain.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnableLambda, RunnableParallel
+    from langchain_core.runnables.passthrough import RunnablePick
+
+    # Generation is timed by a callback so streaming is unaffected
+    retriever = vector_dao.get_retriever(search_kwargs={"k": RETRIEVER_K}).with_config(
+        callbacks=[StageTimer("retrieve")]
     )
-    
-    return chain, retriever
+    llm = llm_service.get_llm().with_config(callbacks=[StageTimer("llm")])
+    prompt = ChatPromptTemplate.from_template(RAG_TEMPLATE)
+
+    def retrieve(inputs):
+        with stage("retrieve"):
+            return vector_dao.search_by_vector(inputs["query_vector"], k=RETRIEVER_K)
+
+    async def aretrieve(inputs):
+        with stage("retrieve"):
+            return await vector_dao.asearch_by_vector(inputs["query_vector"], k=RETRIEVER_K)
 
-from ..dependencies import get_vector_dao, get_llm_service
+    def build_prompt(inputs):
+        with stage("format_prompt"):
+            return prompt.invoke({"context": format_docs(inputs["docs"]), "question": inputs["question"]})
+
+    # {"docs", "question"} -> answer string
+    answer_chain = RunnableLambda(build_prompt) | llm | StrOutputParser()
+
+    # {"question", "query_vector"} -> {"docs", "question", "answer"}: one retrieval,
+    # reused for the answer and the sources
+    chain = RunnableParallel(
+        docs=RunnableLambda(retrieve, afunc=aretrieve), question=RunnablePick("question")
+    ).assign(answer=answer_chain)
+
+    return RAGChain(chain=chain, retriever=retriever, answer_chain=answer_chain)
+
+# Built chains keyed by (DAO, LLM service). Each entry remembers the index version it
+# was built against and is rebuilt only when that version changes.
+_CHAIN_CACHE_SIZE = 8
+_chain_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_chain_cache_lock = threading.Lock()
+
+def get_rag_chain(vector_dao: "VectorDAO", llm_service: "GenAIService") -> RAGChain:
+    """
+    Return the RAG chain for the current index version, building it only when needed.
+    """
+    key = (id(vector_dao), id(llm_service))
+    version = vector_dao.index_version()
+    with _chain_cache_lock:
+        entry = _chain_cache.get(key)
+        # Entries hold references to the DAO/service, so their ids can't be reused
+        if entry is not None and entry[0] is vector_dao and entry[1] is llm_service and entry[2] == version:
+            _chain_cache.move_to_end(key)
+            return entry[3]
+
+    rag_chain = build_rag_chain(vector_dao, llm_service)
+    with _chain_cache_lock:
+        _chain_cache[key] = (vector_dao, llm_service, version, rag_chain)
+        _chain_cache.move_to_end(key)
+        while len(_chain_cache) > _CHAIN_CACHE_SIZE:
+            _chain_cache.popitem(last=False)
+    return rag_chain
+
+def get_sources(docs) -> List[str]:
+    # Deduplicate sources, keeping retrieval order
+    return list(dict.fromkeys(d.metadata.get("source", "unknown") for d in docs))
+
+from ..dependencies import get_vector_dao, get_llm_service, get_embedding_service, get_answer_cache, get_context_packer
+
+def _json_response(model: BaseModel) -> Response:
+    # Serialized here (already validated) so the time shows up as its own stage
+    with stage("serialize"):
+        return Response(content=model.model_dump_json(), media_type="application/json")
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
-    vector_dao: VectorDAO = Depends(get_vector_dao),
-    llm_service: GenAIService = Depends(get_llm_service)
+    vector_dao: "VectorDAO" = Depends(get_vector_dao),
+    llm_service: "GenAIService" = Depends(get_llm_service),
+    embedding_service: "EmbeddingService" = Depends(get_embedding_service),
+    answer_cache: "SemanticAnswerCache" = Depends(get_answer_cache)
+):
+    # Semantic cache: a close paraphrase against the same index version skips the LLM.
+    # The chain retrieves with the same query embedding instead of embedding it again.
+    index_version = vector_dao.index_version()
+    with stage("embed_query"):
+        query_vector = await embedding_service.get_embeddings_model().aembed_query(request.query)
+    with stage("answer_cache"):
+        cached = answer_cache.lookup(query_vector, index_version)
+    if cached is not None:
+        return _json_response(ChatResponse(answer=cached.answer, sources=cached.sources))
+
+    rag_chain = get_rag_chain(vector_dao, llm_service)
+
+    # Run the chain asynchronously end to end; the retrieved documents come back
+    # with the answer
+    result = await rag_chain.chain.ainvoke({"question": request.query, "query_vector": query_vector})
+    sources = get_sources(result["docs"])
+
+    answer_cache.store(query_vector, index_version, result["answer"], sources)
+    return _json_response(ChatResponse(answer=result["answer"], sources=sources))
+
+@router.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(
+    request: BatchChatRequest,
+    vector_dao: "VectorDAO" = Depends(get_vector_dao),
+    llm_service: "GenAIService" = Depends(get_llm_service)
+):
+    """
+    Answer many queries in one request (offline evaluation, bulk QA).
+
+    All queries are embedded in one call and searched with one multi-query FAISS
+    search; answers are generated with at most ``max_concurrency`` LLM calls in
+    flight. Results keep the request order. ``latency_ms`` is measured from the
+    start of the request. The semantic answer cache is bypassed so evaluation runs
+    measure the chain itself.
+    """
+    start = time.perf_counter()
+    rag_chain = get_rag_chain(vector_dao, llm_service)
+    docs_per_query = await vector_dao.asearch_similar_batch(request.queries, k=RETRIEVER_K)
+    retrieval_ms = (time.perf_counter() - start) * 1000
+    semaphore = asyncio.Semaphore(request.max_concurrency)
+
+    async def answer(query: str, docs) -> BatchChatResult:
+        async with semaphore:
+            generation_start = time.perf_counter()
+            error = None
+            try:
+                text = await rag_chain.answer_chain.ainvoke({"docs": docs, "question": query})
+            except Exception as e:
+                # One failed generation shouldn't sink the whole batch
+                text, error = "", str(e)
+            now = time.perf_counter()
+        return BatchChatResult(
+            query=query,
+            answer=text,
+            sources=get_sources(docs),
+            generation_ms=(now - generation_start) * 1000,
+            latency_ms=(now - start) * 1000,
+            error=error,
+        )
+
+    results = await asyncio.gather(*(answer(q, docs) for q, docs in zip(request.queries, docs_per_query)))
+    return BatchChatResponse(
+        results=list(results),
+        retrieval_ms=retrieval_ms,
+        total_ms=(time.perf_counter() - start) * 1000,
+    )
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    vector_dao: "VectorDAO" = Depends(get_vector_dao),
+    llm_service: "GenAIService" = Depends(get_llm_service),
+    embedding_service: "EmbeddingService" = Depends(get_embedding_service),
+    answer_cache: "SemanticAnswerCache" = Depends(get_answer_cache)
 ):
-    chain, retriever = get_rag_chain(vector_dao, llm_service)
-    
-    # Run the chain
-    answer = chain.invoke(request.query)
-    
-    # Retrieve sources for citation (re-running retrieval or capturing it would be better, 
-    # but for simple RAG we can just do a similarity search to get sources explicitly 
-    # if the chain doesn't return them easily without callbacks).
-    # To keep it simple and accurate:
-    docs = vector_dao.search_similar(request.query, k=3)
-    sources = [d.metadata.get("source", "unknown") for d in docs]
-    # Deduplicate sources
-    sources = list(set(sources))
-    
-    return ChatResponse(answer=answer, sources=sources)
+    """
+    Server-Sent Events variant of /chat on the same chain.
+
+    Emits a ``sources`` event as soon as retrieval finishes, then one ``token`` event
+    per model token, then ``done`` with timing metrics (time to first byte and to
+    first token, in milliseconds). Semantic cache hits are sent as a single token.
+    """
+    rag_chain = get_rag_chain(vector_dao, llm_service)
+    start = time.perf_counter()
+
+    async def event_stream():
+        ttfb_ms = None
+        first_token_ms = None
+        token_count = 0
+        index_version = vector_dao.index_version()
+        with stage("embed_query"):
+            query_vector = await embedding_service.get_embeddings_model().aembed_query(request.query)
+        with stage("answer_cache"):
+            cached = answer_cache.lookup(query_vector, index_version)
+        try:
+            if cached is not None:
+                ttfb_ms = first_token_ms = (time.perf_counter() - start) * 1000
+                token_count = 1
+                yield _sse_event("sources", {"sources": cached.sources})
+                yield _sse_event("token", {"token": cached.answer})
+            else:
+                sources, answer_parts = [], []
+                # The chain streams the retrieved docs first, then the answer token by token
+                async for chunk in rag_chain.chain.astream({"question": request.query, "query_vector": query_vector}):
+                    if "docs" in chunk:
+                        ttfb_ms = (time.perf_counter() - start) * 1000
+                        sources = get_sources(chunk["docs"])
+                        yield _sse_event("sources", {"sources": sources})
+                    elif chunk.get("answer"):
+                        if first_token_ms is None:
+                            first_token_ms = (time.perf_counter() - start) * 1000
+                        token_count += 1
+                        answer_parts.append(chunk["answer"])
+                        yield _sse_event("token", {"token": chunk["answer"]})
+                answer_cache.store(query_vector, index_version, "".join(answer_parts), sources)
+        except Exception as e:
+            yield _sse_event("error", {"detail": str(e)})
+            return
+        yield _sse_event("done", {
+            "tokens": token_count,
+            "cached": cached is not None,
+            "ttfb_ms": ttfb_ms,
+            "time_to_first_token_ms": first_token_ms,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,5 +1,5 @@
-from typing import List, Optional
-from ..services.storage import StorageService
+from typing import BinaryIO, Iterator, List
+from ..services.storage import FileInfo, StorageService
 
 class DocumentDAO:
     """DAO for accessing raw documents from storage."""
@@ -10,10 +10,30 @@ class DocumentDAO:
     def list_documents(self) -> List[str]:
         """List all available documents."""
         return self.storage_service.list_files()
+
+    def iter_documents(self, prefix: str = "") -> Iterator[FileInfo]:
+        """All documents under ``prefix``, with size and mtime, in name order."""
+        return self.storage_service.iter_files(prefix)
+
+    def get_document_info(self, file_name: str) -> FileInfo:
+        """Size and mtime of one document."""
+        return self.storage_service.file_info(file_name)
+
+    def changed_since(self, since_ns: int, prefix: str = "", prune_dirs: bool = False) -> Iterator[FileInfo]:
+        """Documents modified after ``since_ns``."""
+        return self.storage_service.changed_since(since_ns, prefix, prune_dirs)
         
     def get_document_content(self, file_name: str) -> bytes:
         """Get raw content of a document."""
         return self.storage_service.read_file(file_name)
+
+    def open_document_stream(self, file_name: str) -> BinaryIO:
+        """Open a document for incremental reads (use as a context manager)."""
+        return self.storage_service.open_stream(file_name)
+
+    def get_document_size(self, file_name: str) -> int:
+        """Size of a document in bytes."""
+        return self.storage_service.file_size(file_name)
     
     def save_document(self, file_name: str, content: bytes) -> str:
         """Save a document to storage."""
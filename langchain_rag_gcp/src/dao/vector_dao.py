@@ -1,4 +1,4 @@
-from typing import List, Any
+from typing import Any, Dict, List, Optional
 from langchain_core.documents import Document
 from ..services.vector_search import VectorSearchService
 
@@ -8,14 +8,70 @@ class VectorDAO:
     def __init__(self, vector_service: VectorSearchService):
         self.vector_service = vector_service
         
-    def save_vectors(self, documents: List[Document]) -> None:
+    def save_vectors(self, documents: List[Document], persist: bool = True) -> None:
         """Save document embeddings to vector store."""
-        self.vector_service.add_documents(documents)
+        self.vector_service.add_documents(documents, persist=persist)
+
+    def delete_vectors(self, ids: List[str], persist: bool = True) -> None:
+        """Remove document embeddings from the vector store."""
+        self.vector_service.delete_documents(ids, persist=persist)
+
+    def count(self) -> int:
+        """Number of vectors in the vector store."""
+        return self.vector_service.count()
+
+    def index_version(self) -> int:
+        """Version of the index contents; changes on every add or delete."""
+        return self.vector_service.index_version
+
+    def is_writable(self) -> bool:
+        """False when this process only serves a read-only replica of the index."""
+        return self.vector_service.is_writable
+
+    def persist(self) -> None:
+        """Flush the vector store to durable storage."""
+        self.vector_service.persist()
+        
+    def search_similar(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Search for similar documents, optionally restricted by a metadata filter."""
+        return self.vector_service.similarity_search(query, k, filter=filter)
+
+    async def asearch_similar(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Search for similar documents without blocking the event loop."""
+        return await self.vector_service.asimilarity_search(query, k, filter=filter)
         
-    def search_similar(self, query: str, k: int = 4) -> List[Document]:
-        """Search for similar documents."""
-        return self.vector_service.similarity_search(query, k)
+    def search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Search with an already computed query embedding."""
+        return self.vector_service.similarity_search_by_vector(embedding, k, filter=filter)
+
+    async def asearch_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Search by embedding without blocking the event loop."""
+        return await self.vector_service.asimilarity_search_by_vector(embedding, k, filter=filter)
+
+    def search_similar_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        """Search for many queries with one embedding call and one FAISS search."""
+        return self.vector_service.similarity_search_batch(queries, k, filter=filter)
+
+    async def asearch_similar_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        """Batch search without blocking the event loop."""
+        return await self.vector_service.asimilarity_search_batch(queries, k, filter=filter)
         
+    def search_hybrid(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """BM25 and vector results merged by reciprocal rank fusion."""
+        return self.vector_service.hybrid_search(query, k, filter=filter)
+
+    async def asearch_hybrid(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Hybrid search without blocking the event loop."""
+        return await self.vector_service.ahybrid_search(query, k, filter=filter)
+
     def get_retriever(self, **kwargs) -> Any:
         """Get a retriever for the vector store."""
         return self.vector_service.get_retriever(**kwargs)
@@ -1,34 +1,90 @@
+import os
 from functools import lru_cache
-from .services.storage import LocalStorageService
-from .services.embeddings import LocalEmbeddingService
-from .services.vector_search import LocalVectorStoreService
-from .services.llm import LocalGenAIService
-from .dao.document_dao import DocumentDAO
-from .dao.vector_dao import VectorDAO
+
+# Service modules are imported inside the factories below: they pull in FAISS,
+# numpy and langchain_community, which the app should not pay for at import time
+# (see src/startup.py for the warm-up that builds them before traffic arrives).
+
+# Memory budget for cached query embeddings (float32 vectors)
+QUERY_EMBEDDING_CACHE_BYTES = 64 * 1024 * 1024
+
+# Above 1, the vector index is hash-partitioned into this many shards searched in parallel
+VECTOR_SHARDS = 1
+
+# For several uvicorn workers: one worker (the leader) loads and writes the index, the
+# others map its snapshots read-only and follow its updates, so memory doesn't grow
+# with the worker count. Ingestion jobs must then be submitted to the leader.
+SHARED_INDEX = False
+
+# Background ingestion jobs running at once (each also reads files in parallel)
+INGESTION_MAX_JOBS = 2
+
+# Semantic answer cache: paraphrases within this cosine similarity reuse an answer
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_TTL_S = 600.0
+ANSWER_CACHE_MAX_ENTRIES = 1024
+
+# Prompt context: token budget and shingle containment above which a chunk is a duplicate
+CONTEXT_MAX_TOKENS = 2000
+CONTEXT_DEDUP_THRESHOLD = 0.8
 
 # Singletons
 @lru_cache()
 def get_storage_service():
+    from .services.storage import LocalStorageService
     return LocalStorageService()
 
 @lru_cache()
 def get_embedding_service():
-    return LocalEmbeddingService()
+    from .services.embeddings import CachedEmbeddingService, HashingEmbeddingService
+    # Repeated queries skip the embedding call via an LRU cache
+    return CachedEmbeddingService(HashingEmbeddingService(), max_bytes=QUERY_EMBEDDING_CACHE_BYTES)
 
 @lru_cache()
 def get_vector_service():
+    from .services.vector_search import LocalVectorStoreService
+    from .services.sharded_vector_search import ShardedVectorStoreService
     # Depends on embedding service
     embed_svc = get_embedding_service()
-    return LocalVectorStoreService(embedding_service=embed_svc)
+    if VECTOR_SHARDS > 1:
+        return ShardedVectorStoreService(embedding_service=embed_svc, num_shards=VECTOR_SHARDS, shared=SHARED_INDEX)
+    return LocalVectorStoreService(embedding_service=embed_svc, shared=SHARED_INDEX)
 
 @lru_cache()
 def get_llm_service():
+    from .services.llm import LocalGenAIService
     return LocalGenAIService()
 
 @lru_cache()
 def get_document_dao():
+    from .dao.document_dao import DocumentDAO
     return DocumentDAO(get_storage_service())
 
 @lru_cache()
 def get_vector_dao():
+    from .dao.vector_dao import VectorDAO
     return VectorDAO(get_vector_service())
+
+@lru_cache()
+def get_answer_cache():
+    from .services.answer_cache import SemanticAnswerCache
+    return SemanticAnswerCache(
+        threshold=ANSWER_CACHE_THRESHOLD,
+        ttl_s=ANSWER_CACHE_TTL_S,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    )
+
+@lru_cache()
+def get_context_packer():
+    from .services.context import ContextPacker
+    return ContextPacker(max_tokens=CONTEXT_MAX_TOKENS, dedup_threshold=CONTEXT_DEDUP_THRESHOLD)
+
+@lru_cache()
+def get_ingestion_jobs():
+    from .ingestion.pipeline import MANIFEST_FILE_NAME, IngestionPipeline
+    from .ingestion.manifest import IngestionManifest
+    from .ingestion.jobs import IngestionJobManager
+    # Jobs write into the serving vector store, tracked by the manifest next to it
+    manifest = IngestionManifest(os.path.join(get_vector_service().index_path, MANIFEST_FILE_NAME))
+    pipeline = IngestionPipeline(get_document_dao(), get_vector_dao())
+    return IngestionJobManager(pipeline, manifest=manifest, max_jobs=INGESTION_MAX_JOBS)
@@ -0,0 +1,229 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+from ..services.storage import FileInfo
+from .manifest import IngestionManifest
+from .pipeline import IngestionPipeline, IngestionReport
+
+class IngestionJob:
+    """
+    One submitted file set and its live progress.
+
+    ``status`` moves from "queued" to "running" and ends as "succeeded", "failed"
+    or "cancelled". The report counters are updated by the worker as files
+    complete; ``to_dict`` derives throughput and an ETA from them.
+    """
+
+    def __init__(
+        self, files: Optional[List[str]], prefix: str, embed_batch_size: int, changed_since_ns: Optional[int] = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.files = files
+        self.prefix = prefix
+        self.changed_since_ns = changed_since_ns
+        self.embed_batch_size = embed_batch_size
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.total_files: Optional[int] = None
+        self.report = IngestionReport()
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        report = self.report
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        files_per_sec = report.files / elapsed if elapsed > 0 else 0.0
+        eta_s = None
+        if self.status == "running" and self.total_files is not None and files_per_sec > 0:
+            eta_s = (self.total_files - report.files) / files_per_sec
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "prefix": self.prefix,
+            "total_files": self.total_files,
+            "files_done": report.files,
+            "files_skipped": report.skipped,
+            "files_failed": report.failed,
+            "chunks": report.chunks,
+            "deleted_chunks": report.deleted_chunks,
+            "elapsed_s": elapsed,
+            "files_per_sec": files_per_sec,
+            "chunks_per_sec": report.chunks / elapsed if elapsed > 0 else 0.0,
+            "eta_s": eta_s,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class IngestionJobManager:
+    """
+    Runs ingestion jobs in the background for the serving app.
+
+    At most ``max_jobs`` jobs run at once; the rest wait in the pool's queue. Each
+    job ingests into the live vector service, so its documents are searchable as
+    soon as each embedding batch is stored, without a restart, and chat requests
+    keep being served from the event loop meanwhile. Cancellation is cooperative:
+    a running job stops starting new files, keeps what it already stored and
+    persists it.
+
+    Jobs are kept in memory (the last ``max_finished`` finished ones are retained)
+    and are lost on restart; the manifest makes re-submitting a job cheap.
+    """
+
+    def __init__(
+        self,
+        pipeline: IngestionPipeline,
+        manifest: Optional[IngestionManifest] = None,
+        max_jobs: int = 2,
+        max_workers_per_job: Optional[int] = None,
+        max_finished: int = 100,
+    ):
+        self.pipeline = pipeline
+        self.manifest = manifest
+        self.max_workers_per_job = max_workers_per_job
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Files held by running jobs; released (and waiters woken) when a job ends
+        self._claimed: Set[str] = set()
+        self._released = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="ingestion-job")
+
+    def submit(
+        self,
+        files: Optional[List[str]] = None,
+        prefix: str = "",
+        embed_batch_size: int = 512,
+        changed_since_ns: Optional[int] = None,
+    ) -> IngestionJob:
+        """
+        Queue a job over ``files``, or over every file under ``prefix`` when ``files`` is None.
+        ``changed_since_ns`` narrows a prefix job to files modified after that timestamp.
+
+        Raises RuntimeError when the vector index is a read-only replica in this process.
+        """
+        if not self.pipeline.vector_dao.is_writable():
+            raise RuntimeError("The vector index is read-only in this process; submit jobs to the leader worker")
+        if files is not None:
+            files = list(dict.fromkeys(files))
+        job = IngestionJob(files, prefix, embed_batch_size, changed_since_ns)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """Request cancellation. A queued job never starts; a running one stops between files."""
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.cancel_requested.set()
+            with self._released:
+                self._released.notify_all()
+        return job
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> bool:
+        """Block until the job has finished (for scripts and tests). Returns whether it did."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job.done:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def shutdown(self) -> None:
+        for job in self.list():
+            job.cancel_requested.set()
+        with self._released:
+            self._released.notify_all()
+        self._executor.shutdown(wait=True)
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _resolve(self, job: IngestionJob) -> List[FileInfo]:
+        document_dao = self.pipeline.document_dao
+        if job.files is None:
+            if job.changed_since_ns is not None:
+                return list(document_dao.changed_since(job.changed_since_ns, job.prefix))
+            return list(document_dao.iter_documents(job.prefix))
+        infos = []
+        for name in job.files:
+            try:
+                infos.append(document_dao.get_document_info(name))
+            except (FileNotFoundError, ValueError):
+                # Missing, or outside the storage root: counted as a failed file when
+                # the pipeline can't read it
+                infos.append(FileInfo(name, 0, 0))
+        return infos
+
+    def _claim(self, job: IngestionJob, names: Set[str]) -> bool:
+        """Wait until no running job holds any of ``names``, then hold them. False if cancelled meanwhile."""
+        with self._released:
+            while not self._claimed.isdisjoint(names):
+                if job.cancel_requested.is_set():
+                    return False
+                self._released.wait()
+            self._claimed.update(names)
+            return True
+
+    def _release(self, names: Set[str]) -> None:
+        with self._released:
+            self._claimed.difference_update(names)
+            self._released.notify_all()
+
+    def _run(self, job: IngestionJob) -> None:
+        names: Set[str] = set()
+        claimed = False
+        try:
+            if not job.cancel_requested.is_set():
+                files = self._resolve(job)
+                names = {f.name for f in files}
+                claimed = self._claim(job, names)
+            if not claimed:
+                job.status = "cancelled"
+                return
+            job.status = "running"
+            job.started_at = time.time()
+            job.total_files = len(files)
+            self.pipeline.ingest_files(
+                files,
+                max_workers=self.max_workers_per_job,
+                embed_batch_size=job.embed_batch_size,
+                manifest=self.manifest,
+                report=job.report,
+                should_stop=job.cancel_requested.is_set,
+            )
+            job.status = "cancelled" if job.report.cancelled else "succeeded"
+        except Exception as e:
+            # Reported through the job status, not the worker's stdout
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            if claimed:
+                self._release(names)
+            job.finished_at = time.time()
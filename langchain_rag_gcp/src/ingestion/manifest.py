@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import threading
+from typing import BinaryIO, Dict, List, Optional
+
+class IngestionManifest:
+    """
+    Persisted record of what has been ingested: file path -> content hash -> chunk IDs.
+
+    The pipeline consults it to skip unchanged files and to find the chunks that
+    must be removed from the index when a file changes or disappears. Each entry
+    also keeps the file's size and mtime from the run that hashed it; a file that
+    still has both is treated as unchanged without being read.
+
+    Updates and saves are serialized, so concurrent ingestion jobs can share one
+    manifest. A run collects its changes in a ``ManifestUpdate`` (``begin()``) and
+    merges them only after its chunks are persisted, so a save by one job never
+    records files whose chunks another job still holds in memory.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.entries = data.get("files", {})
+        except (OSError, ValueError) as e:
+            # A corrupt manifest just means we fall back to a full re-ingest.
+            print(f"Ignoring unreadable manifest {self.path}: {e}")
+            self.entries = {}
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def content_hash_stream(stream: BinaryIO, read_size: int = 1 << 20) -> str:
+        """``content_hash`` of a stream, read in bounded pieces."""
+        digest = hashlib.sha256()
+        for block in iter(lambda: stream.read(read_size), b""):
+            digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def chunk_id_prefix(file_name: str, content_hash: str) -> str:
+        return hashlib.sha256(f"{file_name}\0{content_hash}".encode("utf-8")).hexdigest()[:20]
+
+    @staticmethod
+    def chunk_ids(file_name: str, content_hash: str, count: int) -> List[str]:
+        """Deterministic chunk IDs, unique per (file, content version)."""
+        prefix = IngestionManifest.chunk_id_prefix(file_name, content_hash)
+        return [f"{prefix}-{i}" for i in range(count)]
+
+    def get_hash(self, file_name: str) -> Optional[str]:
+        entry = self.entries.get(file_name)
+        return entry["hash"] if entry else None
+
+    def get_chunk_ids(self, file_name: str) -> List[str]:
+        entry = self.entries.get(file_name)
+        if not entry:
+            return []
+        if "chunk_count" in entry:
+            return self.chunk_ids(file_name, entry["hash"], entry["chunk_count"])
+        return list(entry["chunk_ids"])
+
+    def files(self) -> List[str]:
+        return list(self.entries.keys())
+
+    def update(self, file_name: str, content_hash: str, chunk_ids: List[str]) -> None:
+        with self._lock:
+            self.entries[file_name] = {"hash": content_hash, "chunk_ids": list(chunk_ids)}
+
+    def update_count(self, file_name: str, content_hash: str, chunk_count: int) -> None:
+        """Record a file whose chunks use the default IDs, by count (for very large files)."""
+        with self._lock:
+            self.entries[file_name] = {"hash": content_hash, "chunk_count": chunk_count}
+
+    def set_stat(self, file_name: str, size: int, mtime_ns: int) -> None:
+        """Remember the size and mtime the file had when its hash was taken."""
+        with self._lock:
+            entry = self.entries.get(file_name)
+            if entry is not None:
+                entry["size"] = size
+                entry["mtime_ns"] = mtime_ns
+
+    def stat_matches(self, file_name: str, size: int, mtime_ns: int) -> bool:
+        """Whether the file still has the recorded size and mtime (so it can skip hashing)."""
+        entry = self.entries.get(file_name)
+        return entry is not None and entry.get("size") == size and entry.get("mtime_ns") == mtime_ns
+
+    def remove(self, file_name: str) -> None:
+        with self._lock:
+            self.entries.pop(file_name, None)
+
+    def begin(self) -> "ManifestUpdate":
+        """Start collecting one run's changes; see ``ManifestUpdate``."""
+        return ManifestUpdate(self)
+
+    def merge(self, changes: Dict[str, Optional[Dict]]) -> None:
+        """Apply a run's entries (None removes the file) and save."""
+        with self._lock:
+            for file_name, entry in changes.items():
+                if entry is None:
+                    self.entries.pop(file_name, None)
+                else:
+                    self.entries[file_name] = entry
+            self.save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries = {}
+
+    def save(self) -> None:
+        """Write the manifest atomically (temp file + rename)."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "files": self.entries}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+class ManifestUpdate:
+    """
+    One ingestion run's manifest changes, kept out of the shared entries until
+    ``commit``. Lookups during the run (``get_hash``, ``stat_matches``) still go to
+    the manifest, which only describes persisted chunks.
+    """
+
+    def __init__(self, manifest: IngestionManifest):
+        self.manifest = manifest
+        self.changes: Dict[str, Optional[Dict]] = {}
+
+    def update(self, file_name: str, content_hash: str, chunk_ids: List[str]) -> None:
+        self.changes[file_name] = {"hash": content_hash, "chunk_ids": list(chunk_ids)}
+
+    def update_count(self, file_name: str, content_hash: str, chunk_count: int) -> None:
+        self.changes[file_name] = {"hash": content_hash, "chunk_count": chunk_count}
+
+    def set_stat(self, file_name: str, size: int, mtime_ns: int) -> None:
+        if file_name in self.changes:
+            entry = self.changes[file_name]
+        else:
+            entry = self.manifest.entries.get(file_name)
+            entry = dict(entry) if entry is not None else None
+        if entry is not None:
+            entry["size"] = size
+            entry["mtime_ns"] = mtime_ns
+            self.changes[file_name] = entry
+
+    def remove(self, file_name: str) -> None:
+        self.changes[file_name] = None
+
+    def commit(self) -> None:
+        """Merge into the manifest and save it. Call once the run's chunks are persisted."""
+        self.manifest.merge(self.changes)
+        self.changes = {}
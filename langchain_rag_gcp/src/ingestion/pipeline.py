@@ -1,79 +1,452 @@
 import os
-from typing import List
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from ..dao.document_dao import DocumentDAO
 from ..dao.vector_dao import VectorDAO
+from ..services.storage import FileInfo
+from .manifest import IngestionManifest
+from .streaming import iter_text, split_stream
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+# Files at least this large are streamed instead of read into memory whole
+STREAM_THRESHOLD_BYTES = 64 * 1024 * 1024
+
+@dataclass
+class IngestionReport:
+    """Summary of an ingestion run."""
+    files: int = 0
+    chunks: int = 0
+    failed: int = 0
+    skipped: int = 0
+    removed_files: int = 0
+    deleted_chunks: int = 0
+    elapsed_s: float = 0.0
+    cancelled: bool = False
+
+    @property
+    def files_per_sec(self) -> float:
+        return self.files / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"Ingested {self.files} files ({self.skipped} unchanged, {self.failed} failed) "
+            f"into {self.chunks} chunks in {self.elapsed_s:.2f}s: "
+            f"{self.files_per_sec:.1f} files/sec, {self.chunks_per_sec:.1f} chunks/sec. "
+            f"Removed {self.deleted_chunks} stale chunks ({self.removed_files} deleted files)."
+        )
 
 class IngestionPipeline:
-    def __init__(self, document_dao: DocumentDAO, vector_dao: VectorDAO):
+    """
+    Load -> Split -> Embed -> Store for the files in storage.
+
+    Files of ``stream_threshold_bytes`` or more are never held in memory whole: they
+    are hashed and decoded from a stream, split by a generator, and embedded and
+    stored ``stream_batch_size`` chunks at a time, so peak memory does not depend on
+    the file size.
+    """
+
+    def __init__(
+        self,
+        document_dao: DocumentDAO,
+        vector_dao: VectorDAO,
+        stream_threshold_bytes: int = STREAM_THRESHOLD_BYTES,
+        stream_batch_size: int = 512,
+    ):
         self.document_dao = document_dao
         self.vector_dao = vector_dao
+        self.stream_threshold_bytes = stream_threshold_bytes
+        self.stream_batch_size = stream_batch_size
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200
         )
 
-    def ingest_file(self, file_name: str) -> List[str]:
+    def _read(self, file_name: str) -> Optional[bytes]:
+        try:
+            return self.document_dao.get_document_content(file_name)
+        except Exception as e:
+            print(f"Error loading {file_name}: {e}")
+            return None
+
+    def split_content(
+        self, file_name: str, content_bytes: bytes, content_hash: Optional[str] = None
+    ) -> Optional[List[Document]]:
         """
-        Ingest a single file: Load -> Split -> Embed -> Store.
-        Returns list of document IDs (or just success message).
+        Decode and split raw file content into chunks with deterministic IDs.
+        Returns None if the content could not be decoded.
         """
-        print(f"Starting ingestion for {file_name}...")
-        
-        # 1. Load content
         try:
-            content_bytes = self.document_dao.get_document_content(file_name)
-            # Simple text decoding for simulation. 
+            # Simple text decoding for simulation.
             # In production, use appropriate LangChain loaders based on file extension.
             text_content = content_bytes.decode("utf-8")
         except UnicodeDecodeError:
             print(f"Skipping {file_name}: Could not decode as UTF-8.")
-            return []
-        except Exception as e:
-            print(f"Error loading {file_name}: {e}")
-            return []
+            return None
 
-        # 2. Create Document object
+        # Create Document object
         raw_doc = Document(
             page_content=text_content,
             metadata={"source": file_name}
         )
 
-        # 3. Split text
+        # Split text; IDs are derived from file name + content so re-ingesting is an upsert
         chunks = self.text_splitter.split_documents([raw_doc])
+        content_hash = content_hash or IngestionManifest.content_hash(content_bytes)
+        for chunk, chunk_id in zip(chunks, IngestionManifest.chunk_ids(file_name, content_hash, len(chunks))):
+            chunk.id = chunk_id
+        return chunks
+
+    def load_and_split(self, file_name: str) -> Optional[List[Document]]:
+        """
+        Load a single file and split it into chunks (no embedding).
+        Returns None if the file could not be loaded.
+        """
+        content_bytes = self._read(file_name)
+        if content_bytes is None:
+            return None
+        return self.split_content(file_name, content_bytes)
+
+    def _should_stream(self, file_name: str) -> bool:
+        try:
+            return self.document_dao.get_document_size(file_name) >= self.stream_threshold_bytes
+        except Exception:
+            # Unreadable files are reported by the regular read path
+            return False
+
+    def _hash_stream(self, file_name: str) -> Optional[str]:
+        try:
+            with self.document_dao.open_document_stream(file_name) as stream:
+                return IngestionManifest.content_hash_stream(stream)
+        except Exception as e:
+            print(f"Error loading {file_name}: {e}")
+            return None
+
+    def iter_chunks(self, file_name: str, content_hash: str) -> Iterator[Document]:
+        """
+        Stream a file through incremental UTF-8 decoding and splitting. Chunk IDs
+        follow the same scheme as ``split_content``. Raises UnicodeDecodeError when
+        invalid bytes are reached, possibly after some chunks were yielded.
+        """
+        prefix = IngestionManifest.chunk_id_prefix(file_name, content_hash)
+        with self.document_dao.open_document_stream(file_name) as stream:
+            for i, text in enumerate(split_stream(iter_text(stream), self.text_splitter)):
+                yield Document(page_content=text, metadata={"source": file_name}, id=f"{prefix}-{i}")
+
+    def _ingest_streamed(self, file_name: str, content_hash: str, batch_size: int) -> Optional[int]:
+        """
+        Embed and store a streamed file in bounded batches. Returns the number of
+        chunks stored, or None if the file could not be decoded.
+        """
+        stored = 0
+        batch: List[Document] = []
+        try:
+            for chunk in self.iter_chunks(file_name, content_hash):
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    self._save_batch(batch)
+                    stored += len(batch)
+                    batch = []
+        except UnicodeDecodeError:
+            print(f"Skipping {file_name}: Could not decode as UTF-8.")
+            # Drop the chunks stored before the bad bytes were reached
+            self.vector_dao.delete_vectors(IngestionManifest.chunk_ids(file_name, content_hash, stored), persist=False)
+            return None
+        if batch:
+            self._save_batch(batch)
+            stored += len(batch)
+        return stored
+
+    def _save_batch(self, batch: List[Document]) -> None:
+        # Upsert: drop any previous copies of these chunk IDs, then one embedding call
+        # and one bulk FAISS insert for the whole batch. Persisting is left to the caller.
+        self.vector_dao.delete_vectors([d.id for d in batch], persist=False)
+        self.vector_dao.save_vectors(batch, persist=False)
+
+    def ingest_file(self, file_name: str) -> List[str]:
+        """
+        Ingest a single file: Load -> Split -> Embed -> Store.
+        Returns the list of chunk IDs stored for the file.
+        """
+        print(f"Starting ingestion for {file_name}...")
+
+        if self._should_stream(file_name):
+            content_hash = self._hash_stream(file_name)
+            count = None
+            if content_hash is not None:
+                count = self._ingest_streamed(file_name, content_hash, self.stream_batch_size)
+            if count is None:
+                return []
+            self.vector_dao.persist()
+            print(f"Successfully ingested {file_name} ({count} chunks, streamed).")
+            return IngestionManifest.chunk_ids(file_name, content_hash, count)
+
+        chunks = self.load_and_split(file_name)
+        if chunks is None:
+            return []
         print(f"Split {file_name} into {len(chunks)} chunks.")
 
-        # 4. Store in Vector Search (handles embedding internally in our service)
-        self.vector_dao.save_vectors(chunks)
+        # Store in Vector Search (handles embedding internally in our service)
+        self._save_batch(chunks)
+        self.vector_dao.persist()
         print(f"Successfully ingested {file_name}.")
-        
-        return [str(i) for i in range(len(chunks))]
 
-    def run_full_ingestion(self):
-        """Scan all files in storage and ingest them."""
-        files = self.document_dao.list_documents()
+        return [c.id for c in chunks]
+
+    def run_full_ingestion(
+        self,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+        embed_batch_size: int = 512,
+        manifest: Optional[IngestionManifest] = None,
+    ) -> IngestionReport:
+        """
+        Scan all files in storage and ingest them.
+
+        With ``parallel=True`` files are read and split in a thread pool, chunks from
+        many files are grouped into ``embed_batch_size`` embedding/insert batches, and
+        the index is persisted once at the end of the run.
+
+        With a ``manifest`` the run is incremental: unchanged files are skipped, and the
+        chunks of changed or deleted files are removed from the index. Files whose size
+        and mtime match the manifest are skipped without being read.
+        """
+        # One recursive listing provides names, sizes and mtimes
+        files = list(self.document_dao.iter_documents())
         print(f"Found {len(files)} files to ingest.")
+        start = time.perf_counter()
+
+        if parallel or manifest is not None:
+            report = self._run_batched(files, max_workers if parallel else 1, embed_batch_size, manifest)
+        else:
+            report = IngestionReport()
+            for f in files:
+                ids = self.ingest_file(f.name)
+                report.files += 1
+                report.chunks += len(ids)
+
+        report.elapsed_s = time.perf_counter() - start
+        print(report)
+        return report
+
+    def ingest_files(
+        self,
+        files: List[FileInfo],
+        max_workers: Optional[int] = None,
+        embed_batch_size: int = 512,
+        manifest: Optional[IngestionManifest] = None,
+        report: Optional[IngestionReport] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> IngestionReport:
+        """
+        Ingest a given set of files (batched, like ``run_full_ingestion(parallel=True)``).
+
+        Files outside the set are left alone, even if the manifest lists them. The
+        counters of ``report`` are updated as files complete, so another thread can
+        follow progress. ``should_stop`` is checked between files: once it returns
+        True no new files are started, finished ones are still stored and persisted,
+        and the report is marked ``cancelled``. A file listed more than once is
+        ingested once.
+        """
+        start = time.perf_counter()
+        unique: Dict[str, FileInfo] = {}
         for f in files:
-            self.ingest_file(f)
+            unique.setdefault(f.name, f)
+        files = list(unique.values())
+        report = self._run_batched(
+            files, max_workers, embed_batch_size, manifest,
+            report=report, should_stop=should_stop, remove_missing=False,
+        )
+        report.elapsed_s = time.perf_counter() - start
+        return report
+
+    def _load_for_ingest(
+        self, info: FileInfo, manifest: Optional[IngestionManifest]
+    ) -> Tuple[Optional[str], Optional[List[Document]], bool, bool]:
+        """
+        Worker step: returns (content_hash, chunks, unchanged, streamed). Large files
+        are only hashed here; their chunks are streamed by the consuming loop.
+        """
+        file_name = info.name
+        if manifest is not None and manifest.stat_matches(file_name, info.size, info.mtime_ns):
+            return manifest.get_hash(file_name), None, True, False
+        if info.size >= self.stream_threshold_bytes:
+            content_hash = self._hash_stream(file_name)
+            unchanged = manifest is not None and content_hash is not None and manifest.get_hash(file_name) == content_hash
+            return content_hash, None, unchanged, content_hash is not None
+        content_bytes = self._read(file_name)
+        if content_bytes is None:
+            return None, None, False, False
+        content_hash = IngestionManifest.content_hash(content_bytes)
+        if manifest is not None and manifest.get_hash(file_name) == content_hash:
+            return content_hash, None, True, False
+        return content_hash, self.split_content(file_name, content_bytes, content_hash), False, False
+
+    def _run_batched(
+        self,
+        files: List[FileInfo],
+        max_workers: Optional[int],
+        embed_batch_size: int,
+        manifest: Optional[IngestionManifest],
+        report: Optional[IngestionReport] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        remove_missing: bool = True,
+    ) -> IngestionReport:
+        report = report if report is not None else IngestionReport()
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        # Cap in-flight files so a huge corpus doesn't sit in memory all at once.
+        max_in_flight = max_workers * 4
+        pending_chunks: List[Document] = []
+        stale_ids: List[str] = []
+        written_ids = set()
+        # Chunks to replace come from the manifest as it was before this run, never
+        # from entries the run itself (or a concurrent job) has just written
+        previous = {f.name: manifest.get_chunk_ids(f.name) for f in files} if manifest is not None else {}
+        # This run's entries, merged into the shared manifest only after persist
+        staged = manifest.begin() if manifest is not None else None
+
+        if manifest is not None and remove_missing:
+            # Files that disappeared from storage since the last run
+            present = {f.name for f in files}
+            for f in manifest.files():
+                if f not in present:
+                    stale_ids.extend(manifest.get_chunk_ids(f))
+                    staged.remove(f)
+                    report.removed_files += 1
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = deque()
+            file_iter = iter(files)
+
+            def submit_next() -> bool:
+                f = next(file_iter, None)
+                if f is None:
+                    return False
+                in_flight.append((f, executor.submit(self._load_for_ingest, f, manifest)))
+                return True
+
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+
+            # Consume results in submission order so the index order is deterministic.
+            while in_flight:
+                if should_stop is not None and should_stop():
+                    report.cancelled = True
+                    for _, pending in in_flight:
+                        pending.cancel()
+                    break
+                info, future = in_flight.popleft()
+                file_name = info.name
+                content_hash, chunks, unchanged, streamed = future.result()
+                submit_next()
+                report.files += 1
+                if unchanged:
+                    report.skipped += 1
+                    if manifest is not None:
+                        # Same content under a new mtime: remember it so the next run skips the read
+                        staged.set_stat(file_name, info.size, info.mtime_ns)
+                    continue
+                if streamed:
+                    # Stored batch by batch as the file is read; never held whole
+                    count = self._ingest_streamed(file_name, content_hash, embed_batch_size)
+                    if count is None:
+                        report.failed += 1
+                        continue
+                    written_ids.update(IngestionManifest.chunk_ids(file_name, content_hash, count))
+                    if manifest is not None:
+                        stale_ids.extend(previous.get(file_name, []))
+                        staged.update_count(file_name, content_hash, count)
+                        staged.set_stat(file_name, info.size, info.mtime_ns)
+                    report.chunks += count
+                    continue
+                if chunks is None:
+                    report.failed += 1
+                    continue
+                if manifest is not None:
+                    # Old chunks of a changed file go away; new IDs differ by content hash
+                    stale_ids.extend(previous.get(file_name, []))
+                    staged.update(file_name, content_hash, [c.id for c in chunks])
+                    staged.set_stat(file_name, info.size, info.mtime_ns)
+                written_ids.update(c.id for c in chunks)
+                pending_chunks.extend(chunks)
+                report.chunks += len(chunks)
+                while len(pending_chunks) >= embed_batch_size:
+                    self._save_batch(pending_chunks[:embed_batch_size])
+                    pending_chunks = pending_chunks[embed_batch_size:]
+
+        if pending_chunks:
+            self._save_batch(pending_chunks)
+        stale_ids = [i for i in stale_ids if i not in written_ids]
+        if stale_ids:
+            # One delete for the whole run (FAISS compacts the index on each delete)
+            self.vector_dao.delete_vectors(stale_ids, persist=False)
+            report.deleted_chunks = len(stale_ids)
+        # Single persist for the whole run; the manifest only learns about this run's
+        # files (and is written) once the index it describes is on disk.
+        self.vector_dao.persist()
+        if staged is not None:
+            staged.commit()
+        return report
 
 # Helper to easily run from main or script
-def run_ingestion(storage_path: str = "data/raw", vector_path: str = "data/vector_index"):
+def run_ingestion(
+    storage_path: str = "data/raw",
+    vector_path: str = "data/vector_index",
+    parallel: bool = True,
+    max_workers: Optional[int] = None,
+    embed_batch_size: int = 512,
+    incremental: bool = True,
+    embedding_store_path: Optional[str] = "data/embedding_store",
+) -> IngestionReport:
     # Imports inside to avoid circular deps if any, or just for cleanliness in script usage
     from ..services.storage import LocalStorageService
-    from ..services.embeddings import LocalEmbeddingService
+    from ..services.embeddings import HashingEmbeddingService
     from ..services.vector_search import LocalVectorStoreService
-    
+    from ..services.persistence import IndexPersistence
+    from ..services.embedding_store import PersistentEmbeddingService
+
+    manifest = None
+    if incremental:
+        manifest_path = os.path.join(vector_path, MANIFEST_FILE_NAME)
+        if not os.path.exists(manifest_path) and os.path.exists(vector_path):
+            # An index without a manifest can't be reconciled chunk by chunk: rebuild it.
+            print(f"No manifest found in {vector_path}; rebuilding the index from scratch.")
+            IndexPersistence(vector_path).clear()
+        manifest = IngestionManifest(manifest_path)
+
     storage_svc = LocalStorageService(base_path=storage_path)
     # We need to ensure embeddings and vector store are initialized
-    embedding_svc = LocalEmbeddingService()
+    # Must match the query-side service in src/dependencies.py
+    embedding_svc = HashingEmbeddingService()
+    if embedding_store_path:
+        # Unchanged chunk texts reuse their stored vectors instead of calling the model
+        embedding_svc = PersistentEmbeddingService(embedding_svc, embedding_store_path)
     vector_svc = LocalVectorStoreService(embedding_service=embedding_svc, index_path=vector_path)
-    
+
     doc_dao = DocumentDAO(storage_svc)
     vec_dao = VectorDAO(vector_svc)
-    
+
+    if manifest is not None and manifest.files() and vec_dao.count() == 0:
+        # The index was lost or failed to load; the manifest no longer describes it.
+        print("Vector index is empty; ignoring manifest and re-ingesting everything.")
+        manifest.clear()
+
     pipeline = IngestionPipeline(doc_dao, vec_dao)
-    pipeline.run_full_ingestion()
+    return pipeline.run_full_ingestion(
+        parallel=parallel,
+        max_workers=max_workers,
+        embed_batch_size=embed_batch_size,
+        manifest=manifest,
+    )
 
 if __name__ == "__main__":
     # Allow running this file directly to trigger ingestion
@@ -0,0 +1,61 @@
+import codecs
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+from langchain_text_splitters import TextSplitter
+
+# Bytes per read from storage
+READ_SIZE = 1 << 20
+# Chunks at the end of the buffer that may still change once more text arrives
+_HOLD_BACK = 2
+
+def iter_text(stream: BinaryIO, read_size: int = READ_SIZE) -> Iterator[str]:
+    """
+    Decode a UTF-8 byte stream piece by piece. Multi-byte characters split across
+    reads are completed by the next read; invalid bytes raise UnicodeDecodeError.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        data = stream.read(read_size)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def _chunk_starts(text: str, chunks: List[str], overlap: int) -> List[int]:
+    # Same search LangChain uses for add_start_index
+    starts, index, previous_len = [], 0, 0
+    for chunk in chunks:
+        index = text.find(chunk, max(0, index + previous_len - overlap))
+        starts.append(index)
+        previous_len = len(chunk)
+    return starts
+
+def split_stream(pieces: Iterable[str], splitter: TextSplitter, window: Optional[int] = None) -> Iterator[str]:
+    """
+    Split a stream of text pieces with ``splitter``, yielding chunks as they are ready.
+
+    Text is buffered until ``window`` characters (default 32 chunks) are available and
+    split. The last chunks of the buffer could be cut differently once more text
+    arrives, so they are held back and the buffer restarts at the first of them. That
+    chunk already overlaps the last emitted one, so the splitter's overlap carries
+    across read boundaries. Memory stays bounded by the window plus one read.
+    """
+    window = window or 32 * splitter._chunk_size
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) < window:
+            continue
+        chunks = splitter.split_text(buffer)
+        if len(chunks) <= _HOLD_BACK:
+            continue
+        starts = _chunk_starts(buffer, chunks, splitter._chunk_overlap)
+        if starts[-_HOLD_BACK] <= 0:
+            continue
+        yield from chunks[:-_HOLD_BACK]
+        buffer = buffer[starts[-_HOLD_BACK]:]
+    if buffer:
+        yield from splitter.split_text(buffer)
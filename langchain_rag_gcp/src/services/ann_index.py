@@ -0,0 +1,222 @@
+from dataclasses import dataclass
+from typing import List, Optional, Set
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# HNSW graphs can't drop vectors: deleted positions stay in the graph as tombstones
+# (excluded from searches) until they reach this share of the index, which is then
+# rebuilt without them
+HNSW_COMPACT_FRACTION = 0.2
+# index_to_docstore_id entry of a tombstoned position; never a docstore ID
+TOMBSTONE_ID = ""
+
+@dataclass
+class IndexConfig:
+    """
+    FAISS index type plus its build and search parameters.
+
+    - flat:     exact brute-force search (default).
+    - ivf_flat: inverted file over ``nlist`` k-means cells, ``nprobe`` cells scanned per query.
+    - hnsw:     graph index with ``hnsw_m`` links per node; ``ef_construction`` / ``ef_search``
+                trade build/query time for recall.
+    - ivf_pq:   IVF with product-quantized vectors (``pq_m`` sub-quantizers of ``pq_nbits``
+                bits each); smallest memory footprint, approximate distances.
+
+    IVF variants must be trained before vectors can be added.
+    """
+    index_type: str = "flat"
+    nlist: int = 1024
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    pq_m: int = 16
+    pq_nbits: int = 8
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type {self.index_type!r}; expected one of {INDEX_TYPES}")
+
+    @property
+    def requires_training(self) -> bool:
+        return self.index_type in ("ivf_flat", "ivf_pq")
+
+def build_index(config: IndexConfig, training_vectors: np.ndarray) -> faiss.Index:
+    """
+    Create an empty index for ``config``, trained on ``training_vectors`` if needed.
+
+    ``nlist`` is capped at the number of training vectors, so small corpora still
+    produce a usable (if coarse) IVF index.
+    """
+    training_vectors = np.ascontiguousarray(training_vectors, dtype=np.float32)
+    n, dim = training_vectors.shape
+    if config.index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif config.index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.hnsw_m)
+        index.hnsw.efConstruction = config.ef_construction
+    else:
+        nlist = max(1, min(config.nlist, n))
+        quantizer = faiss.IndexFlatL2(dim)
+        if config.index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            if dim % config.pq_m != 0:
+                raise ValueError(f"pq_m={config.pq_m} must divide the embedding dimension {dim}")
+            if n < 2 ** config.pq_nbits:
+                raise ValueError(
+                    f"ivf_pq with pq_nbits={config.pq_nbits} needs at least {2 ** config.pq_nbits} "
+                    f"training vectors, got {n}"
+                )
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, config.pq_m, config.pq_nbits)
+        index.train(training_vectors)
+    apply_search_params(index, config)
+    return index
+
+def apply_search_params(index: faiss.Index, config: IndexConfig) -> None:
+    """Set query-time parameters (not all of them survive write_index/read_index)."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.ef_search
+        return
+    ivf = _try_extract_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = config.nprobe
+
+def search_parameters(index: faiss.Index, config: IndexConfig, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Per-query parameters restricting a search to ``selector`` (keeps nprobe/efSearch)."""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=config.ef_search)
+    if _try_extract_ivf(index) is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=config.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+def reconstruct_positions(index: faiss.Index, positions: np.ndarray) -> np.ndarray:
+    """Stored vectors at ``positions`` (decoded approximations for PQ)."""
+    ivf = _try_extract_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    return index.reconstruct_batch(np.ascontiguousarray(positions, dtype=np.int64))
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """All stored vectors in position order (decoded approximations for PQ)."""
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    ivf = _try_extract_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def compact_index(index: faiss.Index, keep_positions: np.ndarray) -> None:
+    """
+    Drop every vector not in ``keep_positions`` while keeping positions contiguous.
+
+    Rebuilds the index from the surviving vectors; used for HNSW, which has no
+    ``remove_ids``. ``reset()`` keeps the trained quantizer of IVF indexes, so
+    re-adding needs no retraining.
+    """
+    vectors = reconstruct_all(index)[keep_positions]
+    ivf = _try_extract_ivf(index)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+    index.reset()
+    if len(vectors):
+        index.add(np.ascontiguousarray(vectors))
+
+def _remove_ivf_positions(ivf: faiss.IndexIVF, dropped: np.ndarray) -> None:
+    """
+    ``remove_ids`` on an IVF index, then renumber the surviving labels so positions
+    stay contiguous. Only the IDs in the inverted lists are rewritten; nothing is
+    re-assigned to centroids or re-encoded.
+    """
+    ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+    ivf.remove_ids(faiss.IDSelectorBatch(dropped))
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if not size:
+            continue
+        ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+        shift = np.searchsorted(dropped, ids)
+        if not shift.any():
+            continue
+        new_ids = np.ascontiguousarray(ids - shift, dtype=np.int64)
+        codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).copy()
+        invlists.update_entries(list_no, 0, size, faiss.swig_ptr(new_ids), faiss.swig_ptr(codes))
+
+def deleted_positions(store: FAISS) -> Set[int]:
+    """Tombstoned positions of an HNSW store (empty for other index types)."""
+    return store.__dict__.setdefault("deleted_positions", set())
+
+def live_selector(store: FAISS) -> Optional[faiss.IDSelector]:
+    """Selector that skips tombstoned positions, or None when there are none."""
+    dead = deleted_positions(store)
+    if not dead:
+        return None
+    cached = store.__dict__.get("_live_selector")
+    if cached is None or cached[0] != len(dead):
+        excluded = faiss.IDSelectorBatch(np.fromiter(dead, dtype=np.int64, count=len(dead)))
+        # Keep the inner selector alive as long as the one wrapping it
+        cached = store.__dict__["_live_selector"] = (len(dead), excluded, faiss.IDSelectorNot(excluded))
+    return cached[2]
+
+def live_count(store: FAISS) -> int:
+    return store.index.ntotal - len(deleted_positions(store))
+
+def should_compact(store: FAISS) -> bool:
+    return len(deleted_positions(store)) > HNSW_COMPACT_FRACTION * store.index.ntotal
+
+def compact_tombstones(store: FAISS) -> np.ndarray:
+    """Rebuild an HNSW store without its tombstones. Returns the positions dropped (sorted)."""
+    dead = deleted_positions(store)
+    if not dead:
+        return np.empty(0, dtype=np.int64)
+    dropped = np.array(sorted(dead), dtype=np.int64)
+    keep = np.setdiff1d(np.arange(store.index.ntotal, dtype=np.int64), dropped, assume_unique=True)
+    compact_index(store.index, keep)
+    old_mapping = store.index_to_docstore_id
+    store.index_to_docstore_id = {new: old_mapping[int(old)] for new, old in enumerate(keep)}
+    dead.clear()
+    store.__dict__.pop("_live_selector", None)
+    return dropped
+
+def remove_documents(store: FAISS, ids: List[str]) -> List[str]:
+    """
+    Delete documents from a LangChain FAISS store of any index type. Returns the IDs removed.
+
+    Flat and IVF indexes drop the vectors right away and shift later positions down.
+    HNSW positions are tombstoned instead; ``compact_tombstones`` drops them later.
+    """
+    # FAISS.delete raises on unknown IDs, so only pass the ones we hold
+    known = [i for i in ids if isinstance(store.docstore.search(i), Document)]
+    if not known:
+        return []
+    if isinstance(store.index, faiss.IndexFlat):
+        store.delete(known)
+        return known
+
+    wanted = set(known)
+    dropped = np.array(
+        sorted(p for p, doc_id in store.index_to_docstore_id.items() if doc_id in wanted), dtype=np.int64
+    )
+    store.docstore.delete(known)
+    ivf = _try_extract_ivf(store.index)
+    if ivf is not None:
+        _remove_ivf_positions(ivf, dropped)
+        keep = np.setdiff1d(np.arange(len(store.index_to_docstore_id), dtype=np.int64), dropped, assume_unique=True)
+        old_mapping = store.index_to_docstore_id
+        store.index_to_docstore_id = {new: old_mapping[int(old)] for new, old in enumerate(keep)}
+    else:
+        for position in dropped:
+            store.index_to_docstore_id[int(position)] = TOMBSTONE_ID
+        deleted_positions(store).update(int(p) for p in dropped)
+    return known
+
+def _try_extract_ivf(index: faiss.Index) -> Optional[faiss.IndexIVF]:
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
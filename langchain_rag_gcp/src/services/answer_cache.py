@@ -0,0 +1,113 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    sources: List[str]
+    similarity: float
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by query-embedding similarity.
+
+    Recent query embeddings live in a small preallocated matrix of unit vectors, so a
+    lookup is one matrix-vector product. A lookup hits when the closest live entry
+    has cosine similarity >= ``threshold`` and was stored against the same index
+    version. Entries expire after ``ttl_s``; when full, the least recently used
+    entry is replaced. ``max_entries=0`` disables the cache.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_s: float = 600.0, max_entries: int = 1024):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._expires_at = np.zeros(max_entries, dtype=np.float64)
+        self._versions = np.full(max_entries, -1, dtype=np.int64)
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._payloads: List[Optional[CachedAnswer]] = [None] * max_entries
+        self._clock = 0
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def lookup(self, query_vector: Sequence[float], index_version: int) -> Optional[CachedAnswer]:
+        if self.max_entries == 0:
+            return None
+        q = self._normalize(query_vector)
+        with self._lock:
+            if self._vectors is None or q.shape[0] != self._dim:
+                self.misses += 1
+                return None
+            now = time.monotonic()
+            self._valid &= self._expires_at > now
+            live = self._valid & (self._versions == index_version)
+            if not live.any():
+                self.misses += 1
+                return None
+            similarities = np.where(live, self._vectors @ q, -np.inf)
+            slot = int(np.argmax(similarities))
+            if similarities[slot] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._clock += 1
+            self._last_used[slot] = self._clock
+            cached = self._payloads[slot]
+            return CachedAnswer(cached.answer, list(cached.sources), float(similarities[slot]))
+
+    def store(self, query_vector: Sequence[float], index_version: int, answer: str, sources: List[str]) -> None:
+        if self.max_entries == 0:
+            return
+        q = self._normalize(query_vector)
+        with self._lock:
+            if self._vectors is None or q.shape[0] != self._dim:
+                # First entry (or a new embedding model): size the matrix for it
+                self._dim = q.shape[0]
+                self._vectors = np.zeros((self.max_entries, self._dim), dtype=np.float32)
+                self._valid[:] = False
+            now = time.monotonic()
+            self._valid &= self._expires_at > now
+            free = np.nonzero(~self._valid)[0]
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._clock += 1
+            self._vectors[slot] = q
+            self._expires_at[slot] = now + self.ttl_s
+            self._versions[slot] = index_version
+            self._last_used[slot] = self._clock
+            self._valid[slot] = True
+            self._payloads[slot] = CachedAnswer(answer, list(sources), 1.0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._valid[:] = False
+            self._payloads = [None] * self.max_entries
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": int(self._valid.sum()),
+                "max_entries": self.max_entries,
+            }
@@ -0,0 +1,164 @@
+import math
+import re
+import zlib
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+_WORD = re.compile(r"\w+")
+_CHUNK_ID = re.compile(r"^(?P<prefix>.+)-(?P<index>\d+)$")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)."""
+    return math.ceil(len(text) / 4)
+
+# Shorter suffix/prefix matches are more likely coincidence than splitter overlap
+MIN_OVERLAP = 8
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    """
+    Length of the longest suffix of ``left`` that is a prefix of ``right``, between
+    MIN_OVERLAP and ``max_overlap`` characters; 0 if there is none.
+    """
+    if not left or not right:
+        return 0
+    tail = left[-max_overlap:]
+    position = tail.find(right[:1])
+    while position != -1 and len(tail) - position >= MIN_OVERLAP:
+        if right.startswith(tail[position:]):
+            return len(tail) - position
+        position = tail.find(right[:1], position + 1)
+    return 0
+
+class ContextPacker:
+    """
+    Builds the prompt context from retrieved chunks.
+
+    1. Adjacent chunks of the same file version (IDs ``<prefix>-<i>`` and
+       ``<prefix>-<i+1>``, see ``IngestionManifest.chunk_ids``) are merged into one
+       passage, with the splitter overlap they share written once.
+    2. Near-duplicates are dropped: a passage whose word shingles are at least
+       ``dedup_threshold`` contained in a better-ranked passage adds nothing. All
+       pairs are compared at once with one (passages x shingles) incidence matrix
+       product.
+    3. Passages are packed in retrieval order into ``max_tokens`` (counted by
+       ``token_counter``); the first passage that doesn't fit is cut at a word
+       boundary if at least ``min_truncated_tokens`` remain.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        dedup_threshold: float = 0.8,
+        shingle_size: int = 3,
+        max_overlap: int = 400,
+        min_truncated_tokens: int = 32,
+        token_counter: Callable[[str], int] = estimate_tokens,
+        separator: str = "\n\n",
+    ):
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.shingle_size = shingle_size
+        self.max_overlap = max_overlap
+        self.min_truncated_tokens = min_truncated_tokens
+        self.token_counter = token_counter
+        self.separator = separator
+
+    def merge_adjacent(self, docs: List[Document]) -> List[Document]:
+        """Merge runs of consecutive chunks; each passage keeps the rank of its best chunk."""
+        runs: Dict[str, List[Tuple[int, int]]] = {}
+        for rank, doc in enumerate(docs):
+            match = _CHUNK_ID.match(doc.id or "")
+            if match:
+                runs.setdefault(match["prefix"], []).append((int(match["index"]), rank))
+
+        # rank of the passage's best chunk -> passage; ranks of chunks merged into others
+        passages: Dict[int, Document] = {}
+        merged = set()
+        for prefix, chunks in runs.items():
+            chunks.sort()
+            run = [chunks[0]]
+            for chunk in chunks[1:] + [None]:
+                if chunk is not None and chunk[0] == run[-1][0] + 1:
+                    run.append(chunk)
+                    continue
+                if len(run) > 1:
+                    text = docs[run[0][1]].page_content
+                    for _, rank in run[1:]:
+                        following = docs[rank].page_content
+                        overlap = _overlap(text, following, self.max_overlap)
+                        # Without overlap the splitter cut at a separator it dropped
+                        text += following[overlap:] if overlap else self.separator + following
+                    best = min(rank for _, rank in run)
+                    first = docs[run[0][1]]
+                    passages[best] = Document(
+                        page_content=text,
+                        metadata=dict(first.metadata),
+                        id=first.id,
+                    )
+                    merged.update(rank for _, rank in run if rank != best)
+                run = [chunk]
+        return [passages.get(rank, doc) for rank, doc in enumerate(docs) if rank not in merged]
+
+    def _shingles(self, text: str) -> np.ndarray:
+        words = _WORD.findall(text.lower())
+        n = self.shingle_size
+        if len(words) < n:
+            grams = [" ".join(words)] if words else []
+        else:
+            grams = [" ".join(words[i:i + n]) for i in range(len(words) - n + 1)]
+        return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.int64, count=len(grams)))
+
+    def drop_near_duplicates(self, docs: List[Document]) -> List[Document]:
+        """Keep a passage unless it is mostly contained in a better-ranked one that is kept."""
+        if len(docs) < 2:
+            return list(docs)
+        shingles = [self._shingles(d.page_content) for d in docs]
+        sizes = np.array([len(s) for s in shingles])
+        columns, inverse = np.unique(np.concatenate(shingles), return_inverse=True)
+        incidence = np.zeros((len(docs), len(columns)), dtype=np.float32)
+        incidence[np.repeat(np.arange(len(docs)), sizes), inverse] = 1.0
+        shared = incidence @ incidence.T
+        # Containment of passage j in passage i: shared shingles over j's shingles
+        containment = shared / np.maximum(sizes, 1)[None, :]
+        keep = np.ones(len(docs), dtype=bool)
+        for j in range(1, len(docs)):
+            if sizes[j] and (containment[:j, j][keep[:j]] >= self.dedup_threshold).any():
+                keep[j] = False
+        return [d for d, kept in zip(docs, keep) if kept]
+
+    def _truncate(self, text: str, budget: int) -> str:
+        # Longest word-boundary prefix within the budget (binary search on characters)
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.token_counter(text[:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        cut = text[:low]
+        space = max(cut.rfind(" "), cut.rfind("\n"))
+        return cut[:space] if space > 0 and low < len(text) else cut
+
+    def pack(self, docs: List[Document]) -> List[Document]:
+        """The passages that go into the prompt, best first."""
+        passages = self.drop_near_duplicates(self.merge_adjacent(docs))
+        separator_tokens = self.token_counter(self.separator)
+        packed: List[Document] = []
+        used = 0
+        for doc in passages:
+            cost = self.token_counter(doc.page_content) + (separator_tokens if packed else 0)
+            if used + cost <= self.max_tokens:
+                packed.append(doc)
+                used += cost
+                continue
+            remaining = self.max_tokens - used - (separator_tokens if packed else 0)
+            if remaining >= self.min_truncated_tokens:
+                text = self._truncate(doc.page_content, remaining)
+                if text:
+                    packed.append(Document(page_content=text, metadata=doc.metadata, id=doc.id))
+            break
+        return packed
+
+    def format(self, docs: List[Document]) -> str:
+        return self.separator.join(d.page_content for d in self.pack(docs))
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import mmap
+import os
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+MAGIC = b"RAGDOCS1"
+COLUMNS = ("id", "text", "metadata")
+
+def id_key(doc_id: str) -> int:
+    """64-bit hash of a docstore ID, used for the sorted lookup table."""
+    return int.from_bytes(hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+def write_docstore(path: str, rows: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+    """
+    Write (id, text, metadata) rows, in index position order, to a columnar file.
+
+    Layout (all arrays 8-byte aligned, offsets relative to the end of the header):
+        MAGIC | uint64 header length | JSON header (count + section positions)
+        id.offsets / id.data, text.offsets / text.data, metadata.offsets / metadata.data
+        lookup.keys (sorted 64-bit ID hashes) / lookup.rows
+
+    Returns the number of rows written.
+    """
+    columns: Dict[str, List[bytes]] = {name: [] for name in COLUMNS}
+    for doc_id, text, metadata in rows:
+        columns["id"].append(doc_id.encode("utf-8"))
+        columns["text"].append(text.encode("utf-8"))
+        columns["metadata"].append(json.dumps(metadata or {}, separators=(",", ":")).encode("utf-8"))
+    count = len(columns["id"])
+
+    sections: List[Tuple[str, bytes]] = []
+    for name in COLUMNS:
+        values = columns[name]
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in values], out=offsets[1:])
+        sections.append((f"{name}.offsets", offsets.tobytes()))
+        sections.append((f"{name}.data", b"".join(values)))
+    keys = np.array([id_key(v.decode("utf-8")) for v in columns["id"]], dtype=np.uint64)
+    order = np.argsort(keys, kind="stable")
+    sections.append(("lookup.keys", keys[order].tobytes()))
+    sections.append(("lookup.rows", order.astype(np.int64).tobytes()))
+
+    positions = {}
+    cursor = 0
+    for name, data in sections:
+        positions[name] = [cursor, len(data)]
+        cursor += _padded(len(data))
+    header = json.dumps({"count": count, "sections": positions}).encode("utf-8")
+    header += b" " * (_padded(len(header)) - len(header))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for _, data in sections:
+            f.write(data)
+            f.write(b"\0" * (_padded(len(data)) - len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+def _padded(size: int) -> int:
+    return (size + 7) // 8 * 8
+
+class MappedDocstore(Docstore, AddableMixin):
+    """
+    Read-mostly docstore backed by a memory-mapped file from ``write_docstore``.
+
+    Opening only maps the file and parses a small header; documents are decoded
+    when they are looked up. Row ``i`` holds the document at index position ``i``.
+    Additions and deletions since the file was written live in small in-memory
+    overlays until the next snapshot rewrites the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a docstore file")
+        header_len = int(np.frombuffer(self._mmap, dtype=np.uint64, count=1, offset=len(MAGIC))[0])
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(self._mmap[header_start:header_start + header_len]))
+        self._data_start = header_start + header_len
+        self._sections = header["sections"]
+        self.row_count: int = header["count"]
+        self._offsets = {name: self._array(f"{name}.offsets", np.int64) for name in COLUMNS}
+        self._lookup_keys = self._array("lookup.keys", np.uint64)
+        self._lookup_rows = self._array("lookup.rows", np.int64)
+        self._added: Dict[str, Document] = {}
+        self._deleted: set = set()
+
+    def _array(self, section: str, dtype) -> np.ndarray:
+        start, nbytes = self._sections[section]
+        return np.frombuffer(self._mmap, dtype=dtype, count=nbytes // np.dtype(dtype).itemsize,
+                             offset=self._data_start + start)
+
+    def _value(self, column: str, row: int) -> bytes:
+        offsets = self._offsets[column]
+        start = self._data_start + self._sections[f"{column}.data"][0]
+        return self._mmap[start + int(offsets[row]):start + int(offsets[row + 1])]
+
+    def id_at(self, row: int) -> str:
+        return self._value("id", row).decode("utf-8")
+
+    def _find_row(self, doc_id: str) -> Optional[int]:
+        key = np.uint64(id_key(doc_id))
+        pos = int(np.searchsorted(self._lookup_keys, key))
+        # Hash collisions are possible, so confirm against the stored ID
+        while pos < len(self._lookup_keys) and self._lookup_keys[pos] == key:
+            row = int(self._lookup_rows[pos])
+            if self.id_at(row) == doc_id:
+                return row
+            pos += 1
+        return None
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search in self._added:
+            return self._added[search]
+        if search not in self._deleted:
+            row = self._find_row(search)
+            if row is not None:
+                return Document(
+                    id=search,
+                    page_content=self._value("text", row).decode("utf-8"),
+                    metadata=json.loads(self._value("metadata", row)),
+                )
+        return f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [i for i in texts if isinstance(self.search(i), Document)]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+
+    def delete(self, ids: List) -> None:
+        missing = [i for i in ids if not isinstance(self.search(i), Document)]
+        if missing:
+            raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+        for doc_id in ids:
+            if self._added.pop(doc_id, None) is None:
+                self._deleted.add(doc_id)
+
+    def close(self) -> None:
+        self._offsets = {}
+        self._lookup_keys = self._lookup_rows = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # numpy views still reference the map; it closes when they're collected
+            pass
+
+class PositionIdMap(MutableMapping):
+    """
+    ``index_to_docstore_id`` for a MappedDocstore: position ``i`` maps to the ID in
+    row ``i`` of the file, so no dict of every ID has to be built at startup.
+    Positions added later are kept in a plain dict.
+    """
+
+    def __init__(self, docstore: MappedDocstore):
+        self._docstore = docstore
+        self._base_len = docstore.row_count
+        self._extra: Dict[int, str] = {}
+
+    def __getitem__(self, position: int) -> str:
+        position = int(position)
+        if 0 <= position < self._base_len:
+            return self._docstore.id_at(position)
+        return self._extra[position]
+
+    def __setitem__(self, position: int, doc_id: str) -> None:
+        position = int(position)
+        if position < self._base_len:
+            self._materialize()
+        self._extra[position] = doc_id
+
+    def __delitem__(self, position: int) -> None:
+        self._materialize()
+        del self._extra[int(position)]
+
+    def _materialize(self) -> None:
+        base = {i: self._docstore.id_at(i) for i in range(self._base_len)}
+        self._extra = {**base, **self._extra}
+        self._base_len = 0
+
+    def __iter__(self) -> Iterator[int]:
+        yield from range(self._base_len)
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return self._base_len + len(self._extra)
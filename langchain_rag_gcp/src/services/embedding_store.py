@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .embeddings import EmbeddingService
+
+KEY_BYTES = 16
+
+def content_key(text: str) -> bytes:
+    """16-byte content hash of a chunk's text."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+class EmbeddingStore:
+    """
+    Persistent, append-only embedding store keyed by chunk content hash.
+
+    One directory per (model, dimension):
+        vectors.f32  -> row-major float32 matrix, read through a memory map
+        keys.bin     -> 16-byte content hashes, one per row, in row order
+        meta.json    -> model name and dimension
+
+    Keys are appended only after their vectors are written and fsynced, so a row
+    exists only once it is complete on disk; a torn tail from a crash is truncated
+    on open. Lookups use a sorted copy of the keys (``np.searchsorted``), which
+    costs 16 bytes per entry instead of a Python dict, plus a small dict for rows
+    added since the last sort.
+    """
+
+    def __init__(self, root: str, model_name: str, dim: int):
+        safe_model = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.path = os.path.join(root, f"{safe_model}-{dim}")
+        self.model_name = model_name
+        self.dim = dim
+        self._row_bytes = dim * 4
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.bin")
+        self._write_meta()
+        self._open()
+
+    def _write_meta(self) -> None:
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self.dim}, f)
+
+    def _open(self) -> None:
+        # Recover from a torn write: keys define how many rows are valid
+        keys_size = os.path.getsize(self._keys_path) if os.path.exists(self._keys_path) else 0
+        count = keys_size // KEY_BYTES
+        vectors_size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        count = min(count, vectors_size // self._row_bytes)
+        with open(self._keys_path, "ab") as f:
+            f.truncate(count * KEY_BYTES)
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(count * self._row_bytes)
+
+        with open(self._keys_path, "rb") as f:
+            keys = np.frombuffer(f.read(), dtype=f"S{KEY_BYTES}")
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[order]
+        self._sorted_rows = order.astype(np.int64)
+        self._recent: Dict[bytes, int] = {}
+        self._count = count
+        self._mmap: Optional[np.memmap] = None
+        self._mapped_rows = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _vectors(self) -> np.ndarray:
+        # Re-map lazily after appends; the mapping is read-only and shared via page cache
+        if self._mmap is None or self._mapped_rows != self._count:
+            if self._count == 0:
+                return np.empty((0, self.dim), dtype=np.float32)
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dim))
+            self._mapped_rows = self._count
+        return self._mmap
+
+    def _find_rows(self, keys: Sequence[bytes]) -> np.ndarray:
+        """Row index per key, -1 when missing."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if not keys:
+            return rows
+        if len(self._sorted_keys):
+            query = np.array(keys, dtype=f"S{KEY_BYTES}")
+            positions = np.searchsorted(self._sorted_keys, query)
+            positions = np.minimum(positions, len(self._sorted_keys) - 1)
+            found = self._sorted_keys[positions] == query
+            rows[found] = self._sorted_rows[positions[found]]
+        if self._recent:
+            for i, key in enumerate(keys):
+                if rows[i] < 0:
+                    rows[i] = self._recent.get(key, -1)
+        return rows
+
+    def get_many(self, texts: Sequence[str]) -> Tuple[List[Optional[List[float]]], List[int]]:
+        """Returns (vectors with None for misses, indices of the misses)."""
+        keys = [content_key(t) for t in texts]
+        with self._lock:
+            rows = self._find_rows(keys)
+            hit_idx = np.nonzero(rows >= 0)[0]
+            results: List[Optional[List[float]]] = [None] * len(texts)
+            if len(hit_idx):
+                # One fancy-indexed read from the memory map for all hits
+                block = np.asarray(self._vectors()[rows[hit_idx]])
+                for i, vector in zip(hit_idx, block.tolist()):
+                    results[i] = vector
+        misses = [i for i, v in enumerate(results) if v is None]
+        return results, misses
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim vectors, got {matrix.shape[1]}")
+        keys = [content_key(t) for t in texts]
+        with self._lock:
+            rows = self._find_rows(keys)
+            new = [i for i, row in enumerate(rows) if row < 0]
+            # Skip duplicates within the batch too
+            unique: Dict[bytes, int] = {}
+            for i in new:
+                unique.setdefault(keys[i], i)
+            if not unique:
+                return
+            order = list(unique.values())
+            # Vectors first, keys second: a key never points at a missing vector. The
+            # fsync keeps the kernel from writing the keys back before the vectors.
+            with open(self._vectors_path, "ab") as f:
+                f.write(matrix[order].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(keys[i] for i in order))
+            for offset, i in enumerate(order):
+                self._recent[keys[i]] = self._count + offset
+            self._count += len(order)
+            if len(self._recent) > max(4096, len(self._sorted_keys) // 8):
+                self._merge_recent()
+
+    def _merge_recent(self) -> None:
+        recent_keys = np.array(list(self._recent.keys()), dtype=f"S{KEY_BYTES}")
+        recent_rows = np.array(list(self._recent.values()), dtype=np.int64)
+        keys = np.concatenate([self._sorted_keys, recent_keys])
+        rows = np.concatenate([self._sorted_rows, recent_rows])
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[order]
+        self._sorted_rows = rows[order]
+        self._recent = {}
+
+class StoreBackedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults an EmbeddingStore before calling the model.
+
+    Only document embeddings go through the store; queries are not chunk content.
+    """
+
+    def __init__(self, inner: Embeddings, store: EmbeddingStore):
+        self.inner = inner
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results, misses = self.store.get_many(texts)
+        self.hits += len(texts) - len(misses)
+        self.misses += len(misses)
+        if misses:
+            miss_texts = [texts[i] for i in misses]
+            fresh = self.inner.embed_documents(miss_texts)
+            self.store.put_many(miss_texts, fresh)
+            for i, vector in zip(misses, fresh):
+                results[i] = vector
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.inner.aembed_query(text)
+
+class PersistentEmbeddingService(EmbeddingService):
+    """EmbeddingService decorator that reuses stored vectors for unchanged chunk texts."""
+
+    def __init__(self, inner: EmbeddingService, store_path: str = "data/embedding_store"):
+        self.inner = inner
+        model = inner.get_embeddings_model()
+        dim = len(model.embed_query("dimension probe"))
+        self.store = EmbeddingStore(store_path, inner.model_name, dim)
+        self.model = StoreBackedEmbeddings(model, self.store)
+
+    def get_embeddings_model(self) -> Embeddings:
+        return self.model
+
+    @property
+    def model_name(self) -> str:
+        return self.inner.model_name
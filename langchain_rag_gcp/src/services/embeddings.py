@@ -1,22 +1,239 @@
+import math
+import threading
+import unicodedata
+import zlib
 from abc import ABC, abstractmethod
-from typing import List, Any
+from collections import OrderedDict
+from typing import Dict, List, Any, Tuple
+import numpy as np
 from langchain_core.embeddings import Embeddings
 from langchain_community.embeddings import FakeEmbeddings
+from .lexical_index import tokenize
+from .metrics import timed
 
 class EmbeddingService(ABC):
     """Abstract base class for embedding services."""
-    
+
     @abstractmethod
     def get_embeddings_model(self) -> Embeddings:
         """Return the LangChain Embeddings model."""
         pass
 
+    @property
+    def model_name(self) -> str:
+        """Identifier of the underlying model; used to key caches."""
+        return type(self).__name__
+
 class LocalEmbeddingService(EmbeddingService):
     """Local simulation of Vertex AI Embeddings using FakeEmbeddings."""
-    
+
     def __init__(self, size: int = 768):
         self.size = size
         self.model = FakeEmbeddings(size=size)
-        
+
+    def get_embeddings_model(self) -> Embeddings:
+        return self.model
+
+    @property
+    def model_name(self) -> str:
+        return f"fake-{self.size}"
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings from hashed tokens ("hash embeddings").
+
+    Each token (``lexical_index.tokenize``) maps through two CRC32 hashes to two
+    rows of a fixed random table, combined with a hashed sign, so distinct tokens
+    get near-orthogonal dense vectors without a vocabulary. A text is the
+    L2-normalized, sublinear-tf weighted sum of its token vectors, so cosine
+    similarity tracks word overlap, like a bag-of-words model. A batch is one
+    (texts x buckets) @ (buckets x size) product, which embeds thousands of texts
+    per second on a CPU.
+
+    The same text, ``size``, ``seed`` and ``buckets`` always give the same vector.
+    """
+
+    # Texts embedded together; bounds the (texts x buckets) weight matrix
+    BLOCK = 256
+
+    def __init__(self, size: int = 768, seed: int = 0, buckets: int = 8192):
+        self.size = size
+        self.seed = seed
+        self.buckets = buckets
+        self._table = np.random.default_rng(seed).standard_normal((buckets, size), dtype=np.float32)
+        self._table /= math.sqrt(2 * size)
+
+    def _token_hashes(self, token: str) -> Tuple[int, int, float]:
+        # (bucket 1, bucket 2, sign). Recomputed per block rather than cached: two CRC32s
+        # cost less than keeping every token a server has ever seen in memory.
+        data = token.encode("utf-8")
+        h1 = zlib.crc32(data)
+        h2 = zlib.crc32(data, 0x9E3779B9)
+        return h1 % self.buckets, h2 % self.buckets, 1.0 if h2 & (1 << 31) else -1.0
+
+    def _embed_block(self, texts: List[str]) -> np.ndarray:
+        token_lists = [tokenize(text) for text in texts]
+        tokens = [t for token_list in token_lists for t in token_list]
+        if not tokens:
+            return np.zeros((len(texts), self.size), dtype=np.float32)
+        # Column per distinct token in the block, assigned in C rather than per token
+        vocabulary, cols = np.unique(np.array(tokens), return_inverse=True)
+        rows = np.repeat(np.arange(len(texts)), [len(t) for t in token_lists])
+        hashes = np.array([self._token_hashes(t) for t in vocabulary.tolist()], dtype=np.float64)
+        first, second = hashes[:, 0].astype(np.int64), hashes[:, 1].astype(np.int64)
+
+        # (text, token) pairs with their counts
+        pairs, counts = np.unique(rows * len(vocabulary) + cols, return_counts=True)
+        pair_rows, pair_cols = np.divmod(pairs, len(vocabulary))
+        weights = 1.0 + np.log(counts)
+        # Each token adds its weight to its first bucket and the signed weight to its
+        # second. Only the buckets the block uses take part, so a single query reads
+        # a few rows of the table rather than all of it; the (texts x used buckets)
+        # matrix times those rows is one BLAS product.
+        used, bucket_cols = np.unique(np.concatenate([first[pair_cols], second[pair_cols]]), return_inverse=True)
+        bucket_weights = np.bincount(
+            np.concatenate([pair_rows, pair_rows]) * len(used) + bucket_cols,
+            weights=np.concatenate([weights, weights * hashes[pair_cols, 2]]),
+            minlength=len(texts) * len(used),
+        ).reshape(len(texts), len(used)).astype(np.float32)
+        out = bucket_weights @ self._table[used]
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms > 0, norms, 1.0)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        blocks = [self._embed_block(texts[i:i + self.BLOCK]) for i in range(0, len(texts), self.BLOCK)]
+        return np.vstack(blocks).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class HashingEmbeddingService(EmbeddingService):
+    """Deterministic local embeddings (see HashingEmbeddings) for offline runs and benchmarks."""
+
+    def __init__(self, size: int = 768, seed: int = 0):
+        self.size = size
+        self.seed = seed
+        self.model = HashingEmbeddings(size=size, seed=seed)
+
     def get_embeddings_model(self) -> Embeddings:
         return self.model
+
+    @property
+    def model_name(self) -> str:
+        return f"hashing-{self.size}-{self.seed}"
+
+def normalize_text(text: str) -> str:
+    """Cache key normalization: Unicode NFKC, collapsed whitespace. Case is preserved."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an LRU cache for query embeddings.
+
+    Keys are (model name, normalized text); vectors are stored as float32 and the
+    cache is bounded by ``max_bytes`` of vector data. Document embeddings (ingestion)
+    pass straight through so they can't flush the query working set.
+    """
+
+    def __init__(self, inner: Embeddings, model_name: str, max_bytes: int = 64 * 1024 * 1024):
+        self.inner = inner
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> Tuple[str, str]:
+        return (self.model_name, normalize_text(text))
+
+    def _lookup(self, key: Tuple[str, str]):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector.tolist()
+
+    def _store(self, key: Tuple[str, str], embedding: List[float]) -> None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = vector
+            self._bytes += vector.nbytes
+            # Evict least recently used entries until we're back under budget
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        embedding = self._embed_query_uncached(text)
+        self._store(key, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        embedding = await self._aembed_query_uncached(text)
+        self._store(key, embedding)
+        return embedding
+
+    # Model calls (cache misses and documents) are timed; hits are counted in stats()
+    @timed("embedding", "embed_query")
+    def _embed_query_uncached(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+    @timed("embedding", "embed_query")
+    async def _aembed_query_uncached(self, text: str) -> List[float]:
+        return await self.inner.aembed_query(text)
+
+    @timed("embedding")
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    @timed("embedding", "embed_documents")
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+class CachedEmbeddingService(EmbeddingService):
+    """EmbeddingService decorator that adds a query-embedding LRU cache."""
+
+    def __init__(self, inner: EmbeddingService, max_bytes: int = 64 * 1024 * 1024):
+        self.inner = inner
+        self.cache = CachedEmbeddings(inner.get_embeddings_model(), inner.model_name, max_bytes=max_bytes)
+
+    def get_embeddings_model(self) -> Embeddings:
+        return self.cache
+
+    @property
+    def model_name(self) -> str:
+        return self.inner.model_name
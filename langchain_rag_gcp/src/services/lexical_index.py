@@ -0,0 +1,313 @@
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+# Word characters, keeping identifiers like "ERR-1042", "SKU_77.3" or "v2.1" whole
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-.]\w+)*")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased tokens. Compounds are kept whole and also split: hyphenated words
+    into all their parts, identifiers only into their parts with digits, so
+    "ERR-4711" matches "4711" without making a prefix like "err" a common term.
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(match)
+        if "-" in match or "." in match:
+            parts = [p for p in re.split(r"[-.]", match) if p]
+            if any(c.isdigit() for c in match):
+                parts = [p for p in parts if any(c.isdigit() for c in p)]
+            tokens.extend(parts)
+    return tokens
+
+class _Postings:
+    """
+    Postings list for one term: document numbers delta-encoded in ``array('I')``,
+    term frequencies in ``array('H')``. Every ``BLOCK`` entries the absolute document
+    number is kept in ``block_first`` so a lookup decodes only the blocks it needs,
+    next to the block's best BM25 term-frequency factor (for block-max pruning).
+    """
+    __slots__ = ("deltas", "tfs", "block_first", "block_max", "block_avgdl", "last")
+    BLOCK = 128
+
+    def __init__(self):
+        self.deltas = array("I")
+        self.tfs = array("H")
+        self.block_first = array("I")
+        # Highest tf factor in each block, and the smallest average document length
+        # it was computed with (the factor only grows with avgdl, see block_bounds)
+        self.block_max = array("f")
+        self.block_avgdl = array("f")
+        self.last = 0
+
+    def __len__(self) -> int:
+        return len(self.deltas)
+
+    def append(self, docnum: int, tf: int, impact: float, avgdl: float) -> None:
+        if len(self.deltas) % self.BLOCK == 0:
+            self.block_first.append(docnum)
+            self.block_max.append(impact)
+            self.block_avgdl.append(avgdl)
+        else:
+            self.block_max[-1] = max(self.block_max[-1], impact)
+            self.block_avgdl[-1] = min(self.block_avgdl[-1], avgdl)
+        self.deltas.append(docnum - self.last if self.deltas else docnum)
+        self.tfs.append(min(tf, 0xFFFF))
+        self.last = docnum
+
+    @classmethod
+    def from_arrays(cls, docs: np.ndarray, tfs: np.ndarray, impacts: np.ndarray, avgdl: float) -> "_Postings":
+        """Postings of sorted ``docs`` in one go (used when compacting)."""
+        postings = cls()
+        postings.deltas = array("I", np.diff(docs, prepend=0).astype(np.uint32).tobytes())
+        postings.tfs = array("H", tfs.astype(np.uint16).tobytes())
+        starts = np.arange(0, len(docs), cls.BLOCK)
+        postings.block_first = array("I", docs[starts].astype(np.uint32).tobytes())
+        postings.block_max = array("f", np.maximum.reduceat(impacts, starts).astype(np.float32).tobytes())
+        postings.block_avgdl = array("f", np.full(len(starts), avgdl, dtype=np.float32).tobytes())
+        postings.last = int(docs[-1])
+        return postings
+
+    def block_bounds(self, idf: float, avgdl: float) -> np.ndarray:
+        """Upper bound of this term's BM25 contribution for any document in each block."""
+        # With avgdl' > avgdl the tf factor grows by at most avgdl' / avgdl
+        stored = np.frombuffer(self.block_avgdl, dtype=np.float32)
+        growth = np.maximum(1.0, avgdl / stored)
+        # Small margin for float32 rounding of the stored maxima
+        return idf * np.frombuffer(self.block_max, dtype=np.float32) * growth * (1 + 1e-6)
+
+    def decode(self) -> Tuple[np.ndarray, np.ndarray]:
+        docs = np.cumsum(np.frombuffer(self.deltas, dtype=np.uint32), dtype=np.int64)
+        return docs, np.frombuffer(self.tfs, dtype=np.uint16)
+
+    def decode_blocks(self, blocks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(docnums, tfs) of the given sorted blocks."""
+        if not len(blocks):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint16)
+        if len(blocks) * 2 > len(self.block_first):
+            # Most of the list is needed anyway: one straight decode is cheaper
+            docs, tfs = self.decode()
+            keep = np.zeros(len(self.block_first), dtype=bool)
+            keep[blocks] = True
+            mask = np.repeat(keep, self.BLOCK)[:len(docs)]
+            return docs[mask], tfs[mask]
+        # Gather the blocks into rows, restart each row at the block's absolute first
+        # document, and cumsum per row
+        n = len(self.deltas)
+        slots = blocks[:, None] * self.BLOCK + np.arange(self.BLOCK)
+        valid = slots < n
+        slots = np.minimum(slots, n - 1)
+        deltas = np.frombuffer(self.deltas, dtype=np.uint32)[slots].astype(np.int64)
+        deltas[:, 0] = np.frombuffer(self.block_first, dtype=np.uint32)[blocks]
+        deltas[~valid] = 0
+        return np.cumsum(deltas, axis=1)[valid], np.frombuffer(self.tfs, dtype=np.uint16)[slots][valid]
+
+    def blocks_of(self, docnums: np.ndarray) -> np.ndarray:
+        """Sorted blocks that could contain the sorted ``docnums``."""
+        starts = np.frombuffer(self.block_first, dtype=np.uint32)
+        blocks = np.unique(np.searchsorted(starts, docnums, side="right") - 1)
+        return blocks[blocks >= 0]
+
+class BM25Index:
+    """
+    In-process BM25 inverted index kept next to the FAISS index.
+
+    Documents get sequential internal numbers, so postings are append-only and stay
+    sorted, which keeps delta encoding trivial. Deletes are tombstones, skipped at
+    query time. Once they make up ``COMPACT_FRACTION`` of the documents, the
+    postings are rewritten without them and the survivors renumbered. Until then a
+    term's document frequency still counts its deleted documents, capped at the
+    live count so idf stays positive.
+
+    Queries are exact top-k with MaxScore / block-max pruning. Terms are processed
+    from the highest score upper bound down. A document first seen at term ``i``
+    can only gain the bounds of the terms after it, so once ``k`` candidates exist,
+    blocks of term ``i`` whose bound plus that remainder is below the current k-th
+    score are never decoded for new documents; they are only probed for existing
+    candidates. Rare terms (IDs, error codes) fill the candidate set quickly and
+    common terms then cost a few block decodes instead of a full postings scan.
+    """
+
+    # Deleted share of the document numbers that triggers a compaction
+    COMPACT_FRACTION = 0.2
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, _Postings] = {}
+        self._doc_ids: List[str] = []
+        self._docnum_of: Dict[str, int] = {}
+        self._doc_len = array("I")
+        self._live = bytearray()
+        self._live_count = 0
+        self._live_len = 0
+
+    @classmethod
+    def build(cls, store: FAISS, **kwargs) -> "BM25Index":
+        """Index every document in the store."""
+        index = cls(**kwargs)
+        ids, texts = [], []
+        for position in range(store.index.ntotal):
+            doc_id = store.index_to_docstore_id[position]
+            doc = store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                ids.append(doc_id)
+                texts.append(doc.page_content)
+        index.add(ids, texts)
+        return index
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    def _tf_factor(self, tf, length, avgdl):
+        return tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avgdl))
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]) -> None:
+        for doc_id, text in zip(ids, texts):
+            if doc_id in self._docnum_of:
+                self.remove([doc_id])
+            docnum = len(self._doc_ids)
+            tokens = tokenize(text)
+            self._doc_ids.append(doc_id)
+            self._docnum_of[doc_id] = docnum
+            self._doc_len.append(len(tokens))
+            self._live.append(1)
+            self._live_count += 1
+            self._live_len += len(tokens)
+            avgdl = self._live_len / self._live_count or 1.0
+            for term, tf in Counter(tokens).items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                postings.append(docnum, tf, self._tf_factor(tf, len(tokens), avgdl), avgdl)
+
+    def remove(self, ids: Iterable[str]) -> None:
+        for doc_id in ids:
+            docnum = self._docnum_of.pop(doc_id, None)
+            if docnum is None:
+                continue
+            self._live[docnum] = 0
+            self._live_count -= 1
+            self._live_len -= self._doc_len[docnum]
+        if len(self._doc_ids) - self._live_count > self.COMPACT_FRACTION * len(self._doc_ids):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Drop tombstoned documents from every postings list and renumber the rest."""
+        live = np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+        renumber = np.cumsum(live) - 1
+        lengths = np.frombuffer(self._doc_len, dtype=np.uint32)
+        avgdl = (self._live_len / self._live_count if self._live_count else 0.0) or 1.0
+        postings = {}
+        for term, old in self._postings.items():
+            docs, tfs = old.decode()
+            keep = live[docs]
+            if not keep.any():
+                continue
+            docs, tfs = docs[keep], tfs[keep]
+            impacts = self._tf_factor(tfs.astype(np.float64), lengths[docs], avgdl)
+            postings[term] = _Postings.from_arrays(renumber[docs], tfs, impacts, avgdl)
+        self._postings = postings
+        self._doc_ids = [doc_id for doc_id, alive in zip(self._doc_ids, live) if alive]
+        self._docnum_of = {doc_id: docnum for docnum, doc_id in enumerate(self._doc_ids)}
+        self._doc_len = array("I", lengths[live].tobytes())
+        self._live = bytearray(b"\x01" * self._live_count)
+
+    def _idf(self, df: int) -> float:
+        # df may still count tombstoned documents; more than the live count would
+        # make idf negative
+        df = min(df, self._live_count)
+        return math.log(1 + (self._live_count - df + 0.5) / (df + 0.5))
+
+    def _term_scores(self, idf: float, docs: np.ndarray, tfs: np.ndarray, avgdl: float) -> np.ndarray:
+        lengths = np.frombuffer(self._doc_len, dtype=np.uint32)[docs]
+        return idf * self._tf_factor(tfs.astype(np.float64), lengths, avgdl)
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        """Top-k (document ID, BM25 score), best first."""
+        if not self._live_count or k <= 0:
+            return []
+        avgdl = self._live_len / self._live_count or 1.0
+        terms = []
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            idf = self._idf(len(postings))
+            bounds = postings.block_bounds(idf, avgdl)
+            terms.append((float(bounds.max()), idf, bounds, postings))
+        if not terms:
+            return []
+        terms.sort(key=lambda t: t[0], reverse=True)
+        # remaining[i]: best score a document could still gain from terms i..end
+        remaining = np.cumsum([t[0] for t in terms][::-1])[::-1].tolist() + [0.0]
+        live = np.frombuffer(self._live, dtype=np.uint8)
+        # Sparse candidate set: sorted document numbers and their partial scores
+        cand_docs = np.empty(0, dtype=np.int64)
+        cand_scores = np.empty(0, dtype=np.float64)
+
+        def kth_score() -> float:
+            return float(np.partition(cand_scores, -k)[-k]) if len(cand_scores) >= k else 0.0
+
+        def accumulate(docs, tfs, idf, new_docs: bool):
+            nonlocal cand_docs, cand_scores
+            keep = live[docs] == 1
+            docs = docs[keep]
+            term_scores = self._term_scores(idf, docs, tfs[keep], avgdl)
+            if new_docs:
+                merged, inverse = np.unique(np.concatenate([cand_docs, docs]), return_inverse=True)
+                cand_scores = np.bincount(
+                    inverse, weights=np.concatenate([cand_scores, term_scores]), minlength=len(merged)
+                )
+                cand_docs = merged
+            else:
+                cand_scores[np.searchsorted(cand_docs, docs)] += term_scores
+
+        def probe(docs, tfs, idf, among):
+            # Score only documents that are already candidates
+            found = np.isin(docs, among, assume_unique=True)
+            accumulate(docs[found], tfs[found], idf, new_docs=False)
+
+        for i, (_, idf, bounds, postings) in enumerate(terms):
+            if len(cand_docs) >= k and kth_score() >= remaining[i]:
+                # Non-essential term: it can only raise scores of existing candidates
+                probe(*postings.decode_blocks(postings.blocks_of(cand_docs)), idf, cand_docs)
+            else:
+                previous = cand_docs
+                done = np.zeros(len(bounds), dtype=bool)
+                if len(cand_docs) < k:
+                    # Seed the threshold from this term's most promising blocks
+                    order = np.argsort(-bounds, kind="stable")
+                    seed = np.sort(order[:(k - len(cand_docs)) // postings.BLOCK + 1])
+                    accumulate(*postings.decode_blocks(seed), idf, new_docs=True)
+                    done[seed] = True
+                # Blocks that can still put a new document into the top k
+                eligible = ~done & (bounds + remaining[i + 1] >= kth_score())
+                accumulate(*postings.decode_blocks(np.flatnonzero(eligible)), idf, new_docs=True)
+                done |= eligible
+                # Earlier candidates in the skipped blocks still get this term's score
+                skipped = postings.blocks_of(previous)
+                skipped = skipped[~done[skipped]]
+                if len(skipped):
+                    probe(*postings.decode_blocks(skipped), idf, previous)
+            # Drop candidates that can't reach the current k-th score anymore
+            if len(cand_docs) > k:
+                keep = cand_scores + remaining[i + 1] >= kth_score()
+                cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+
+        top = np.argsort(-cand_scores, kind="stable")[:k]
+        return [(self._doc_ids[int(cand_docs[j])], float(cand_scores[j])) for j in top]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int, rrf_k: int = 60) -> List[str]:
+    """Merge ranked ID lists: score(d) = sum over lists of 1 / (rrf_k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=lambda d: scores[d], reverse=True)[:k]
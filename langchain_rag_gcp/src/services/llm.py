@@ -1,27 +1,83 @@
+import asyncio
+import re
+import time
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, AsyncIterator, Iterator, List
 from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 from langchain_community.chat_models import FakeListChatModel
 
 class GenAIService(ABC):
     """Abstract base class for Generative AI services."""
-    
+
     @abstractmethod
     def get_llm(self) -> BaseChatModel:
         """Return the LangChain Chat Model."""
         pass
 
+# Word-level "tokens": each word together with its trailing whitespace
+_TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+class SimulatedChatModel(FakeListChatModel):
+    """
+    FakeListChatModel that waits ``latency_s`` per call to mimic a remote LLM.
+
+    The async path awaits instead of sleeping in a thread, like a real network client.
+    Streaming yields word-level tokens: ``latency_s`` before the first one and
+    ``sleep`` (if set) between tokens.
+    """
+    latency_s: float = 0.0
+
+    def _next_response(self) -> str:
+        response = self.responses[self.i]
+        self.i = self.i + 1 if self.i < len(self.responses) - 1 else 0
+        return response
+
+    @staticmethod
+    def _tokenize(response: str) -> List[str]:
+        return _TOKEN_PATTERN.findall(response)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        response = self._next_response()
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        for i, token in enumerate(self._tokenize(response)):
+            if i and self.sleep is not None:
+                time.sleep(self.sleep)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        response = self._next_response()
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        for i, token in enumerate(self._tokenize(response)):
+            if i and self.sleep is not None:
+                await asyncio.sleep(self.sleep)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs: Any) -> str:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return super()._call(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        output_str = super()._call(messages, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=output_str))])
+
 class LocalGenAIService(GenAIService):
     """Local simulation of Gemini using FakeListChatModel."""
-    
-    def __init__(self, responses: list[str] = None):
+
+    def __init__(self, responses: list[str] = None, latency_s: float = 0.0, token_latency_s: float = None):
         if responses is None:
             responses = [
                 "This is a simulated response based on the retrieved context.",
                 "I found some relevant information in the documents.",
                 "According to the context, the answer is... (simulated)"
             ]
-        self.model = FakeListChatModel(responses=responses)
-        
+        self.model = SimulatedChatModel(responses=responses, latency_s=latency_s, sleep=token_latency_s)
+
     def get_llm(self) -> BaseChatModel:
         return self.model
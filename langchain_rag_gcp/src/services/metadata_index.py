@@ -0,0 +1,99 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+# Metadata values that can be filtered on (must be hashable and JSON-stable)
+SCALAR_TYPES = (str, int, float, bool)
+
+class MetadataIndex:
+    """
+    Inverted index from metadata ``(key, value)`` pairs to FAISS index positions.
+
+    Postings are sorted int64 arrays (``array('q')``, viewed as NumPy without a
+    copy), so a filter is a few set operations over small arrays and the result can
+    go straight into a FAISS ID selector. Positions are what FAISS returns, so they
+    are shifted down when earlier vectors are deleted.
+
+    Filters use the same shape as LangChain's FAISS filters: ``{"source": "a.txt"}``
+    for equality, ``{"source": ["a.txt", "b.txt"]}`` for any-of, and several keys
+    combine with AND.
+    """
+
+    def __init__(self):
+        self._postings: Dict[Tuple[str, Any], array] = {}
+
+    @classmethod
+    def build(cls, store: FAISS) -> "MetadataIndex":
+        """Index every document in the store, in position order."""
+        index = cls()
+        metadatas = []
+        for position in range(store.index.ntotal):
+            doc = store.docstore.search(store.index_to_docstore_id[position])
+            metadatas.append(doc.metadata if isinstance(doc, Document) else {})
+        index.add(0, metadatas)
+        return index
+
+    def add(self, start_position: int, metadatas: Iterable[Optional[dict]]) -> None:
+        """Register documents stored at consecutive positions from ``start_position``."""
+        for position, metadata in enumerate(metadatas, start=start_position):
+            for key, value in (metadata or {}).items():
+                if isinstance(value, SCALAR_TYPES):
+                    self._postings.setdefault((key, value), array("q")).append(position)
+
+    def remove(self, positions: Iterable[int], shift: bool = True) -> None:
+        """
+        Drop deleted positions and shift the rest down, matching FAISS compaction.
+        ``shift=False`` for positions that are only tombstoned (HNSW).
+        """
+        deleted = np.unique(np.fromiter(positions, dtype=np.int64))
+        if not len(deleted):
+            return
+        for key in list(self._postings):
+            current = np.frombuffer(self._postings[key], dtype=np.int64)
+            kept = current[~np.isin(current, deleted, assume_unique=True)]
+            if not len(kept):
+                del self._postings[key]
+                continue
+            if shift:
+                kept = kept - np.searchsorted(deleted, kept)
+            self._postings[key] = array("q", kept.tobytes())
+
+    def _positions(self, key: str, value: Any) -> np.ndarray:
+        postings = self._postings.get((key, value))
+        if postings is None:
+            return np.empty(0, dtype=np.int64)
+        return np.frombuffer(postings, dtype=np.int64)
+
+    def match(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Sorted positions of the documents matching ``filter``."""
+        result: Optional[np.ndarray] = None
+        # Evaluate the most selective key first so the intersections stay small
+        clauses: List[np.ndarray] = []
+        for key, wanted in filter.items():
+            if isinstance(wanted, (list, tuple, set)):
+                parts = [self._positions(key, v) for v in wanted]
+                clauses.append(np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64))
+            elif isinstance(wanted, SCALAR_TYPES):
+                clauses.append(self._positions(key, wanted))
+            else:
+                raise ValueError(f"Unsupported filter value for {key!r}: {wanted!r}")
+        for positions in sorted(clauses, key=len):
+            result = positions if result is None else np.intersect1d(result, positions, assume_unique=True)
+            if not len(result):
+                break
+        # Copy: a view would pin the postings array and make appends fail
+        return result.copy() if result is not None else np.empty(0, dtype=np.int64)
+
+def matches_filter(metadata: Optional[dict], filter: Dict[str, Any]) -> bool:
+    """Whether one document's metadata satisfies ``filter`` (same rules as ``MetadataIndex.match``)."""
+    metadata = metadata or {}
+    for key, wanted in filter.items():
+        value = metadata.get(key)
+        if isinstance(wanted, (list, tuple, set)):
+            if value not in wanted:
+                return False
+        elif value != wanted:
+            return False
+    return True
@@ -0,0 +1,214 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Upper bounds in seconds, from sub-millisecond cache hits to multi-second LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """
+    Latency histogram per label set, in Prometheus' cumulative-bucket model.
+
+    ``observe`` is a bisect and three additions under a lock, cheap enough to call
+    around every service call.
+    """
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        """label values -> (per-bucket counts, sum, count)."""
+        with self._lock:
+            return {labels: (list(s[0]), s[1], s[2]) for labels, s in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {count}")
+        return lines
+
+GaugeValue = Union[float, Dict[Tuple[str, ...], float]]
+
+class Gauge:
+    """
+    A value read at scrape time from ``read``: a number, or a dict from label
+    values to numbers. A failing or ``None`` read is left out of the output.
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], Optional[GaugeValue]], label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label_names = tuple(label_names)
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            print(f"Metric {self.name} could not be read: {e}")
+            value = None
+        if value is None:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        series = value if isinstance(value, dict) else {(): value}
+        for values, number in sorted(series.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {_number(number)}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Histogram, Gauge]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help: str, label_names: Sequence[str] = ()) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(name, help, label_names)
+            return metric
+
+    def gauge(self, name: str, help: str, read: Callable[[], Optional[GaugeValue]], label_names: Sequence[str] = ()) -> Gauge:
+        """Register (or replace) a gauge."""
+        with self._lock:
+            metric = self._metrics[name] = Gauge(name, help, read, label_names)
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds", "Time spent in each stage of a chat request.", ("stage",)
+)
+SERVICE_SECONDS = REGISTRY.histogram(
+    "rag_service_call_seconds", "Latency of storage, embedding and vector search calls.", ("service", "operation")
+)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as one chat stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, name)
+
+def timed(service: str, operation: Optional[str] = None) -> Callable:
+    """Decorator recording each call of a sync or async method in SERVICE_SECONDS."""
+
+    def decorate(func: Callable) -> Callable:
+        label = operation or func.__name__
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    SERVICE_SECONDS.observe(time.perf_counter() - start, service, label)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                SERVICE_SECONDS.observe(time.perf_counter() - start, service, label)
+        return wrapper
+
+    return decorate
+
+class StageTimer(BaseCallbackHandler):
+    """
+    LangChain callback timing the retriever or LLM run it is attached to (via
+    ``with_config(callbacks=[...])``) as one chat stage. Unlike wrapping the
+    runnable, this keeps token streaming intact.
+    """
+
+    # Runs in the caller's thread/loop instead of being dispatched to an executor
+    run_inline = True
+
+    def __init__(self, stage_name: str):
+        self.stage_name = stage_name
+        self._starts: Dict[Any, float] = {}
+
+    def _start(self, run_id) -> None:
+        self._starts[run_id] = time.perf_counter()
+
+    def _end(self, run_id) -> None:
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            STAGE_SECONDS.observe(time.perf_counter() - start, self.stage_name)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs) -> None:
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id)
@@ -0,0 +1,361 @@
+import base64
+import fcntl
+import json
+import os
+import shutil
+from typing import Any, Callable, Dict, List, Optional
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from .ann_index import compact_tombstones, remove_documents, should_compact
+from .docstore import MappedDocstore, PositionIdMap, write_docstore
+
+class IndexPersistence:
+    """
+    Crash-safe on-disk layout for a FAISS vector store.
+
+    index_path/
+        CURRENT                 -> {"snapshot": "snapshot-000003", "last_seq": 41}
+        snapshot-000003/        -> full snapshot (written to a .tmp dir, then renamed)
+            index.faiss         -> FAISS index (faiss.write_index)
+            docstore.bin        -> columnar documents, see docstore.write_docstore
+        wal.jsonl               -> append log of operations after the snapshot
+        LEADER.lock             -> flock held by the writer when processes share the index
+
+    A snapshot becomes visible only when CURRENT is atomically replaced, so a crash
+    mid-write leaves the previous snapshot intact. Every logged operation carries a
+    sequence number; on load, operations newer than the snapshot's ``last_seq`` are
+    replayed, so acknowledged writes survive a crash between snapshots.
+
+    With ``mmap=True`` snapshots are opened memory-mapped: the index and documents
+    are paged in on demand and processes on one host share the page cache. A mapped
+    index is read-only, so ``make_writable`` copies it into RAM before the first
+    mutation. Older pickle-based snapshots still load and are rewritten in the new
+    format by the next snapshot.
+    """
+
+    CURRENT_FILE = "CURRENT"
+    LOG_FILE = "wal.jsonl"
+    SNAPSHOT_PREFIX = "snapshot-"
+    # Files written by FAISS.save_local before snapshots existed
+    LEGACY_FILES = ("index.faiss", "index.pkl")
+    INDEX_FILE = "index.faiss"
+    DOCSTORE_FILE = "docstore.bin"
+
+    def __init__(self, index_path: str, mmap: bool = True):
+        self.index_path = index_path
+        self.mmap = mmap
+        self.last_seq = 0
+        # Documents touched by log records replayed on load (not yet in a snapshot)
+        self.replayed_ops = 0
+        self._log_file = None
+        # Index currently backed by a read-only mapping of a snapshot file
+        self._mapped_index = None
+
+    # --- Loading -----------------------------------------------------------
+
+    def _read_current(self) -> Optional[Dict[str, Any]]:
+        current_path = os.path.join(self.index_path, self.CURRENT_FILE)
+        if not os.path.exists(current_path):
+            return None
+        with open(current_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def published_snapshot(self) -> Optional[str]:
+        """Name of the snapshot CURRENT points at, or None before the first one."""
+        current = self._read_current()
+        return current["snapshot"] if current else None
+
+    def load(
+        self, embeddings: Embeddings, create_store: Optional["StoreFactory"] = None, replay_log: bool = True
+    ) -> Optional[FAISS]:
+        """
+        Load the latest snapshot (or legacy index) and replay the append log.
+
+        ``create_store`` builds the store when the log's first add has no snapshot
+        underneath it (defaults to a flat index). Read-only followers pass
+        ``replay_log=False``: replaying would copy the mapped index into RAM, and the
+        log belongs to the writer, which publishes it with its next snapshot.
+        """
+        store = None
+        current = self._read_current()
+        if current is not None:
+            snapshot_dir = os.path.join(self.index_path, current["snapshot"])
+            store = self._load_snapshot(snapshot_dir, embeddings)
+            self.last_seq = current.get("last_seq", 0)
+        elif os.path.exists(os.path.join(self.index_path, self.LEGACY_FILES[0])):
+            try:
+                store = self._load_snapshot(self.index_path, embeddings)
+            except Exception:
+                # Fallback if load fails or file is corrupt
+                store = None
+
+        if not replay_log:
+            return store
+        return self._replay_log(store, embeddings, create_store)
+
+    def _load_snapshot(self, snapshot_dir: str, embeddings: Embeddings) -> FAISS:
+        docstore_path = os.path.join(snapshot_dir, self.DOCSTORE_FILE)
+        if not os.path.exists(docstore_path):
+            # Pickled docstore from before the columnar format
+            return FAISS.load_local(
+                snapshot_dir,
+                embeddings,
+                allow_dangerous_deserialization=True
+            )
+        index_path = os.path.join(snapshot_dir, self.INDEX_FILE)
+        if self.mmap:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+            self._mapped_index = index
+        else:
+            index = faiss.read_index(index_path)
+        docstore = MappedDocstore(docstore_path)
+        return FAISS(embeddings, index, docstore, PositionIdMap(docstore))
+
+    def open_docstore(self) -> MappedDocstore:
+        """Map the docstore of the snapshot CURRENT points at."""
+        return MappedDocstore(os.path.join(self.index_path, self.published_snapshot(), self.DOCSTORE_FILE))
+
+    def make_writable(self, store: Optional[FAISS]) -> None:
+        """Replace a memory-mapped index with an in-RAM copy so it can be modified."""
+        if store is None or self._mapped_index is None or store.index is not self._mapped_index:
+            return
+        # Mutating a mapped index aborts inside FAISS; a serialize round trip owns its data
+        store.index = faiss.deserialize_index(faiss.serialize_index(store.index))
+        self._mapped_index = None
+
+    def _replay_log(
+        self, store: Optional[FAISS], embeddings: Embeddings, create_store: Optional["StoreFactory"]
+    ) -> Optional[FAISS]:
+        log_path = os.path.join(self.index_path, self.LOG_FILE)
+        if not os.path.exists(log_path):
+            return store
+        valid_end = 0
+        with open(log_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated record")
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn final write from a crash: the op was never acknowledged.
+                    break
+                valid_end += len(line)
+                if record["seq"] <= self.last_seq:
+                    continue
+                self.make_writable(store)
+                store = apply_record(store, record, embeddings, create_store)
+                self.last_seq = record["seq"]
+                self.replayed_ops += len(record["ids"])
+        if valid_end < os.path.getsize(log_path):
+            # Cut the fragment off, or the next append would land on the same line
+            # and be unreadable on the following load
+            with open(log_path, "r+b") as f:
+                f.truncate(valid_end)
+                os.fsync(f.fileno())
+        return store
+
+    # --- Writing -----------------------------------------------------------
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Durably append an operation to the log. Returns its sequence number."""
+        if self._log_file is None:
+            os.makedirs(self.index_path, exist_ok=True)
+            self._log_file = open(os.path.join(self.index_path, self.LOG_FILE), "a", encoding="utf-8")
+        self.last_seq += 1
+        record = dict(record, seq=self.last_seq)
+        self._log_file.write(json.dumps(record) + "\n")
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+        return self.last_seq
+
+    def write_snapshot(self, store: FAISS) -> None:
+        """Write a full snapshot atomically, then truncate the append log."""
+        os.makedirs(self.index_path, exist_ok=True)
+        current = self._read_current()
+        previous = current["snapshot"] if current else None
+        next_number = int(previous[len(self.SNAPSHOT_PREFIX):]) + 1 if previous else 1
+        name = f"{self.SNAPSHOT_PREFIX}{next_number:06d}"
+
+        # 1. Write the snapshot to a temp dir and rename it into place
+        tmp_dir = os.path.join(self.index_path, name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        faiss.write_index(store.index, os.path.join(tmp_dir, self.INDEX_FILE))
+        write_docstore(os.path.join(tmp_dir, self.DOCSTORE_FILE), _docstore_rows(store))
+        for file_name in os.listdir(tmp_dir):
+            _fsync_path(os.path.join(tmp_dir, file_name))
+        final_dir = os.path.join(self.index_path, name)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+
+        # 2. Atomically point CURRENT at it
+        self._write_current({"snapshot": name, "last_seq": self.last_seq})
+
+        # 3. Everything up to last_seq is in the snapshot; the log can start over
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        log_path = os.path.join(self.index_path, self.LOG_FILE)
+        if os.path.exists(log_path):
+            open(log_path, "w").close()
+
+        self._remove_stale(keep=name)
+
+    def _write_current(self, data: Dict[str, Any]) -> None:
+        current_path = os.path.join(self.index_path, self.CURRENT_FILE)
+        tmp_path = current_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, current_path)
+        _fsync_path(self.index_path)
+
+    def _remove_stale(self, keep: str) -> None:
+        for entry in os.listdir(self.index_path):
+            path = os.path.join(self.index_path, entry)
+            if entry.startswith(self.SNAPSHOT_PREFIX) and entry != keep:
+                shutil.rmtree(path, ignore_errors=True)
+            elif entry in self.LEGACY_FILES:
+                # Superseded by the snapshot
+                os.remove(path)
+
+    def clear(self) -> None:
+        """Remove every snapshot, the append log and any legacy index files."""
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        if not os.path.exists(self.index_path):
+            return
+        for entry in os.listdir(self.index_path):
+            path = os.path.join(self.index_path, entry)
+            if entry.startswith(self.SNAPSHOT_PREFIX):
+                shutil.rmtree(path, ignore_errors=True)
+            elif entry in self.LEGACY_FILES or entry in (self.CURRENT_FILE, self.LOG_FILE):
+                os.remove(path)
+        self.last_seq = 0
+
+    def close(self) -> None:
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+class LeaderLock:
+    """
+    Picks the single writer among processes serving one index directory.
+
+    An exclusive, non-blocking ``flock`` on ``LEADER.lock``: the holder writes the
+    index, everyone else maps its snapshots read-only. The kernel drops the lock
+    when the holder exits, crash included, so a follower's next ``try_acquire``
+    takes over. The holder's PID is written to the file for error messages.
+    """
+
+    FILE = "LEADER.lock"
+
+    def __init__(self, index_path: str):
+        self.path = os.path.join(index_path, self.FILE)
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        self._fd = fd
+        return True
+
+    def holder(self) -> Optional[int]:
+        """PID of the current leader, if one has written it."""
+        try:
+            with open(self.path, "r", encoding="ascii") as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+def _docstore_rows(store: FAISS):
+    """(id, text, metadata) for every document, in index position order (no tombstones)."""
+    for position in range(store.index.ntotal):
+        doc_id = store.index_to_docstore_id[position]
+        doc = store.docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            raise ValueError(f"Index position {position} points at missing document {doc_id}")
+        yield doc_id, doc.page_content, doc.metadata
+
+# --- Log records ---------------------------------------------------------------
+
+# (text_embeddings, metadatas, ids) -> new store holding those documents
+StoreFactory = Callable[[List[tuple], List[dict], List[str]], FAISS]
+
+def encode_vectors(vectors: List[List[float]]) -> str:
+    """float32 + base64 keeps logged embeddings exact and ~4x smaller than JSON floats."""
+    return base64.b64encode(np.asarray(vectors, dtype=np.float32).tobytes()).decode("ascii")
+
+def decode_vectors(data: str, count: int) -> List[List[float]]:
+    array = np.frombuffer(base64.b64decode(data), dtype=np.float32)
+    return array.reshape(count, -1).tolist() if count else []
+
+def add_record(ids: List[str], texts: List[str], metadatas: List[dict], vectors: List[List[float]]) -> Dict[str, Any]:
+    return {
+        "op": "add",
+        "ids": ids,
+        "texts": texts,
+        "metadatas": metadatas,
+        "vectors": encode_vectors(vectors),
+    }
+
+def delete_record(ids: List[str]) -> Dict[str, Any]:
+    return {"op": "delete", "ids": ids}
+
+def apply_record(
+    store: Optional[FAISS],
+    record: Dict[str, Any],
+    embeddings: Embeddings,
+    create_store: Optional[StoreFactory] = None,
+) -> Optional[FAISS]:
+    """Re-apply a logged operation to a store (used for crash recovery)."""
+    if record["op"] == "add":
+        vectors = decode_vectors(record["vectors"], len(record["ids"]))
+        text_embeddings = list(zip(record["texts"], vectors))
+        if store is None:
+            if create_store is not None:
+                return create_store(text_embeddings, record["metadatas"], record["ids"])
+            return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=record["metadatas"], ids=record["ids"])
+        store.add_embeddings(text_embeddings, metadatas=record["metadatas"], ids=record["ids"])
+    elif record["op"] == "delete" and store is not None:
+        remove_documents(store, record["ids"])
+        if should_compact(store):
+            compact_tombstones(store)
+    return store
+
+def _fsync_path(path: str) -> None:
+    # Directories need an fsync too for renames to be durable (not supported everywhere)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
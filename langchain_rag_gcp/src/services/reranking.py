@@ -0,0 +1,79 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence
+import numpy as np
+from langchain_core.documents import Document
+from .lexical_index import tokenize
+
+class CandidateScorer(ABC):
+    """Scores (query, candidate) pairs for re-ranking, e.g. a cross-encoder. Higher is better."""
+
+    @abstractmethod
+    def score(self, query: str, documents: List[Document]) -> Sequence[float]:
+        """One relevance score per document."""
+        pass
+
+class TokenOverlapScorer(CandidateScorer):
+    """Share of the query's tokens that occur in the candidate; a cheap lexical re-scorer."""
+
+    def score(self, query: str, documents: List[Document]) -> Sequence[float]:
+        wanted = set(tokenize(query))
+        if not wanted:
+            return [0.0] * len(documents)
+        return [len(wanted.intersection(tokenize(d.page_content))) / len(wanted) for d in documents]
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Maximal marginal relevance: indices of ``k`` candidates, in selection order.
+
+    Each step picks the candidate maximizing
+    ``lambda_mult * relevance - (1 - lambda_mult) * max cosine to the already selected``.
+    The running max is kept as one array, so a step is a mat-vec product and an
+    argmax over all candidates rather than a loop over them.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    unit = _unit(np.asarray(vectors, dtype=np.float32))
+    relevance = np.asarray(relevance, dtype=np.float32)
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    for step in range(k):
+        if step == 0:
+            scores = relevance.copy()
+        else:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, unit @ unit[best], out=redundancy)
+    return selected
+
+def rerank(
+    query: str,
+    query_vector: Sequence[float],
+    documents: List[Document],
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+    scorer: Optional[CandidateScorer] = None,
+) -> List[Document]:
+    """
+    Diverse top-k of over-fetched candidates. Relevance is the cosine to the query,
+    or the ``scorer``'s scores (min-max scaled to [0, 1]) when one is given.
+    """
+    if not documents:
+        return []
+    if scorer is not None:
+        relevance = np.asarray(scorer.score(query, documents), dtype=np.float32)
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+    else:
+        relevance = _unit(np.asarray(vectors, dtype=np.float32)) @ _unit(np.asarray(query_vector, dtype=np.float32))
+    return [documents[i] for i in mmr_select(relevance, vectors, k, lambda_mult)]
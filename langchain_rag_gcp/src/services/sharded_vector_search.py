@@ -0,0 +1,275 @@
+import asyncio
+import heapq
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+import numpy as np
+from langchain_core.documents import Document
+from .embeddings import EmbeddingService
+from .docstore import id_key
+from .reranking import CandidateScorer, rerank
+from .vector_search import SEARCH_TYPES, LocalVectorStoreService, ServiceRetriever, VectorSearchService, fuse_hybrid
+
+T = TypeVar("T")
+
+class ShardedVectorStoreService(VectorSearchService):
+    """
+    Vector store split across ``num_shards`` hash-partitioned LocalVectorStoreService
+    shards, searched scatter-gather.
+
+    index_path/
+        shards.json         -> {"shards": 4}; reopening with another count is an error
+        shard-000/ ...      -> one LocalVectorStoreService directory per shard
+
+    A document lives in shard ``hash(id) % num_shards``, so adds and deletes touch
+    only the shards that own the IDs. A query is embedded once, sent to every shard
+    in parallel and the per-shard top-k lists are merged by distance. FAISS releases
+    the GIL while searching, so shard searches run on separate cores; snapshots are
+    memory-mapped per shard, so each shard pages in only what its queries touch.
+
+    The merge only needs ``similarity_search_by_vectors_with_score``,
+    ``lexical_search_with_score`` and ``search_candidates`` from a shard, so a client for a shard hosted in
+    another process or machine can be passed in through ``shard_factory``.
+
+    Hybrid search merges the BM25 lists by score; each shard scores with its own
+    term statistics, which hash partitioning keeps close to the global ones.
+    """
+
+    SHARDS_FILE = "shards.json"
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        index_path: str = "data/vector_index_sharded",
+        num_shards: int = 4,
+        search_workers: Optional[int] = None,
+        shard_factory: Optional[Callable[[str], LocalVectorStoreService]] = None,
+        **shard_kwargs,
+    ):
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        self.embedding_service = embedding_service
+        self.embeddings = embedding_service.get_embeddings_model()
+        self.index_path = index_path
+        self.num_shards = num_shards
+        self._check_layout()
+        if shard_factory is None:
+            # Shard searches already run on the fan-out pool below
+            shard_kwargs.setdefault("search_workers", 1)
+
+            def shard_factory(path: str) -> LocalVectorStoreService:
+                return LocalVectorStoreService(embedding_service, index_path=path, **shard_kwargs)
+        self.shards = [
+            shard_factory(os.path.join(index_path, f"shard-{i:03d}")) for i in range(num_shards)
+        ]
+        self._executor = ThreadPoolExecutor(
+            max_workers=search_workers or num_shards,
+            thread_name_prefix="shard-search",
+        )
+
+    def _check_layout(self) -> None:
+        path = os.path.join(self.index_path, self.SHARDS_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                existing = json.load(f)["shards"]
+            if existing != self.num_shards:
+                # Documents are placed by hash modulo the shard count
+                raise ValueError(
+                    f"Index at {self.index_path} has {existing} shards, not {self.num_shards}"
+                )
+            return
+        os.makedirs(self.index_path, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"shards": self.num_shards}, f)
+
+    def shard_for(self, doc_id: str) -> int:
+        """Index of the shard that owns ``doc_id``."""
+        return id_key(doc_id) % self.num_shards
+
+    # --- Scatter-gather ------------------------------------------------------
+
+    def _scatter(self, call: Callable[[Any], T], items: Optional[List[Any]] = None) -> List[T]:
+        """Run ``call`` on every shard (or on each of ``items``) in parallel, results in order."""
+        futures = [self._executor.submit(call, item) for item in (self.shards if items is None else items)]
+        return [f.result() for f in futures]
+
+    async def _ascatter(self, call: Callable[[LocalVectorStoreService], T]) -> List[T]:
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(self._executor, call, s) for s in self.shards))
+
+    @staticmethod
+    def _merge_nearest(rows: List[List[Tuple[Document, float]]], k: int) -> List[Document]:
+        # Each shard's list is already sorted by distance
+        return [doc for doc, _ in islice(heapq.merge(*rows, key=itemgetter(1)), k)]
+
+    @staticmethod
+    def _merge_best(rows: List[List[Tuple[Document, float]]], k: int) -> List[Document]:
+        return [doc for doc, _ in heapq.nlargest(k, chain(*rows), key=itemgetter(1))]
+
+    # --- Writes --------------------------------------------------------------
+
+    def _group_by_shard(self, items: List[T], key: Callable[[T], str]) -> Dict[int, List[T]]:
+        groups: Dict[int, List[T]] = {}
+        for item in items:
+            groups.setdefault(self.shard_for(key(item)), []).append(item)
+        return groups
+
+    def add_documents(self, documents: List[Document], persist: bool = True) -> None:
+        if not documents:
+            return
+        # IDs decide placement, so they are assigned before routing
+        documents = [
+            d if d.id else Document(page_content=d.page_content, metadata=d.metadata, id=str(uuid.uuid4()))
+            for d in documents
+        ]
+        groups = self._group_by_shard(documents, lambda d: d.id)
+        # Shards embed their own documents, so embedding calls run in parallel too
+        self._scatter(lambda group: self.shards[group[0]].add_documents(group[1], persist=persist), list(groups.items()))
+
+    def delete_documents(self, ids: List[str], persist: bool = True) -> None:
+        if not ids:
+            return
+        groups = self._group_by_shard(ids, lambda doc_id: doc_id)
+        self._scatter(lambda group: self.shards[group[0]].delete_documents(group[1], persist=persist), list(groups.items()))
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards)
+
+    @property
+    def index_version(self) -> int:
+        # Shard versions only grow, so the sum changes whenever any shard changes
+        return sum(shard.index_version for shard in self.shards)
+
+    @property
+    def is_writable(self) -> bool:
+        # With shared shards every shard's lock must be held by this process
+        return all(shard.is_writable for shard in self.shards)
+
+    def close(self) -> None:
+        for shard in self.shards:
+            shard.close()
+        self._executor.shutdown(wait=False)
+
+    def persist(self) -> None:
+        self._scatter(lambda shard: shard.persist())
+
+    def train(self, texts: List[str]) -> None:
+        """Train every shard's index on the same sample (IVF variants)."""
+        self._scatter(lambda shard: shard.train(texts))
+
+    # --- Search --------------------------------------------------------------
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k, filter)
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        return await self.asimilarity_search_by_vector(await self.embeddings.aembed_query(query), k, filter)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        return self._search_by_vectors([embedding], k, filter)[0]
+
+    async def asimilarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        return (await self._asearch_by_vectors([embedding], k, filter))[0]
+
+    def similarity_search_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        if not queries:
+            return []
+        return self._search_by_vectors(self.embeddings.embed_documents(queries), k, filter)
+
+    async def asimilarity_search_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        if not queries:
+            return []
+        return await self._asearch_by_vectors(await self.embeddings.aembed_documents(queries), k, filter)
+
+    def _search_by_vectors(
+        self, embeddings: List[List[float]], k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        per_shard = self._scatter(lambda s: s.similarity_search_by_vectors_with_score(embeddings, k, filter))
+        return [self._merge_nearest([rows[q] for rows in per_shard], k) for q in range(len(embeddings))]
+
+    async def _asearch_by_vectors(
+        self, embeddings: List[List[float]], k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        per_shard = await self._ascatter(lambda s: s.similarity_search_by_vectors_with_score(embeddings, k, filter))
+        return [self._merge_nearest([rows[q] for rows in per_shard], k) for q in range(len(embeddings))]
+
+    def _hybrid_call(self, query: str, embedding: List[float], fetch_k: int, filter: Optional[Dict[str, Any]]):
+        def call(shard: LocalVectorStoreService):
+            dense = shard.similarity_search_by_vectors_with_score([embedding], fetch_k, filter)[0]
+            return dense, shard.lexical_search_with_score(query, fetch_k)
+        return call
+
+    def _fuse(self, per_shard, k: int, fetch_k: int, rrf_k: int, filter: Optional[Dict[str, Any]]) -> List[Document]:
+        dense = self._merge_nearest([d for d, _ in per_shard], fetch_k)
+        lexical = self._merge_best([l for _, l in per_shard], fetch_k)
+        return fuse_hybrid(dense, lexical, k, rrf_k, filter)
+
+    def hybrid_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, rrf_k: int = 60,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        fetch_k = fetch_k or max(4 * k, 20)
+        call = self._hybrid_call(query, self.embeddings.embed_query(query), fetch_k, filter)
+        return self._fuse(self._scatter(call), k, fetch_k, rrf_k, filter)
+
+    async def ahybrid_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, rrf_k: int = 60,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        fetch_k = fetch_k or max(4 * k, 20)
+        call = self._hybrid_call(query, await self.embeddings.aembed_query(query), fetch_k, filter)
+        return self._fuse(await self._ascatter(call), k, fetch_k, rrf_k, filter)
+
+    def _rerank(
+        self, query: str, embedding: List[float], per_shard, k: int, fetch_k: int, lambda_mult: float,
+        scorer: Optional[CandidateScorer],
+    ) -> List[Document]:
+        # Nearest fetch_k over all shards, each with its stored vector
+        candidates = [
+            (doc, distance, vectors[i])
+            for pairs, vectors in per_shard
+            for i, (doc, distance) in enumerate(pairs)
+        ]
+        candidates = heapq.nsmallest(fetch_k, candidates, key=itemgetter(1))
+        if not candidates:
+            return []
+        vectors = np.stack([vector for _, _, vector in candidates])
+        return rerank(query, embedding, [doc for doc, _, _ in candidates], vectors, k, lambda_mult, scorer)
+
+    def mmr_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None, scorer: Optional[CandidateScorer] = None,
+    ) -> List[Document]:
+        fetch_k = fetch_k or max(4 * k, 20)
+        embedding = self.embeddings.embed_query(query)
+        per_shard = self._scatter(lambda s: s.search_candidates(embedding, fetch_k, filter))
+        return self._rerank(query, embedding, per_shard, k, fetch_k, lambda_mult, scorer)
+
+    async def ammr_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None, scorer: Optional[CandidateScorer] = None,
+    ) -> List[Document]:
+        fetch_k = fetch_k or max(4 * k, 20)
+        embedding = await self.embeddings.aembed_query(query)
+        per_shard = await self._ascatter(lambda s: s.search_candidates(embedding, fetch_k, filter))
+        return self._rerank(query, embedding, per_shard, k, fetch_k, lambda_mult, scorer)
+
+    def get_retriever(self, **kwargs) -> Any:
+        search_type = kwargs.get("search_type", "similarity")
+        if search_type not in SEARCH_TYPES:
+            raise ValueError(f"Unknown search_type {search_type!r}; expected one of {SEARCH_TYPES}")
+        return ServiceRetriever(service=self, search_type=search_type, search_kwargs=kwargs.get("search_kwargs", {}))
@@ -1,6 +1,29 @@
 from abc import ABC, abstractmethod
 import os
-from typing import List, Optional
+from itertools import islice
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional
+from .metrics import timed
+
+class FileInfo(NamedTuple):
+    """A stored file: path relative to the storage root ("/"-separated), size and mtime."""
+    name: str
+    size: int
+    mtime_ns: int
+
+def check_file_name(file_name: str) -> str:
+    """
+    Reject names that could resolve outside the storage root: empty names, absolute
+    paths and ``..`` segments. Returns the name unchanged. Raises ValueError.
+    """
+    parts = file_name.replace("\\", "/").split("/")
+    if not file_name or os.path.isabs(file_name) or file_name.startswith(("/", "\\")) or ".." in parts:
+        raise ValueError(f"Invalid file name {file_name!r}: must be a relative path under the storage root")
+    return file_name
+
+class FilePage(NamedTuple):
+    """One page of a listing; pass ``next_page_token`` back to get the next one."""
+    files: List[FileInfo]
+    next_page_token: Optional[str]
 
 class StorageService(ABC):
     """Abstract base class for storage services."""
@@ -10,6 +33,34 @@ class StorageService(ABC):
         """List files in the storage."""
         pass
 
+    @abstractmethod
+    def iter_files(self, prefix: str = "", start_after: Optional[str] = None) -> Iterator[FileInfo]:
+        """
+        Iterate over all files, recursively, in lexicographic order of their names.
+
+        ``prefix`` keeps names starting with it (like a bucket prefix, e.g. "logs/2024-");
+        ``start_after`` resumes a listing after the given name.
+        """
+        pass
+
+    @abstractmethod
+    def changed_since(self, since_ns: int, prefix: str = "", prune_dirs: bool = False) -> Iterator[FileInfo]:
+        """
+        Files modified after ``since_ns`` (a ``time.time_ns()`` timestamp), in name order.
+
+        ``prune_dirs=True`` lets an implementation skip subtrees it can tell are
+        unchanged without listing them, which is only reliable when every write
+        goes through ``upload_file``.
+        """
+        pass
+
+    def list_page(self, prefix: str = "", page_size: int = 1000, page_token: Optional[str] = None) -> FilePage:
+        """One page of ``iter_files``."""
+        files = list(islice(self.iter_files(prefix, start_after=page_token), page_size + 1))
+        if len(files) > page_size:
+            return FilePage(files[:page_size], files[page_size - 1].name)
+        return FilePage(files, None)
+
     @abstractmethod
     def upload_file(self, file_name: str, content: bytes) -> str:
         """Upload a file to storage. Returns the path/uri."""
@@ -20,26 +71,127 @@ class StorageService(ABC):
         """Read a file from storage."""
         pass
 
+    @abstractmethod
+    def open_stream(self, file_name: str) -> BinaryIO:
+        """Open a file for incremental binary reads. The caller closes it."""
+        pass
+
+    @abstractmethod
+    def file_size(self, file_name: str) -> int:
+        """Size of a file in bytes."""
+        pass
+
+    @abstractmethod
+    def file_info(self, file_name: str) -> FileInfo:
+        """Size and mtime of one file, as listed by ``iter_files``."""
+        pass
+
 class LocalStorageService(StorageService):
-    """Local file system implementation of StorageService."""
+    """
+    Local file system implementation of StorageService.
+
+    Listings walk the tree with ``os.scandir``: entry types come from the directory
+    read itself, so the only per-file syscall is the stat that provides size and
+    mtime. Subtrees that can't contain a match for the prefix or page token are
+    never opened.
+
+    ``changed_since`` compares file mtimes, so it still lists the whole tree. With
+    ``prune_dirs=True`` it also skips subtrees whose directory mtime is not newer.
+    A directory's mtime only changes when entries are added or removed, not when a
+    file in it is edited in place. ``upload_file`` bumps the mtime of every
+    directory above the file it writes, so pruning is only safe when all writes go
+    through it.
+    """
 
     def __init__(self, base_path: str = "data/raw"):
         self.base_path = base_path
         # Ensure the directory exists
         os.makedirs(self.base_path, exist_ok=True)
 
+    @timed("storage")
     def list_files(self) -> List[str]:
-        return [f for f in os.listdir(self.base_path) if os.path.isfile(os.path.join(self.base_path, f))]
+        return [info.name for info in self.iter_files()]
 
+    def iter_files(self, prefix: str = "", start_after: Optional[str] = None) -> Iterator[FileInfo]:
+        return self._walk(self.base_path, "", prefix, start_after, since_ns=None)
+
+    def changed_since(self, since_ns: int, prefix: str = "", prune_dirs: bool = False) -> Iterator[FileInfo]:
+        return self._walk(self.base_path, "", prefix, None, since_ns=since_ns, prune_dirs=prune_dirs)
+
+    def _walk(
+        self, path: str, rel: str, prefix: str, start_after: Optional[str], since_ns: Optional[int],
+        prune_dirs: bool = False,
+    ) -> Iterator[FileInfo]:
+        with os.scandir(path) as it:
+            # Sort a directory as "name/" so the walk yields names in plain string order
+            entries = sorted(
+                ((e.name + "/" if e.is_dir(follow_symlinks=False) else e.name), e) for e in it
+            )
+        for key, entry in entries:
+            name = rel + key
+            if key.endswith("/"):
+                # Descend only if the subtree can hold names matching the prefix,
+                # after the page token, and (when pruning) if its entries changed
+                if not (name.startswith(prefix) or prefix.startswith(name)):
+                    continue
+                if start_after is not None and start_after >= name and not start_after.startswith(name):
+                    continue
+                if prune_dirs and entry.stat(follow_symlinks=False).st_mtime_ns <= since_ns:
+                    continue
+                yield from self._walk(entry.path, name, prefix, start_after, since_ns, prune_dirs)
+            elif name.startswith(prefix) and (start_after is None or name > start_after) and entry.is_file():
+                stat = entry.stat()
+                if since_ns is None or stat.st_mtime_ns > since_ns:
+                    yield FileInfo(name, stat.st_size, stat.st_mtime_ns)
+
+    @timed("storage")
     def upload_file(self, file_name: str, content: bytes) -> str:
-        file_path = os.path.join(self.base_path, file_name)
+        file_path = self._path(file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
         with open(file_path, "wb") as f:
             f.write(content)
+        self._touch_parents(file_path)
         return file_path
 
-    def read_file(self, file_name: str) -> bytes:
-        file_path = os.path.join(self.base_path, file_name)
+    def _touch_parents(self, file_path: str) -> None:
+        # Directory mtimes only change when entries are added or removed; bump every
+        # ancestor so changed_since(prune_dirs=True) sees the subtree as changed
+        root = os.path.realpath(self.base_path)
+        directory = os.path.dirname(os.path.realpath(file_path))
+        while True:
+            os.utime(directory)
+            if directory == root or not directory.startswith(root):
+                break
+            directory = os.path.dirname(directory)
+
+    def _path(self, file_name: str) -> str:
+        # The resolved path (symlinks included) must stay under the storage root
+        root = os.path.realpath(self.base_path)
+        file_path = os.path.realpath(os.path.join(root, check_file_name(file_name)))
+        if os.path.commonpath([root, file_path]) != root:
+            raise ValueError(f"Invalid file name {file_name!r}: resolves outside {self.base_path}")
+        return file_path
+
+    def _existing_path(self, file_name: str) -> str:
+        file_path = self._path(file_name)
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File {file_name} not found in {self.base_path}")
-        with open(file_path, "rb") as f:
+        return file_path
+
+    @timed("storage")
+    def read_file(self, file_name: str) -> bytes:
+        with open(self._existing_path(file_name), "rb") as f:
             return f.read()
+
+    @timed("storage")
+    def open_stream(self, file_name: str) -> BinaryIO:
+        return open(self._existing_path(file_name), "rb")
+
+    @timed("storage")
+    def file_size(self, file_name: str) -> int:
+        return os.path.getsize(self._existing_path(file_name))
+
+    @timed("storage")
+    def file_info(self, file_name: str) -> FileInfo:
+        stat = os.stat(self._existing_path(file_name))
+        return FileInfo(file_name, stat.st_size, stat.st_mtime_ns)
@@ -1,84 +1,881 @@
 from abc import ABC, abstractmethod
-from typing import List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+import asyncio
+import ctypes
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pydantic import ConfigDict, Field
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.vectorstores import VectorStore
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
+import faiss
+import numpy as np
 from .embeddings import EmbeddingService
+from .ann_index import (
+    IndexConfig, apply_search_params, build_index, compact_tombstones, deleted_positions, live_count, live_selector,
+    reconstruct_positions, remove_documents, search_parameters, should_compact,
+)
+from .metadata_index import MetadataIndex, matches_filter
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .docstore import MappedDocstore, PositionIdMap
+from .persistence import IndexPersistence, LeaderLock, add_record, delete_record
+from .metrics import timed
+from .reranking import CandidateScorer, rerank
 
 class VectorSearchService(ABC):
     """Abstract base class for vector search services."""
-    
+
+    @abstractmethod
+    def add_documents(self, documents: List[Document], persist: bool = True) -> None:
+        """Add documents to the vector store.
+
+        Bulk loaders pass ``persist=False`` and call ``persist()`` once at the end
+        instead of rewriting the index after every batch.
+        """
+        pass
+
+    @abstractmethod
+    def delete_documents(self, ids: List[str], persist: bool = True) -> None:
+        """Remove documents by ID. Unknown IDs are ignored."""
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of vectors currently in the index."""
+        pass
+
+    @property
     @abstractmethod
-    def add_documents(self, documents: List[Document]) -> None:
-        """Add documents to the vector store."""
+    def index_version(self) -> int:
+        """Counter that changes whenever the index contents change."""
         pass
-        
+
+    @property
+    def is_writable(self) -> bool:
+        """False for read-only replicas, which reject add/delete."""
+        return True
+
     @abstractmethod
-    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
-        """Search for similar documents."""
+    def persist(self) -> None:
+        """Flush pending writes so the current index is fully on durable storage."""
         pass
-        
+
+    @abstractmethod
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Search for similar documents.
+
+        ``filter`` restricts results to documents whose metadata matches, e.g.
+        ``{"source": "a.txt"}`` or ``{"source": ["a.txt", "b.txt"]}``.
+        """
+        pass
+
+    @abstractmethod
+    async def asimilarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Search for similar documents without blocking the event loop."""
+        pass
+
+    @abstractmethod
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Search with a query embedding the caller already has (no embedding call)."""
+        pass
+
+    @abstractmethod
+    async def asimilarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Search by embedding without blocking the event loop."""
+        pass
+
+    @abstractmethod
+    def similarity_search_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        """Search for many queries at once; one result list per query, in order."""
+        pass
+
+    @abstractmethod
+    async def asimilarity_search_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        """Batch search without blocking the event loop."""
+        pass
+
+    @abstractmethod
+    def hybrid_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, rrf_k: int = 60,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        """Lexical (BM25) and vector results merged by reciprocal rank fusion."""
+        pass
+
+    @abstractmethod
+    async def ahybrid_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, rrf_k: int = 60,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        """Hybrid search without blocking the event loop."""
+        pass
+
+    @abstractmethod
+    def mmr_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None, scorer: Optional[CandidateScorer] = None,
+    ) -> List[Document]:
+        """
+        Diverse top-k: ``fetch_k`` nearest candidates re-ranked by maximal marginal
+        relevance (see ``reranking.rerank``), optionally re-scored by ``scorer``.
+        """
+        pass
+
+    @abstractmethod
+    async def ammr_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None, scorer: Optional[CandidateScorer] = None,
+    ) -> List[Document]:
+        """MMR search without blocking the event loop."""
+        pass
+
     @abstractmethod
     def get_retriever(self, **kwargs) -> Any:
         """Return a LangChain retriever interface."""
         pass
 
+class ServiceRetriever(BaseRetriever):
+    """
+    LangChain retriever backed by a VectorSearchService.
+
+    Sync calls go to ``similarity_search`` and async calls to ``asimilarity_search``,
+    so the async chain path never blocks the event loop on a FAISS search.
+    ``search_type="hybrid"`` uses ``hybrid_search`` / ``ahybrid_search`` instead, and
+    ``search_type="mmr"`` uses ``mmr_search`` / ``ammr_search``.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    service: Any
+    search_type: str = "similarity"
+    search_kwargs: Dict[str, Any] = Field(default_factory=dict)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.search_type == "hybrid":
+            return self.service.hybrid_search(query, **self.search_kwargs)
+        if self.search_type == "mmr":
+            return self.service.mmr_search(query, **self.search_kwargs)
+        return self.service.similarity_search(query, **self.search_kwargs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.search_type == "hybrid":
+            return await self.service.ahybrid_search(query, **self.search_kwargs)
+        if self.search_type == "mmr":
+            return await self.service.ammr_search(query, **self.search_kwargs)
+        return await self.service.asimilarity_search(query, **self.search_kwargs)
+
+SEARCH_TYPES = ("similarity", "hybrid", "mmr")
+
+def fuse_hybrid(
+    dense: List[Document], lexical: List[Document], k: int, rrf_k: int = 60,
+    filter: Optional[Dict[str, Any]] = None,
+) -> List[Document]:
+    """Merge a vector and a BM25 ranking by reciprocal rank fusion (BM25 hits post-filtered)."""
+    if filter:
+        lexical = [d for d in lexical if matches_filter(d.metadata, filter)]
+    by_id = {d.id: d for d in lexical}
+    by_id.update({d.id: d for d in dense})
+    fused = reciprocal_rank_fusion([[d.id for d in dense], [d.id for d in lexical]], k, rrf_k)
+    return [by_id[doc_id] for doc_id in fused]
+
+def _trim_heap() -> None:
+    # glibc keeps freed memory in its arenas; give a dropped in-RAM index back to the OS
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+class ReadWriteLock:
+    """
+    Any number of readers or a single writer. A waiting writer holds back new
+    readers, so a steady search load can't starve ingestion. Not re-entrant.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writing or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+# Filters matching at most this many documents are answered by an exact scan of just
+# those vectors; larger ones go through a FAISS search with an ID selector
+FILTER_EXACT_MAX = 10_000
+
 class LocalVectorStoreService(VectorSearchService):
-    """Local simulation of Vector Search using FAISS."""
-    
-    def __init__(self, embedding_service: EmbeddingService, index_path: str = "data/vector_index"):
+    """
+    Local simulation of Vector Search using FAISS.
+
+    Persistence is write-behind: additions are applied in memory and recorded in a
+    durable append log, while full snapshots are only written once ``flush_every``
+    operations are pending, ``flush_interval_s`` has passed, or ``flush()`` is called.
+
+    ``index_config`` selects the FAISS index type (flat, IVF-Flat, HNSW, IVF-PQ). IVF
+    variants are trained by ``train()`` on a representative sample, or on the first
+    batch added if ``train()`` was never called.
+
+    With ``mmap=True`` (default) snapshots are opened memory-mapped, so startup does
+    not read the whole index and documents into RAM; the index is copied into memory
+    only when it is first modified. After each snapshot documents are served from
+    the new snapshot's docstore file, so only changes since then are held in memory.
+
+    Searches accept a metadata ``filter``. It is resolved through an inverted index
+    (built on the first filtered search, then maintained on add/delete) and applied
+    inside the search, so selective filters scan only the matching vectors.
+
+    ``hybrid_search`` adds a BM25 inverted index over the chunk texts (built on first
+    use, then maintained on add/delete) and merges its ranking with the vector
+    ranking by reciprocal rank fusion, which helps exact-token queries such as
+    ticket numbers, SKUs and error codes.
+
+    ``mmr_search`` over-fetches candidates with their stored vectors and re-ranks
+    them for diversity (maximal marginal relevance), so near-identical chunks
+    don't fill the top k.
+
+    With ``shared=True`` several processes (uvicorn workers) serve one index
+    directory with one copy of it in memory. The process holding ``LEADER.lock``
+    loads the index, replays the append log and takes all writes; the others are
+    read-only followers that map its published snapshots, so their pages come from
+    the shared page cache. A watcher thread checks CURRENT every
+    ``refresh_interval_s``: followers switch to a newer snapshot, the leader
+    publishes writes left pending for ``flush_interval_s``, and a follower takes
+    over when the leader's process exits.
+
+    FAISS indexes are not safe to search while they are modified, so searches hold
+    a shared read lock and the in-memory part of a write (and swapping in another
+    store) holds it exclusively. Writers are also serialized by ``_lock``, which
+    covers the append log and snapshots; a search never takes ``_lock``, so
+    writing a snapshot doesn't block searches.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        index_path: str = "data/vector_index",
+        flush_every: int = 1000,
+        flush_interval_s: float = 30.0,
+        search_workers: Optional[int] = None,
+        index_config: Optional[IndexConfig] = None,
+        mmap: bool = True,
+        shared: bool = False,
+        refresh_interval_s: float = 1.0,
+    ):
+        if shared and not mmap:
+            raise ValueError("shared=True requires mmap=True: followers map the leader's snapshots")
         self.embedding_service = embedding_service
         self.index_path = index_path
         self.embeddings = embedding_service.get_embeddings_model()
         self.vector_store: Optional[FAISS] = None
-        self._load_or_create_index()
+        self.flush_every = flush_every
+        self.flush_interval_s = flush_interval_s
+        self.index_config = index_config or IndexConfig()
+        # Trained-but-empty index from train(), used when the store is first created
+        self._trained_index = None
+        self._metadata_index: Optional[MetadataIndex] = None
+        self._lexical_index: Optional[BM25Index] = None
+        self.persistence = IndexPersistence(index_path, mmap=mmap)
+        # Operations applied in memory but not yet in a snapshot
+        self._pending_ops = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        # Searches read, in-memory mutations write; always taken inside _lock, never around it
+        self._rw_lock = ReadWriteLock()
+        # Lazy builds of the metadata/BM25 indexes by concurrent searches
+        self._build_lock = threading.Lock()
+        self._version = 0
+        # Bounded pool for CPU-bound FAISS searches issued from async request handlers
+        self._search_executor = ThreadPoolExecutor(
+            max_workers=search_workers or min(8, os.cpu_count() or 1),
+            thread_name_prefix="faiss-search",
+        )
+        self.shared = shared
+        self.refresh_interval_s = refresh_interval_s
+        self._leader_lock = LeaderLock(index_path) if shared else None
+        # Snapshot a follower is serving; it reloads when CURRENT points elsewhere
+        self._snapshot: Optional[str] = None
+        if shared and not self._leader_lock.try_acquire():
+            try:
+                self._refresh_from_snapshot()
+            except Exception as e:
+                # The leader replaced the snapshot while it was being opened; the watcher retries
+                print(f"Could not map the shared index at {index_path}: {e}")
+        else:
+            self._load_or_create_index()
+            if shared:
+                self._publish()
+        self._stop_watch = threading.Event()
+        self._watcher = None
+        if shared:
+            self._watcher = threading.Thread(target=self._watch, name="index-watcher", daemon=True)
+            self._watcher.start()
 
     def _load_or_create_index(self):
-        if os.path.exists(self.index_path):
+        try:
+            self.vector_store = self.persistence.load(self.embeddings, create_store=self._create_store)
+            if self.vector_store is not None:
+                # Query-time parameters (nprobe, efSearch) come from the config, not the file
+                apply_search_params(self.vector_store.index, self.index_config)
+            # Replayed log records still need to reach a snapshot
+            self._pending_ops = self.persistence.replayed_ops
+        except Exception as e:
+            # Fallback if load fails or files are corrupt: start with an empty store.
+            print(f"Could not load vector index from {self.index_path}: {e}")
+            self.vector_store = None
+
+        # If still None there was nothing on disk. FAISS can't be initialized without
+        # documents, so the store stays None (in-memory start) until the first add.
+
+    # --- Shared index across processes -------------------------------------
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process writes the index (always true unless ``shared``)."""
+        return self._leader_lock is None or self._leader_lock.held
+
+    @property
+    def is_writable(self) -> bool:
+        return self.is_leader
+
+    def _check_writable(self) -> None:
+        if not self.is_leader:
+            raise RuntimeError(
+                f"{self.index_path} is served read-only by this process; "
+                f"writes go through the leader (pid {self._leader_lock.holder()})"
+            )
+
+    def _publish(self) -> None:
+        # Leader: log records replayed on load (or a legacy index) only reach the
+        # followers through a snapshot
+        with self._lock:
+            if self.vector_store is not None and (
+                self._pending_ops or self.persistence.published_snapshot() is None
+            ):
+                self._write_snapshot()
+                self._pending_ops = 0
+                self._last_flush = time.monotonic()
+
+    def _write_snapshot(self) -> None:
+        if deleted_positions(self.vector_store):
+            # Snapshots hold no tombstones: every position has a document row
+            with self._rw_lock.write():
+                self._compact_tombstones()
+        self.persistence.write_snapshot(self.vector_store)
+        if self.shared:
+            # Serve the published snapshot from the same mapping as the followers
+            # instead of keeping a private copy next to it; the next write copies it
+            # back into RAM. Positions and IDs are unchanged, so the metadata and
+            # BM25 indexes stay valid.
+            store = self.persistence.load(self.embeddings, replay_log=False)
+            apply_search_params(store.index, self.index_config)
+            with self._rw_lock.write():
+                self.vector_store = store
+            _trim_heap()
+        else:
+            # Keep the in-RAM index but read documents from the snapshot just written,
+            # so the previous mapping and its overlay of later adds/deletes (or an
+            # in-memory docstore) don't keep growing until a restart
+            docstore = self.persistence.open_docstore()
+            with self._rw_lock.write():
+                previous = self.vector_store.docstore
+                self.vector_store.docstore = docstore
+                self.vector_store.index_to_docstore_id = PositionIdMap(docstore)
+            if isinstance(previous, MappedDocstore):
+                previous.close()
+            _trim_heap()
+
+    def _compact_tombstones(self) -> None:
+        # Caller holds the write lock
+        dropped = compact_tombstones(self.vector_store)
+        if self._metadata_index is not None:
+            self._metadata_index.remove(dropped)
+        self._version += 1
+
+    def _refresh_from_snapshot(self) -> bool:
+        """Follower: switch to the leader's latest snapshot. Returns whether it changed."""
+        published = self.persistence.published_snapshot()
+        if published is None or published == self._snapshot:
+            return False
+        # Searches in flight keep the previous store (and its mapping) until they finish
+        store = self.persistence.load(self.embeddings, replay_log=False)
+        if store is not None:
+            apply_search_params(store.index, self.index_config)
+        with self._lock, self._rw_lock.write():
+            self.vector_store = store
+            self._metadata_index = None
+            self._lexical_index = None
+            self._snapshot = published
+            self._version += 1
+        return True
+
+    def _promote(self) -> None:
+        print(f"Taking over as leader of {self.index_path}")
+        with self._lock, self._rw_lock.write():
+            # The previous leader's acknowledged writes since its last snapshot are in the log
+            self._load_or_create_index()
+            self._metadata_index = None
+            self._lexical_index = None
+            self._version += 1
+        self._publish()
+
+    def _watch(self) -> None:
+        while not self._stop_watch.wait(self.refresh_interval_s):
             try:
-                self.vector_store = FAISS.load_local(
-                    self.index_path, 
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-            except Exception:
-                # Fallback if load fails or file is corrupt
-                pass
-        
-        # If still None, it means we didn't load it
-        # We can't initialize FAISS without documents usually, 
-        # but we can initialize an empty one with a trick or just wait for first add.
-        # Actually FAISS.from_texts([""], embeddings) works to init.
-        if self.vector_store is None:
-            # Initialize with a dummy doc to create structure, then we might need to clear it or just ignore.
-            # Better approach: store is None until docs are added? 
-            # Or just create a fresh one in memory if not persistent.
-            # For simplicity in simulation, let's allow in-memory start.
-            pass
+                if self.is_leader:
+                    if self._pending_ops and time.monotonic() - self._last_flush >= self.flush_interval_s:
+                        self.flush()
+                elif self._leader_lock.try_acquire():
+                    self._promote()
+                else:
+                    self._refresh_from_snapshot()
+            except Exception as e:
+                # A snapshot can be replaced while it is being opened; retry next round
+                print(f"Shared index watcher for {self.index_path}: {e}")
 
-    def add_documents(self, documents: List[Document]) -> None:
+    def close(self) -> None:
+        """Stop the watcher, give up leadership and the search pool."""
+        if self._watcher is not None:
+            self._stop_watch.set()
+            self._watcher.join()
+            self._watcher = None
+        if self._leader_lock is not None:
+            self._leader_lock.release()
+        self._search_executor.shutdown(wait=False)
+
+    @timed("vector_search")
+    def add_documents(self, documents: List[Document], persist: bool = True) -> None:
         if not documents:
             return
-            
+        self._check_writable()
+
+        texts = [d.page_content for d in documents]
+        metadatas = [d.metadata for d in documents]
+        # Stable IDs so a logged add replays to exactly the same documents
+        ids = [d.id or str(uuid.uuid4()) for d in documents]
+        vectors = self.embeddings.embed_documents(texts)
+        text_embeddings = list(zip(texts, vectors))
+
+        with self._lock:
+            with self._rw_lock.write():
+                start_position = self.vector_store.index.ntotal if self.vector_store is not None else 0
+                if self.vector_store is None:
+                    self.vector_store = self._create_store(text_embeddings, metadatas, ids)
+                else:
+                    self.persistence.make_writable(self.vector_store)
+                    self.vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                if self._metadata_index is not None:
+                    self._metadata_index.add(start_position, metadatas)
+                if self._lexical_index is not None:
+                    self._lexical_index.add(ids, texts)
+                self._version += 1
+
+            # persist=True acknowledges the write durably through the append log.
+            # Bulk loaders pass persist=False and call persist() once at the end.
+            if persist:
+                self.persistence.append(add_record(ids, texts, metadatas, vectors))
+            self._mark_pending(len(documents), persist)
+
+    @timed("vector_search")
+    def delete_documents(self, ids: List[str], persist: bool = True) -> None:
+        if self.vector_store is None or not ids:
+            return
+        self._check_writable()
+        with self._lock:
+            # Upserts mostly delete IDs that aren't stored yet: skip the copy of a
+            # mapped index and the position scan when none of them are known
+            docstore = self.vector_store.docstore
+            ids = [i for i in ids if isinstance(docstore.search(i), Document)]
+            if not ids:
+                return
+            with self._rw_lock.write():
+                self.persistence.make_writable(self.vector_store)
+                positions = []
+                if self._metadata_index is not None:
+                    wanted = set(ids)
+                    positions = [p for p, i in self.vector_store.index_to_docstore_id.items() if i in wanted]
+                total = self.vector_store.index.ntotal
+                to_delete = remove_documents(self.vector_store, ids)
+                if not to_delete:
+                    return
+                if self._metadata_index is not None:
+                    # HNSW keeps the vectors (tombstoned), so positions don't move
+                    self._metadata_index.remove(positions, shift=self.vector_store.index.ntotal < total)
+                if should_compact(self.vector_store):
+                    self._compact_tombstones()
+                if self._lexical_index is not None:
+                    self._lexical_index.remove(to_delete)
+                self._version += 1
+            if persist:
+                self.persistence.append(delete_record(to_delete))
+            self._mark_pending(len(to_delete), persist)
+
+    def train(self, texts: List[str]) -> None:
+        """
+        Train the configured index on a sample of texts (IVF variants).
+
+        Must be called before the first document is added; the sample should be
+        representative and ideally tens of times larger than ``nlist``.
+        """
+        if not self.index_config.requires_training:
+            return
+        self._check_writable()
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        with self._lock:
+            if self.count() > 0:
+                raise ValueError("train() must be called before documents are added to the index")
+            self._trained_index = build_index(self.index_config, vectors)
+
+    def _create_store(self, text_embeddings: List[tuple], metadatas: List[dict], ids: List[str]) -> FAISS:
+        if self.index_config.index_type == "flat":
+            return FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+        index = self._trained_index
+        if index is None:
+            # No explicit training step: train on this first batch
+            index = build_index(self.index_config, np.asarray([v for _, v in text_embeddings], dtype=np.float32))
+        self._trained_index = None
+        store = FAISS(self.embeddings, index, InMemoryDocstore(), {})
+        store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return store
+
+    def _mark_pending(self, op_count: int, check_thresholds: bool) -> None:
+        self._pending_ops += op_count
+        if not check_thresholds:
+            return
+        elapsed = time.monotonic() - self._last_flush
+        if self._pending_ops >= self.flush_every or elapsed >= self.flush_interval_s:
+            self.flush()
+
+    @timed("vector_search")
+    def flush(self) -> None:
+        """Write a snapshot of everything applied so far and truncate the append log."""
+        with self._lock:
+            if self.vector_store is not None and self._pending_ops:
+                self._write_snapshot()
+            self._pending_ops = 0
+            self._last_flush = time.monotonic()
+
+    def count(self) -> int:
+        if self.vector_store is None:
+            return 0
+        return live_count(self.vector_store)
+
+    @property
+    def index_version(self) -> int:
+        return self._version
+
+    def persist(self) -> None:
+        self.flush()
+
+    @timed("vector_search")
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        if self.vector_store is None:
+            return []
+        return self._search_by_vector(self.embeddings.embed_query(query), k, filter)
+
+    @timed("vector_search", "search_by_vector")
+    def _search_by_vector(self, embedding: List[float], k: int, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self._search_by_vectors([embedding], k, filter)[0]
+
+    @timed("vector_search")
+    async def asimilarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
         if self.vector_store is None:
-            self.vector_store = FAISS.from_documents(documents, self.embeddings)
+            return []
+        # Embedding may be a remote call: await it
+        return await self.asimilarity_search_by_vector(await self.embeddings.aembed_query(query), k, filter)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        return self._search_by_vector(embedding, k, filter)
+
+    async def asimilarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        if self.vector_store is None:
+            return []
+        # The FAISS scan is CPU-bound: run it on the bounded search pool so concurrent
+        # requests can't starve the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._search_executor, self._search_by_vector, embedding, k, filter)
+
+    @timed("vector_search")
+    def similarity_search_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        if self.vector_store is None or not queries:
+            return [[] for _ in queries]
+        # One batched embedding call (LangChain has no batch variant of embed_query)
+        return self._search_by_vectors(self.embeddings.embed_documents(queries), k, filter)
+
+    @timed("vector_search")
+    async def asimilarity_search_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        if self.vector_store is None or not queries:
+            return [[] for _ in queries]
+        vectors = await self.embeddings.aembed_documents(queries)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._search_executor, self._search_by_vectors, vectors, k, filter)
+
+    def _search_by_vectors(
+        self, embeddings: List[List[float]], k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        rows = self.similarity_search_by_vectors_with_score(embeddings, k, filter)
+        return [[doc for doc, _ in row] for row in rows]
+
+    @timed("vector_search")
+    def similarity_search_by_vectors_with_score(
+        self, embeddings: List[List[float]], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        One multi-query FAISS search over a contiguous float32 matrix.
+
+        Returns (document, distance) pairs per query, closest first. Lower is closer
+        for every metric (inner products are negated), so results from several
+        stores can be merged by distance.
+        """
+        with self._rw_lock.read():
+            store = self.vector_store
+            if store is None:
+                return [[] for _ in embeddings]
+            distances, positions = self._search(store, embeddings, k, filter)
+            return [self._documents_at(store, row, scores) for row, scores in zip(positions, distances)]
+
+    def _search(
+        self, store: FAISS, embeddings: List[List[float]], k: int, filter: Optional[Dict[str, Any]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Caller holds the read lock
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if store._normalize_L2:
+            faiss.normalize_L2(matrix)
+        if filter:
+            return self._filtered_search(store, matrix, k, filter)
+        selector = live_selector(store)
+        if selector is not None:
+            # HNSW tombstones
+            params = search_parameters(store.index, self.index_config, selector)
+            distances, positions = store.index.search(matrix, k, params=params)
+        else:
+            distances, positions = store.index.search(matrix, k)
+        if store.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            distances = -distances
+        return distances, positions
+
+    @timed("vector_search")
+    def search_candidates(
+        self, embedding: List[float], fetch_k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Tuple[Document, float]], np.ndarray]:
+        """
+        The ``fetch_k`` nearest (document, distance) pairs, closest first, with their
+        stored vectors as a (n, dim) matrix for re-ranking (decoded approximations
+        for PQ), so candidates are never re-embedded.
+        """
+        with self._rw_lock.read():
+            store = self.vector_store
+            if store is None:
+                return [], np.empty((0, 0), dtype=np.float32)
+            distances, positions = self._search(store, [embedding], fetch_k, filter)
+            pairs, kept = [], []
+            for position, distance in zip(positions[0], distances[0]):
+                if position < 0:
+                    continue
+                doc = store.docstore.search(store.index_to_docstore_id[int(position)])
+                if isinstance(doc, Document):
+                    pairs.append((doc, float(distance)))
+                    kept.append(position)
+            if not kept:
+                return [], np.empty((0, store.index.d), dtype=np.float32)
+            return pairs, reconstruct_positions(store.index, np.asarray(kept, dtype=np.int64))
+
+    def _filtered_search(
+        self, store: FAISS, matrix: np.ndarray, k: int, filter: Dict[str, Any]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (distances, positions) per query among the documents matching ``filter`` (-1 padded)."""
+        # Caller holds the read lock, so store is the current one and can't change
+        if self._metadata_index is None:
+            with self._build_lock:
+                if self._metadata_index is None:
+                    self._metadata_index = MetadataIndex.build(store)
+        allowed = self._metadata_index.match(filter)
+        if not len(allowed):
+            return np.full((len(matrix), k), np.inf), np.full((len(matrix), k), -1, dtype=np.int64)
+        if len(allowed) > FILTER_EXACT_MAX:
+            params = search_parameters(store.index, self.index_config, faiss.IDSelectorBatch(allowed))
+            candidates = None
         else:
-            self.vector_store.add_documents(documents)
-            
-        # Save local index
-        if self.vector_store:
-            self.vector_store.save_local(self.index_path)
+            candidates = reconstruct_positions(store.index, allowed)
+        if candidates is None:
+            distances, positions = store.index.search(matrix, k, params=params)
+            if store.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                distances = -distances
+            return distances, positions
 
-    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        # Exact scan of the matching vectors only: cheaper than a full search, and
+        # graph/IVF searches can miss most of a small allowed set
+        if store.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            scores = -(matrix @ candidates.T)
+        else:
+            scores = (
+                (matrix ** 2).sum(axis=1)[:, None]
+                - 2 * (matrix @ candidates.T)
+                + (candidates ** 2).sum(axis=1)[None, :]
+            )
+        top = min(k, len(allowed))
+        best = np.argpartition(scores, top - 1, axis=1)[:, :top]
+        order = np.take_along_axis(scores, best, axis=1).argsort(axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        distances = np.full((len(matrix), k), np.inf)
+        distances[:, :top] = np.take_along_axis(scores, best, axis=1)
+        positions = np.full((len(matrix), k), -1, dtype=np.int64)
+        positions[:, :top] = allowed[best]
+        return distances, positions
+
+    @staticmethod
+    def _documents_at(store: FAISS, positions, distances) -> List[Tuple[Document, float]]:
+        docs = []
+        for position, distance in zip(positions, distances):
+            # -1 pads the row when fewer than k vectors are available
+            if position < 0:
+                continue
+            doc = store.docstore.search(store.index_to_docstore_id[int(position)])
+            if isinstance(doc, Document):
+                docs.append((doc, float(distance)))
+        return docs
+
+    def lexical_search(self, query: str, k: int = 4) -> List[Document]:
+        """BM25 top-k over the chunk texts."""
+        return [doc for doc, _ in self.lexical_search_with_score(query, k)]
+
+    @timed("vector_search")
+    def lexical_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """BM25 top-k as (document, score) pairs, best first."""
+        # The read lock also keeps the BM25 arrays from growing while a search holds views of them
+        with self._rw_lock.read():
+            store = self.vector_store
+            if store is None:
+                return []
+            if self._lexical_index is None:
+                with self._build_lock:
+                    if self._lexical_index is None:
+                        self._lexical_index = BM25Index.build(store)
+            hits = self._lexical_index.search(query, k)
+            docs = [(store.docstore.search(doc_id), score) for doc_id, score in hits]
+        return [(d, score) for d, score in docs if isinstance(d, Document)]
+
+    @timed("vector_search")
+    def hybrid_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, rrf_k: int = 60,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
         if self.vector_store is None:
             return []
-        return self.vector_store.similarity_search(query, k=k)
+        return self._hybrid_by_vector(query, self.embeddings.embed_query(query), k, fetch_k, rrf_k, filter)
 
-    def get_retriever(self, **kwargs) -> Any:
+    @timed("vector_search")
+    async def ahybrid_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, rrf_k: int = 60,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
         if self.vector_store is None:
-            # If empty, return a dummy retriever or raise
-            # Create a temporary empty store to return a retriever that returns nothing
-            empty_store = FAISS.from_texts([" "], self.embeddings)
-            return empty_store.as_retriever(**kwargs)
-        return self.vector_store.as_retriever(**kwargs)
+            return []
+        embedding = await self.embeddings.aembed_query(query)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._search_executor, self._hybrid_by_vector, query, embedding, k, fetch_k, rrf_k, filter
+        )
+
+    def _hybrid_by_vector(
+        self, query: str, embedding: List[float], k: int, fetch_k: Optional[int], rrf_k: int,
+        filter: Optional[Dict[str, Any]],
+    ) -> List[Document]:
+        # Each ranking contributes its top fetch_k before fusion
+        fetch_k = fetch_k or max(4 * k, 20)
+        dense = self._search_by_vector(embedding, fetch_k, filter)
+        return fuse_hybrid(dense, self.lexical_search(query, fetch_k), k, rrf_k, filter)
+
+    @timed("vector_search")
+    def mmr_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None, scorer: Optional[CandidateScorer] = None,
+    ) -> List[Document]:
+        if self.vector_store is None:
+            return []
+        return self._mmr_by_vector(query, self.embeddings.embed_query(query), k, fetch_k, lambda_mult, filter, scorer)
+
+    @timed("vector_search")
+    async def ammr_search(
+        self, query: str, k: int = 4, fetch_k: Optional[int] = None, lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None, scorer: Optional[CandidateScorer] = None,
+    ) -> List[Document]:
+        if self.vector_store is None:
+            return []
+        embedding = await self.embeddings.aembed_query(query)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._search_executor, self._mmr_by_vector, query, embedding, k, fetch_k, lambda_mult, filter, scorer
+        )
+
+    def _mmr_by_vector(
+        self, query: str, embedding: List[float], k: int, fetch_k: Optional[int], lambda_mult: float,
+        filter: Optional[Dict[str, Any]], scorer: Optional[CandidateScorer],
+    ) -> List[Document]:
+        candidates, vectors = self.search_candidates(embedding, fetch_k or max(4 * k, 20), filter)
+        return rerank(query, embedding, [doc for doc, _ in candidates], vectors, k, lambda_mult, scorer)
+
+    def get_retriever(self, **kwargs) -> Any:
+        search_type = kwargs.get("search_type", "similarity")
+        if search_type not in SEARCH_TYPES:
+            raise ValueError(f"Unknown search_type {search_type!r}; expected one of {SEARCH_TYPES}")
+        # An empty store simply returns no documents until the first add
+        return ServiceRetriever(service=self, search_type=search_type, search_kwargs=kwargs.get("search_kwargs", {}))
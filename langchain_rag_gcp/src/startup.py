@@ -0,0 +1,92 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+def _steps(resolve: Callable[[Callable], Callable]) -> List[Tuple[str, Callable[[], Any]]]:
+    from .dependencies import get_embedding_service, get_llm_service, get_vector_dao
+    from .api.routes import format_docs, get_rag_chain
+
+    def index():
+        # Building the vector service loads the FAISS index and docstore from disk
+        return resolve(get_vector_dao)().count()
+
+    def embeddings():
+        # Documents bypass the query cache, so the warm-up text doesn't count as a miss
+        model = resolve(get_embedding_service)().get_embeddings_model()
+        return len(model.embed_documents(["warm-up"])[0])
+
+    def retrieval():
+        # One search through the retriever runnable: the first invoke sets up the
+        # callback and tracing machinery, which would otherwise land on the first user
+        return len(resolve(get_vector_dao)().get_retriever(search_kwargs={"k": 1}).invoke("warm-up"))
+
+    def chain():
+        # Imports the prompt stack, builds the context packer and caches the chain
+        # for the current index version; the LLM itself is not called
+        format_docs([])
+        return get_rag_chain(resolve(get_vector_dao)(), resolve(get_llm_service)()) is not None
+
+    return [("index", index), ("embeddings", embeddings), ("retrieval", retrieval), ("chain", chain)]
+
+class WarmupState:
+    """
+    Progress of the startup warm-up, read by ``/ready``.
+
+    ``status`` is ``pending``, ``running``, ``ready`` or ``failed``; ``steps`` maps
+    each finished step to its duration in seconds.
+    """
+
+    def __init__(self):
+        self.status = "pending"
+        self.steps: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = None
+            if self.started_at is not None:
+                elapsed = (self.finished_at or time.monotonic()) - self.started_at
+            return {
+                "status": self.status,
+                "steps": dict(self.steps),
+                "error": self.error,
+                "elapsed_s": elapsed,
+            }
+
+def warm_up(state: WarmupState, resolve: Callable[[Callable], Callable] = lambda factory: factory) -> WarmupState:
+    """
+    Build the serving singletons before traffic arrives: load the index, run the
+    embedding model and a retrieval once, and build the RAG chain.
+
+    ``resolve`` maps a dependency factory to the one requests will use (the app
+    passes its ``dependency_overrides``). A failing step marks the state failed
+    and stops the warm-up; the error is kept for ``/ready``.
+    """
+    with state._lock:
+        state.status = "running"
+        state.started_at = time.monotonic()
+    try:
+        for name, step in _steps(resolve):
+            start = time.perf_counter()
+            step()
+            with state._lock:
+                state.steps[name] = time.perf_counter() - start
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        with state._lock:
+            state.status = "failed"
+            state.error = str(e)
+            state.finished_at = time.monotonic()
+        return state
+    with state._lock:
+        state.status = "ready"
+        state.finished_at = time.monotonic()
+    print(f"Warm-up finished in {state.finished_at - state.started_at:.2f}s: {state.steps}")
+    return state
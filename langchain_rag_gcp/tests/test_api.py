@@ -1,14 +1,20 @@
 from fastapi.testclient import TestClient
 from langchain_rag_gcp.main import app
-from langchain_rag_gcp.src.dependencies import get_vector_dao, get_llm_service
+from langchain_rag_gcp.src.dependencies import get_vector_dao, get_llm_service, get_answer_cache, get_embedding_service
+from langchain_rag_gcp.src.services.answer_cache import SemanticAnswerCache
 from langchain_rag_gcp.src.services.llm import LocalGenAIService
 from langchain_rag_gcp.src.services.vector_search import LocalVectorStoreService
-from langchain_rag_gcp.src.services.embeddings import LocalEmbeddingService
+from langchain_rag_gcp.src.services.embeddings import CachedEmbeddingService, LocalEmbeddingService
 from langchain_rag_gcp.src.dao.vector_dao import VectorDAO
 import pytest
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def fresh_answer_cache():
+    # Cached answers from one test must not leak into the next
+    get_answer_cache().clear()
+
 # Override dependencies if needed, or rely on the cached local simulation
 # For unit tests, it's often better to override with mocks, but since our services are local simulations, 
 # we can use them directly or lightweight overrides.
@@ -33,3 +39,286 @@ def test_chat_endpoint():
     data = response.json()
     assert data["answer"] == "I am a test bot."
     assert "sources" in data
+
+class CountingVectorService(LocalVectorStoreService):
+    """Local vector service that counts FAISS searches."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.searches = 0
+
+    def similarity_search(self, query, k=4, filter=None):
+        self.searches += 1
+        return super().similarity_search(query, k, filter)
+
+    def _search_by_vector(self, embedding, k, filter=None):
+        self.searches += 1
+        return super()._search_by_vector(embedding, k, filter)
+
+def test_chat_single_retrieval_and_cached_chain(tmp_path):
+    from langchain_core.documents import Document
+    from langchain_rag_gcp.src.api.routes import get_rag_chain
+
+    embed_svc = CachedEmbeddingService(LocalEmbeddingService())
+    vector_svc = CountingVectorService(embed_svc, index_path=str(tmp_path / "index"))
+    vector_svc.add_documents([Document(page_content="RAG combines retrieval and generation.", metadata={"source": "rag.txt"})])
+    vector_dao = VectorDAO(vector_svc)
+    llm_service = LocalGenAIService(responses=["cached answer"])
+
+    app.dependency_overrides[get_embedding_service] = lambda: embed_svc
+    app.dependency_overrides[get_vector_dao] = lambda: vector_dao
+    app.dependency_overrides[get_llm_service] = lambda: llm_service
+    # Disable the semantic cache so both requests reach the chain
+    app.dependency_overrides[get_answer_cache] = lambda: SemanticAnswerCache(max_entries=0)
+    try:
+        first_chain = get_rag_chain(vector_dao, llm_service)
+        for _ in range(2):
+            response = client.post("/api/v1/chat", json={"query": "What is RAG?"})
+            assert response.status_code == 200
+            assert response.json() == {"answer": "cached answer", "sources": ["rag.txt"]}
+
+        # Sources come from the chain's own retrieval: one search per request
+        assert vector_svc.searches == 2
+        # Retrieval reuses the route's query embedding: one lookup per request
+        assert (embed_svc.cache.misses, embed_svc.cache.hits) == (1, 1)
+        # Chain is reused until the index changes
+        assert get_rag_chain(vector_dao, llm_service) is first_chain
+        vector_svc.add_documents([Document(page_content="New content", metadata={"source": "new.txt"})])
+        assert get_rag_chain(vector_dao, llm_service) is not first_chain
+    finally:
+        app.dependency_overrides.clear()
+
+def parse_sse(body: str):
+    import json
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_chat_stream_endpoint(tmp_path):
+    from langchain_core.documents import Document
+
+    embed_svc = LocalEmbeddingService()
+    vector_svc = LocalVectorStoreService(embed_svc, index_path=str(tmp_path / "index"))
+    vector_svc.add_documents([Document(page_content="Streaming context.", metadata={"source": "stream.txt"})])
+    vector_dao = VectorDAO(vector_svc)
+    llm_service = LocalGenAIService(responses=["Tokens arrive one by one."])
+
+    app.dependency_overrides[get_embedding_service] = lambda: embed_svc
+    app.dependency_overrides[get_vector_dao] = lambda: vector_dao
+    app.dependency_overrides[get_llm_service] = lambda: llm_service
+    try:
+        response = client.post("/api/v1/chat/stream", json={"query": "stream?"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = parse_sse(response.text)
+    finally:
+        app.dependency_overrides.clear()
+
+    # Sources first, then tokens, then the metrics
+    assert events[0] == ("sources", {"sources": ["stream.txt"]})
+    tokens = [data["token"] for name, data in events if name == "token"]
+    assert tokens == ["Tokens ", "arrive ", "one ", "by ", "one."]
+    name, done = events[-1]
+    assert name == "done"
+    assert done["tokens"] == 5
+    assert 0 <= done["ttfb_ms"] <= done["time_to_first_token_ms"] <= done["total_ms"]
+
+def test_chat_semantic_cache_hit(tmp_path):
+    from langchain_core.documents import Document
+
+    from langchain_rag_gcp.src.services.embeddings import HashingEmbeddingService
+
+    # Deterministic embeddings: a whitespace-only change maps to the same vector
+    embed_svc = HashingEmbeddingService()
+    vector_svc = CountingVectorService(embed_svc, index_path=str(tmp_path / "index"))
+    vector_svc.add_documents([Document(page_content="Cached context.", metadata={"source": "cache.txt"})])
+    vector_dao = VectorDAO(vector_svc)
+    llm_service = LocalGenAIService(responses=["first answer", "second answer"])
+    answer_cache = SemanticAnswerCache(threshold=0.95)
+
+    app.dependency_overrides[get_embedding_service] = lambda: embed_svc
+    app.dependency_overrides[get_vector_dao] = lambda: vector_dao
+    app.dependency_overrides[get_llm_service] = lambda: llm_service
+    app.dependency_overrides[get_answer_cache] = lambda: answer_cache
+    try:
+        first = client.post("/api/v1/chat", json={"query": "What is cached?"}).json()
+        # Whitespace-normalized repeat: same embedding, served without retrieval or LLM
+        second = client.post("/api/v1/chat", json={"query": "What is  cached? "}).json()
+        assert second == first == {"answer": "first answer", "sources": ["cache.txt"]}
+        assert vector_svc.searches == 1
+        assert answer_cache.stats()["hits"] == 1
+
+        # A new index version invalidates the cached answer
+        vector_svc.add_documents([Document(page_content="More context.", metadata={"source": "more.txt"})])
+        third = client.post("/api/v1/chat", json={"query": "What is cached?"}).json()
+        assert third["answer"] == "second answer"
+    finally:
+        app.dependency_overrides.clear()
+
+def test_chat_batch_endpoint(tmp_path):
+    from langchain_core.documents import Document
+
+    vector_svc = CountingVectorService(LocalEmbeddingService(), index_path=str(tmp_path / "index"))
+    vector_svc.add_documents([Document(page_content="RAG combines retrieval and generation.", metadata={"source": "rag.txt"})])
+    app.dependency_overrides[get_vector_dao] = lambda: VectorDAO(vector_svc)
+    app.dependency_overrides[get_llm_service] = lambda: LocalGenAIService(responses=["one", "two", "three"])
+    try:
+        queries = ["first?", "second?", "third?"]
+        response = client.post("/api/v1/chat/batch", json={"queries": queries, "max_concurrency": 1})
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["query"] for r in data["results"]] == queries
+        # Concurrency 1 answers in request order
+        assert [r["answer"] for r in data["results"]] == ["one", "two", "three"]
+        assert all(r["sources"] == ["rag.txt"] and r["latency_ms"] >= r["generation_ms"] for r in data["results"])
+        # One batched search instead of a search per query
+        assert vector_svc.searches == 0
+
+        assert client.post("/api/v1/chat/batch", json={"queries": []}).status_code == 422
+    finally:
+        app.dependency_overrides = {}
+
+def test_ingestion_jobs_endpoints(tmp_path):
+    import threading
+    import time
+    from langchain_rag_gcp.src.dependencies import get_ingestion_jobs
+    from langchain_rag_gcp.src.dao.document_dao import DocumentDAO
+    from langchain_rag_gcp.src.ingestion.jobs import IngestionJobManager
+    from langchain_rag_gcp.src.ingestion.manifest import IngestionManifest
+    from langchain_rag_gcp.src.ingestion.pipeline import IngestionPipeline
+    from langchain_rag_gcp.src.services.storage import LocalStorageService
+
+    doc_dao = DocumentDAO(LocalStorageService(base_path=str(tmp_path / "raw")))
+    vector_dao = VectorDAO(LocalVectorStoreService(LocalEmbeddingService(), index_path=str(tmp_path / "index")))
+    jobs = IngestionJobManager(
+        IngestionPipeline(doc_dao, vector_dao),
+        manifest=IngestionManifest(str(tmp_path / "index" / "manifest.json")),
+        max_jobs=1, max_workers_per_job=1,
+    )
+    app.dependency_overrides[get_ingestion_jobs] = lambda: jobs
+    try:
+        doc_dao.save_document("kb/a.txt", b"Alpha facts.")
+        doc_dao.save_document("kb/b.txt", b"Beta facts.")
+        doc_dao.save_document("other.txt", b"Not in the job.")
+        response = client.post("/api/v1/ingest/jobs", json={"prefix": "kb/"})
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        assert jobs.wait(job_id, timeout=10)
+        status = client.get(f"/api/v1/ingest/jobs/{job_id}").json()
+        assert status["status"] == "succeeded"
+        assert status["total_files"] == 2 and status["files_done"] == 2 and status["chunks"] == 2
+        # Searchable in the running app, no restart
+        assert vector_dao.count() == 2
+        # A prefix job narrowed to files modified since a checkpoint
+        checkpoint = time.time_ns()
+        time.sleep(0.01)
+        doc_dao.save_document("kb/b.txt", b"Beta facts, revised.")
+        job_id = client.post("/api/v1/ingest/jobs", json={"prefix": "kb/", "changed_since_ns": checkpoint}).json()["id"]
+        assert jobs.wait(job_id, timeout=10)
+        status = client.get(f"/api/v1/ingest/jobs/{job_id}").json()
+        assert status["total_files"] == 1 and status["files_done"] == 1 and vector_dao.count() == 2
+        assert client.get("/api/v1/ingest/jobs/missing").status_code == 404
+        # Only names under the storage root are accepted
+        for name in ["../../../../etc/hostname", "/etc/passwd", "kb/../../x.txt"]:
+            assert client.post("/api/v1/ingest/jobs", json={"files": [name]}).status_code == 422
+
+        # Cancel a running job: it stops between files and keeps what it stored
+        gate, reading = threading.Event(), threading.Event()
+        original = doc_dao.get_document_content
+
+        def slow_read(name):
+            reading.set()
+            gate.wait(10)
+            return original(name)
+
+        doc_dao.get_document_content = slow_read
+        for i in range(3):
+            doc_dao.save_document(f"slow/{i}.txt", f"Slow file {i}.".encode())
+        job_id = client.post("/api/v1/ingest/jobs", json={"files": [f"slow/{i}.txt" for i in range(3)]}).json()["id"]
+        assert reading.wait(10)
+        assert client.delete(f"/api/v1/ingest/jobs/{job_id}").status_code == 200
+        gate.set()
+        assert jobs.wait(job_id, timeout=10)
+        status = client.get(f"/api/v1/ingest/jobs/{job_id}").json()
+        assert status["status"] == "cancelled" and status["files_done"] < 3
+        assert [j["id"] for j in client.get("/api/v1/ingest/jobs").json()][-1] == job_id
+    finally:
+        app.dependency_overrides = {}
+        jobs.shutdown()
+
+def test_metrics_endpoint_reports_stages_and_gauges(tmp_path):
+    import re
+    from langchain_core.documents import Document
+    from langchain_rag_gcp.src.services.metrics import STAGE_SECONDS
+
+    def stage_count(name):
+        return sum(count for labels, (_, _, count) in STAGE_SECONDS.snapshot().items() if labels == (name,))
+
+    embed_svc = LocalEmbeddingService(size=8)
+    vector_svc = LocalVectorStoreService(embed_svc, index_path=str(tmp_path / "index"))
+    vector_svc.add_documents([Document(page_content="Paris is in France", metadata={"source": "geo.txt"})])
+    vector_dao = VectorDAO(vector_svc)
+    app.dependency_overrides[get_embedding_service] = lambda: embed_svc
+    app.dependency_overrides[get_vector_dao] = lambda: vector_dao
+    app.dependency_overrides[get_llm_service] = lambda: LocalGenAIService(responses=["Paris."])
+    stages = ["embed_query", "answer_cache", "retrieve", "format_prompt", "llm", "serialize"]
+    before = {name: stage_count(name) for name in stages}
+    try:
+        response = client.post("/api/v1/chat", json={"query": "Where is Paris?"})
+        assert response.json() == {"answer": "Paris.", "sources": ["geo.txt"]}
+    finally:
+        app.dependency_overrides.clear()
+    assert all(stage_count(name) == before[name] + 1 for name in stages)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE rag_stage_seconds histogram" in body
+    assert re.search(r'rag_stage_seconds_bucket\{stage="llm",le="\+Inf"\} \d+', body)
+    assert re.search(r'rag_service_call_seconds_count\{service="vector_search",operation="search_by_vector"\} \d+', body)
+    # The answer cache singleton exists (see the fixture), so its gauges are exported
+    assert re.search(r"^rag_answer_cache_hit_ratio \S+$", body, re.MULTILINE)
+
+def test_ready_turns_on_after_lifespan_warmup(tmp_path):
+    import threading
+    import time
+    import time
+
+    release = threading.Event()
+    vector_dao = VectorDAO(LocalVectorStoreService(LocalEmbeddingService(), index_path=str(tmp_path)))
+
+    def slow_vector_dao():
+        # Holds the "index" warm-up step until the test has seen /ready fail
+        release.wait(5)
+        return vector_dao
+
+    app.dependency_overrides[get_vector_dao] = slow_vector_dao
+    app.dependency_overrides[get_llm_service] = lambda: LocalGenAIService(responses=["ok"])
+    try:
+        # Without the lifespan hook nothing warms up
+        assert client.get("/ready").status_code == 503
+
+        with TestClient(app) as warm_client:
+            response = warm_client.get("/ready")
+            assert response.status_code == 503
+            assert response.json()["status"] in ("pending", "running")
+
+            release.set()
+            deadline = time.monotonic() + 5
+            while response.status_code != 200 and time.monotonic() < deadline:
+                time.sleep(0.01)
+                response = warm_client.get("/ready")
+            assert response.status_code == 200
+            body = response.json()
+            assert body["status"] == "ready"
+            assert set(body["steps"]) == {"index", "embeddings", "retrieval", "chain"}
+
+            metrics = warm_client.get("/metrics").text
+            assert "rag_ready 1" in metrics
+            assert 'rag_warmup_step_seconds{step="index"}' in metrics
+    finally:
+        release.set()
+        app.dependency_overrides.clear()
@@ -43,3 +43,31 @@ def test_vector_dao(vec_dao):
     # Cleanup
     if os.path.exists("tests/vec_dao_temp"):
         shutil.rmtree("tests/vec_dao_temp")
+
+def test_vector_dao_async_search(vec_dao):
+    import asyncio
+    from langchain_core.documents import Document
+    vec_dao.save_vectors([Document(page_content="async dao test", metadata={"source": "test"})])
+
+    res = asyncio.run(vec_dao.asearch_similar("async", k=1))
+    assert [d.page_content for d in res] == ["async dao test"]
+
+    # Cleanup
+    if os.path.exists("tests/vec_dao_temp"):
+        shutil.rmtree("tests/vec_dao_temp")
+
+def test_vector_dao_batch_search(vec_dao):
+    import asyncio
+    from langchain_core.documents import Document
+    vec_dao.save_vectors([Document(page_content=f"batch doc {i}", metadata={"source": "test"}) for i in range(5)])
+
+    results = vec_dao.search_similar_batch(["a", "b", "c"], k=2)
+    assert [len(docs) for docs in results] == [2, 2, 2]
+    # k larger than the index: padded FAISS slots are dropped
+    results = asyncio.run(vec_dao.asearch_similar_batch(["a", "b"], k=10))
+    assert [len(docs) for docs in results] == [5, 5]
+    assert vec_dao.search_similar_batch([], k=2) == []
+
+    # Cleanup
+    if os.path.exists("tests/vec_dao_temp"):
+        shutil.rmtree("tests/vec_dao_temp")
@@ -1,6 +1,7 @@
 import pytest
 import os
 import shutil
+import time
 from langchain_rag_gcp.src.ingestion.pipeline import IngestionPipeline
 from langchain_rag_gcp.src.dao.document_dao import DocumentDAO
 from langchain_rag_gcp.src.dao.vector_dao import VectorDAO
@@ -50,3 +51,188 @@ def test_ingestion_flow(pipeline_setup):
     results = pipeline.vector_dao.search_similar("important", k=1)
     assert len(results) == 1
     assert "important information" in results[0].page_content
+
+def test_parallel_full_ingestion(pipeline_setup):
+    pipeline, doc_dao = pipeline_setup
+
+    # Several files, small embedding batches so chunks from different files share a batch
+    for i in range(5):
+        doc_dao.save_document(f"doc{i}.txt", f"Document number {i} talks about topic {i}.".encode())
+    doc_dao.save_document("binary.bin", b"\xff\xfe\x00")
+
+    report = pipeline.run_full_ingestion(parallel=True, max_workers=2, embed_batch_size=2)
+
+    assert report.files == 6
+    assert report.failed == 1
+    assert report.chunks == 5
+    assert report.chunks_per_sec > 0
+
+    # Persisted once at the end of the run
+    assert os.path.exists(os.path.join(TEST_VEC_DIR, "CURRENT"))
+    results = pipeline.vector_dao.search_similar("topic", k=10)
+    assert len(results) == 5
+
+def test_incremental_ingestion_with_manifest(pipeline_setup):
+    from langchain_rag_gcp.src.ingestion.manifest import IngestionManifest
+    pipeline, doc_dao = pipeline_setup
+    manifest_path = os.path.join(TEST_VEC_DIR, "manifest.json")
+
+    doc_dao.save_document("a.txt", b"Alpha document content.")
+    doc_dao.save_document("b.txt", b"Beta document content.")
+    report = pipeline.run_full_ingestion(manifest=IngestionManifest(manifest_path))
+    assert report.chunks == 2
+    assert pipeline.vector_dao.count() == 2
+
+    # Re-run with nothing changed: no embedding work, no duplicates
+    report = pipeline.run_full_ingestion(manifest=IngestionManifest(manifest_path))
+    assert report.skipped == 2
+    assert report.chunks == 0
+    assert pipeline.vector_dao.count() == 2
+
+    # Change one file and delete the other
+    doc_dao.save_document("a.txt", b"Alpha document, second revision.")
+    os.remove(os.path.join(TEST_PIPE_DIR, "b.txt"))
+    report = pipeline.run_full_ingestion(manifest=IngestionManifest(manifest_path))
+    assert report.chunks == 1
+    assert report.removed_files == 1
+    assert report.deleted_chunks == 2
+    assert pipeline.vector_dao.count() == 1
+
+    results = pipeline.vector_dao.search_similar("alpha", k=5)
+    assert [d.page_content for d in results] == ["Alpha document, second revision."]
+    manifest = IngestionManifest(manifest_path)
+    assert manifest.files() == ["a.txt"]
+    assert manifest.get_chunk_ids("a.txt") == [results[0].id]
+
+def test_reingesting_file_does_not_duplicate(pipeline_setup):
+    pipeline, doc_dao = pipeline_setup
+    doc_dao.save_document("info.txt", b"Same content twice.")
+
+    first = pipeline.ingest_file("info.txt")
+    second = pipeline.ingest_file("info.txt")
+
+    assert first == second
+    assert pipeline.vector_dao.count() == 1
+
+def test_streaming_ingestion_of_large_files(pipeline_setup):
+    import io
+    from langchain_rag_gcp.src.ingestion.manifest import IngestionManifest
+    from langchain_rag_gcp.src.ingestion.streaming import iter_text, split_stream
+    pipeline, doc_dao = pipeline_setup
+    text = "\n\n".join(f"Paragraph {i}: naïve café entry, status ✓ for record {i}. " * 3 for i in range(200))
+
+    # Tiny reads split multi-byte characters; every chunk still decodes and fits,
+    # and consecutive chunks overlap like a whole-text split
+    streamed = list(split_stream(iter_text(io.BytesIO(text.encode()), read_size=7), pipeline.text_splitter, window=3000))
+    assert all(len(c) <= 1000 and c in text for c in streamed)
+    assert streamed[0] == pipeline.text_splitter.split_text(text)[0]
+    assert streamed[-1].endswith("record 199.")
+
+    pipeline.stream_threshold_bytes = 1
+    pipeline.stream_batch_size = 8
+    doc_dao.save_document("big.log", text.encode())
+    ids = pipeline.ingest_file("big.log")
+    assert len(ids) > 16 and pipeline.vector_dao.count() == len(ids)
+
+    manifest_path = os.path.join(TEST_VEC_DIR, "manifest.json")
+    doc_dao.save_document("bad.log", text.encode()[:20000] + b"\xff\xfe" + text.encode()[20000:])
+    report = pipeline.run_full_ingestion(manifest=IngestionManifest(manifest_path), embed_batch_size=8)
+    assert report.failed == 1
+    # Chunks stored before the invalid bytes were rolled back; big.log is an upsert
+    assert pipeline.vector_dao.count() == len(ids)
+    manifest = IngestionManifest(manifest_path)
+    assert manifest.get_chunk_ids("big.log") == ids
+    assert pipeline.run_full_ingestion(manifest=manifest).skipped == 1
+
+def test_incremental_ingestion_skips_reads_of_unchanged_files(pipeline_setup):
+    from langchain_rag_gcp.src.ingestion.manifest import IngestionManifest
+    pipeline, doc_dao = pipeline_setup
+    manifest_path = os.path.join(TEST_VEC_DIR, "manifest.json")
+    doc_dao.save_document("docs/a.txt", b"Alpha in a subdirectory.")
+    doc_dao.save_document("b.txt", b"Beta at the top level.")
+    report = pipeline.run_full_ingestion(manifest=IngestionManifest(manifest_path))
+    assert report.chunks == 2
+
+    reads = []
+    original = doc_dao.get_document_content
+    doc_dao.get_document_content = lambda name: reads.append(name) or original(name)
+    report = pipeline.run_full_ingestion(manifest=IngestionManifest(manifest_path))
+    # Size and mtime match the manifest: skipped without reading
+    assert report.skipped == 2 and reads == []
+    doc_dao.save_document("docs/a.txt", b"Alpha, edited.")
+    report = pipeline.run_full_ingestion(manifest=IngestionManifest(manifest_path))
+    assert report.chunks == 1 and reads == ["docs/a.txt"]
+
+def test_file_listed_twice_keeps_its_chunks(pipeline_setup):
+    from langchain_rag_gcp.src.ingestion.manifest import IngestionManifest
+    pipeline, doc_dao = pipeline_setup
+    manifest = IngestionManifest(os.path.join(TEST_VEC_DIR, "manifest.json"))
+    doc_dao.save_document("f0.txt", " ".join(f"zero{i}" for i in range(800)).encode())
+    doc_dao.save_document("f1.txt", b"One short file.")
+    f0, f1 = doc_dao.get_document_info("f0.txt"), doc_dao.get_document_info("f1.txt")
+
+    report = pipeline.ingest_files([f0, f1, f0], max_workers=1, manifest=manifest)
+    ids = manifest.get_chunk_ids("f0.txt") + manifest.get_chunk_ids("f1.txt")
+    assert report.files == 2 and report.deleted_chunks == 0
+    assert len(manifest.get_chunk_ids("f0.txt")) > 1
+    assert pipeline.vector_dao.count() == len(ids)
+    assert set(pipeline.vector_dao.vector_service.vector_store.index_to_docstore_id.values()) == set(ids)
+
+def test_manifest_save_excludes_other_runs_unpersisted_files(pipeline_setup):
+    from langchain_rag_gcp.src.ingestion.manifest import IngestionManifest
+    pipeline, doc_dao = pipeline_setup
+    manifest_path = os.path.join(TEST_VEC_DIR, "manifest.json")
+    manifest = IngestionManifest(manifest_path)
+    for name in ("a.txt", "b.txt", "other.txt"):
+        doc_dao.save_document(name, f"Contents of {name}.".encode())
+    a, b, other = (doc_dao.get_document_info(n) for n in ("a.txt", "b.txt", "other.txt"))
+    calls, on_disk = [], []
+
+    def other_job_finishes():
+        # Second check: a.txt is done but its chunks still wait for a full batch
+        calls.append(1)
+        if len(calls) == 2:
+            pipeline.ingest_files([other], max_workers=1, manifest=manifest)
+            on_disk.append(IngestionManifest(manifest_path).files())
+        return False
+
+    pipeline.ingest_files([a, b], max_workers=1, manifest=manifest, should_stop=other_job_finishes)
+    assert on_disk == [["other.txt"]]
+    assert sorted(IngestionManifest(manifest_path).files()) == ["a.txt", "b.txt", "other.txt"]
+    assert pipeline.vector_dao.count() == 3
+
+def test_overlapping_jobs_run_one_at_a_time(pipeline_setup):
+    import threading
+    from langchain_rag_gcp.src.ingestion.jobs import IngestionJobManager
+    from langchain_rag_gcp.src.ingestion.manifest import IngestionManifest
+    pipeline, doc_dao = pipeline_setup
+    manifest = IngestionManifest(os.path.join(TEST_VEC_DIR, "manifest.json"))
+    jobs = IngestionJobManager(pipeline, manifest=manifest, max_jobs=2, max_workers_per_job=1)
+    for name in ("a.txt", "b.txt", "c.txt"):
+        doc_dao.save_document(name, f"Contents of {name}.".encode())
+    gate, reading = threading.Event(), threading.Event()
+    original = doc_dao.get_document_content
+
+    def slow_read(name):
+        reading.set()
+        gate.wait(10)
+        return original(name)
+
+    doc_dao.get_document_content = slow_read
+    try:
+        first = jobs.submit(files=["a.txt", "b.txt", "a.txt"])
+        assert reading.wait(10)
+        second = jobs.submit(files=["b.txt", "c.txt"])
+        time.sleep(0.1)
+        # b.txt is held by the first job
+        assert first.status == "running" and second.status == "queued"
+        gate.set()
+        assert jobs.wait(first.id, timeout=10) and jobs.wait(second.id, timeout=10)
+    finally:
+        gate.set()
+        jobs.shutdown()
+    assert first.status == second.status == "succeeded"
+    assert first.total_files == 2 and second.report.skipped == 1
+    ids = [i for name in ("a.txt", "b.txt", "c.txt") for i in manifest.get_chunk_ids(name)]
+    assert pipeline.vector_dao.count() == len(ids) == 3
+    assert set(pipeline.vector_dao.vector_service.vector_store.index_to_docstore_id.values()) == set(ids)
@@ -31,12 +31,48 @@ def test_storage_service(storage_service):
     files = storage_service.list_files()
     assert filename in files
 
+def test_storage_rejects_names_outside_the_root(storage_service, tmp_path):
+    outside = tmp_path / "secret.txt"
+    outside.write_bytes(b"secret")
+    os.symlink(tmp_path, os.path.join(TEST_DATA_DIR, "link"))
+    for name in ["../secret.txt", "a/../../secret.txt", str(outside), "link/secret.txt", ""]:
+        with pytest.raises(ValueError):
+            storage_service.read_file(name)
+    with pytest.raises(ValueError):
+        storage_service.upload_file("../escaped.txt", b"x")
+    # ".." inside a name is fine; only whole segments are rejected
+    storage_service.upload_file("notes/v1..v2.txt", b"ok")
+    assert storage_service.read_file("notes/v1..v2.txt") == b"ok"
+
 def test_embedding_service():
     service = LocalEmbeddingService()
     embeddings = service.get_embeddings_model()
     vector = embeddings.embed_query("test")
     assert len(vector) == 768
 
+def test_hashing_embedding_service_is_deterministic_and_lexical():
+    import numpy as np
+    from langchain_rag_gcp.src.services.embeddings import HashingEmbeddingService
+    service = HashingEmbeddingService(size=256)
+    embeddings = service.get_embeddings_model()
+    texts = [
+        "The refund for order 1234 was issued",
+        "refund issued for order 1234 yesterday",
+        "Kubernetes pod crashed with an OOM error",
+        "",
+    ]
+    vectors = np.array(embeddings.embed_documents(texts))
+    assert vectors.shape == (4, 256)
+    # Same vectors from a fresh instance, one text at a time
+    again = HashingEmbeddingService(size=256).get_embeddings_model()
+    assert again.embed_query(texts[0]) == pytest.approx(vectors[0].tolist(), abs=1e-6)
+    assert np.linalg.norm(vectors[:3], axis=1) == pytest.approx([1.0, 1.0, 1.0], abs=1e-5)
+    assert not vectors[3].any()
+    # Word overlap drives similarity
+    assert vectors[0] @ vectors[1] > 0.5 > abs(vectors[0] @ vectors[2])
+    assert HashingEmbeddingService(size=256, seed=1).get_embeddings_model().embed_query(texts[0]) != pytest.approx(vectors[0].tolist())
+    assert service.model_name == "hashing-256-0"
+
 def test_vector_store_service():
     # Setup
     embed_svc = LocalEmbeddingService()
@@ -58,3 +94,597 @@ def test_llm_service():
     llm = service.get_llm()
     response = llm.invoke("Hello")
     assert response.content == "Test Response"
+
+def test_vector_store_write_behind_and_recovery():
+    index_path = "tests/vector_wal_temp"
+    if os.path.exists(index_path):
+        shutil.rmtree(index_path)
+    embed_svc = LocalEmbeddingService()
+    vector_svc = LocalVectorStoreService(embed_svc, index_path=index_path, flush_every=3, flush_interval_s=3600)
+
+    # Below the flush threshold: nothing snapshotted, but the append log has it
+    vector_svc.add_documents([Document(page_content="first", id="a"), Document(page_content="second", id="b")])
+    assert not os.path.exists(os.path.join(index_path, "CURRENT"))
+    assert os.path.getsize(os.path.join(index_path, "wal.jsonl")) > 0
+
+    # Simulated crash: a fresh service replays the log
+    recovered = LocalVectorStoreService(embed_svc, index_path=index_path, flush_every=3, flush_interval_s=3600)
+    assert recovered.count() == 2
+
+    # Crossing the threshold writes a snapshot and truncates the log
+    recovered.add_documents([Document(page_content="third", id="c")])
+    assert os.path.exists(os.path.join(index_path, "CURRENT"))
+    assert os.path.getsize(os.path.join(index_path, "wal.jsonl")) == 0
+
+    # Deletes after the snapshot are logged and replayed on top of it
+    recovered.delete_documents(["a"])
+
+    reloaded = LocalVectorStoreService(embed_svc, index_path=index_path)
+    assert reloaded.count() == 2
+    assert sorted(d.page_content for d in reloaded.similarity_search("x", k=5)) == ["second", "third"]
+
+    # Cleanup
+    if os.path.exists(index_path):
+        shutil.rmtree(index_path)
+
+def test_vector_store_log_replay_drops_torn_tail(tmp_path):
+    index_path = str(tmp_path / "index")
+    embed_svc = LocalEmbeddingService()
+    vector_svc = LocalVectorStoreService(embed_svc, index_path=index_path, flush_every=100, flush_interval_s=3600)
+    vector_svc.add_documents([Document(page_content="first", id="a"), Document(page_content="second", id="b")])
+    vector_svc.close()
+    # Crash mid-append: half a record with no newline
+    log_path = os.path.join(index_path, "wal.jsonl")
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "ids": ["x"], "te')
+
+    recovered = LocalVectorStoreService(embed_svc, index_path=index_path, flush_every=100, flush_interval_s=3600)
+    assert recovered.count() == 2
+    # The next write starts on a clean line and survives another restart
+    recovered.add_documents([Document(page_content="third", id="c")])
+    recovered.close()
+    reloaded = LocalVectorStoreService(embed_svc, index_path=index_path, flush_every=100, flush_interval_s=3600)
+    assert reloaded.count() == 3
+    reloaded.close()
+
+def test_llm_service_streams_tokens():
+    service = LocalGenAIService(responses=["Hello streaming world"])
+    llm = service.get_llm()
+    chunks = [chunk.content for chunk in llm.stream("Hi") if chunk.content]
+    assert chunks == ["Hello ", "streaming ", "world"]
+
+def test_cached_embedding_service_lru():
+    from langchain_rag_gcp.src.services.embeddings import CachedEmbeddingService
+    # Room for exactly two 8-dim float32 vectors
+    service = CachedEmbeddingService(LocalEmbeddingService(size=8), max_bytes=2 * 8 * 4)
+    embeddings = service.get_embeddings_model()
+
+    first = embeddings.embed_query("What is  RAG?")
+    # Same text after normalization is a hit and returns the same vector
+    assert embeddings.embed_query(" What is RAG? ") == pytest.approx(first)
+    embeddings.embed_query("second")
+    embeddings.embed_query("What is RAG?")  # refresh LRU position
+    embeddings.embed_query("third")  # evicts "second"
+
+    stats = service.cache.stats()
+    assert stats["entries"] == 2
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+    embeddings.embed_query("second")
+    assert service.cache.stats()["misses"] == 4
+    assert service.model_name == "fake-8"
+
+def test_persistent_embedding_store(tmp_path):
+    from langchain_rag_gcp.src.services.embedding_store import EmbeddingStore, PersistentEmbeddingService
+
+    class CountingEmbeddingService(LocalEmbeddingService):
+        def __init__(self):
+            super().__init__(size=16)
+            self.embedded = 0
+            inner_embed = self.model.embed_documents
+            def embed_documents(texts):
+                self.embedded += len(texts)
+                return inner_embed(texts)
+            object.__setattr__(self.model, "embed_documents", embed_documents)
+
+    base = CountingEmbeddingService()
+    service = PersistentEmbeddingService(base, str(tmp_path))
+    first = service.get_embeddings_model().embed_documents(["alpha", "beta", "alpha"])
+    assert base.embedded == 3
+
+    # A fresh process reopens the store: unchanged texts are never re-embedded
+    base_again = CountingEmbeddingService()
+    reopened = PersistentEmbeddingService(base_again, str(tmp_path))
+    again = reopened.get_embeddings_model().embed_documents(["beta", "alpha", "gamma"])
+    assert base_again.embedded == 1
+    assert again[0] == pytest.approx(first[1])
+    assert again[1] == pytest.approx(first[0])
+    assert len(reopened.store) == 3
+
+    # A torn write (key without its vector) is dropped on open
+    store = EmbeddingStore(str(tmp_path), "fake-16", 16)
+    with open(os.path.join(store.path, "keys.bin"), "ab") as f:
+        f.write(b"x" * 16)
+    assert len(EmbeddingStore(str(tmp_path), "fake-16", 16)) == 3
+
+def test_semantic_answer_cache_threshold_ttl_and_lru():
+    from langchain_rag_gcp.src.services.answer_cache import SemanticAnswerCache
+    cache = SemanticAnswerCache(threshold=0.9, ttl_s=60, max_entries=2)
+
+    cache.store([1.0, 0.0, 0.0], 1, "x-axis", ["x.txt"])
+    cache.store([0.0, 1.0, 0.0], 1, "y-axis", ["y.txt"])
+    # Close paraphrase (cos ~0.995) hits; a different version or direction misses
+    assert cache.lookup([1.0, 0.1, 0.0], 1).answer == "x-axis"
+    assert cache.lookup([1.0, 0.1, 0.0], 2) is None
+    assert cache.lookup([0.7, 0.7, 0.0], 1) is None
+
+    # Full: the least recently used entry ("y-axis") is replaced
+    cache.store([0.0, 0.0, 1.0], 1, "z-axis", ["z.txt"])
+    assert cache.lookup([0.0, 1.0, 0.0], 1) is None
+    assert cache.lookup([0.0, 0.0, 1.0], 1).sources == ["z.txt"]
+
+    expired = SemanticAnswerCache(ttl_s=0)
+    expired.store([1.0, 0.0], 1, "stale", [])
+    assert expired.lookup([1.0, 0.0], 1) is None
+    assert cache.stats()["hits"] == 2
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw", "ivf_pq"])
+def test_vector_store_ann_index_types(tmp_path, index_type):
+    import faiss
+    from langchain_rag_gcp.src.services.ann_index import IndexConfig
+    config = IndexConfig(index_type=index_type, nlist=8, nprobe=8, hnsw_m=8, pq_m=8, pq_nbits=4)
+    embed_svc = LocalEmbeddingService(size=32)
+    vector_svc = LocalVectorStoreService(embed_svc, index_path=str(tmp_path), index_config=config)
+
+    vector_svc.train([f"sample {i}" for i in range(64)])
+    docs = [Document(page_content=f"doc {i}", id=f"id-{i}") for i in range(40)]
+    vector_svc.add_documents(docs)
+    assert vector_svc.count() == 40
+    assert len(vector_svc.similarity_search("query", k=5)) == 5
+
+    # Deletes keep positions and docstore IDs aligned for every index type
+    vector_svc.delete_documents([f"id-{i}" for i in range(0, 40, 2)])
+    vector_svc.flush()
+    reloaded = LocalVectorStoreService(embed_svc, index_path=str(tmp_path), index_config=config)
+    assert reloaded.count() == 20
+    assert type(reloaded.vector_store.index) is type(vector_svc.vector_store.index)
+    found = reloaded.similarity_search("query", k=20)
+    assert sorted(d.id for d in found) == sorted(f"id-{i}" for i in range(1, 40, 2))
+    if index_type == "ivf_flat":
+        assert faiss.extract_index_ivf(reloaded.vector_store.index).nprobe == 8
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq", "hnsw"])
+def test_vector_store_ann_deletes_without_rebuilding(tmp_path, monkeypatch, index_type):
+    from langchain_rag_gcp.src.services import ann_index
+    # nprobe=nlist and a large ef_search: k=100 returns (nearly) the whole corpus
+    config = ann_index.IndexConfig(
+        index_type=index_type, nlist=8, nprobe=8, hnsw_m=32, ef_search=256, pq_m=8, pq_nbits=4
+    )
+    embed_svc = LocalEmbeddingService(size=32)
+    vector_svc = LocalVectorStoreService(embed_svc, index_path=str(tmp_path), index_config=config, flush_every=10**6)
+    vector_svc.train([f"sample {i}" for i in range(64)])
+    vector_svc.add_documents([
+        Document(page_content=f"doc {i}", id=f"id-{i}", metadata={"source": f"s{i % 2}.txt"}) for i in range(100)
+    ])
+    vector_svc.similarity_search("query", k=1, filter={"source": "s0.txt"})
+    rebuilds = []
+    original = ann_index.compact_index
+    monkeypatch.setattr(ann_index, "compact_index", lambda *args: rebuilds.append(1) or original(*args))
+
+    def check(service, expected, **kwargs):
+        found = {d.id for d in service.similarity_search("query", k=100, **kwargs)}
+        # Never a deleted document; HNSW on random vectors may miss a node or two
+        assert found <= set(expected)
+        assert len(found) >= len(expected) - (2 if index_type == "hnsw" and not kwargs else 0)
+
+    vector_svc.delete_documents(["id-0", "id-1", "id-2"])
+    vector_svc.add_documents([Document(page_content="doc 1 again", id="id-1", metadata={"source": "s1.txt"})])
+    live = sorted(f"id-{i}" for i in range(100) if i not in (0, 2))
+    assert rebuilds == [] and vector_svc.count() == 98
+    # IVF drops the vectors right away; HNSW tombstones them
+    assert vector_svc.vector_store.index.ntotal == (101 if index_type == "hnsw" else 98)
+    check(vector_svc, live)
+    check(vector_svc, [i for i in live if int(i[3:]) % 2 == 0], filter={"source": "s0.txt"})
+    # The append log replays to the same state
+    recovered = LocalVectorStoreService(embed_svc, index_path=str(tmp_path), index_config=config)
+    assert recovered.count() == 98
+    check(recovered, live)
+    recovered.close()
+
+    # Past the tombstone threshold HNSW is rebuilt once; IVF never is
+    vector_svc.delete_documents([f"id-{i}" for i in range(10, 40)])
+    live = [i for i in live if not 10 <= int(i[3:]) < 40]
+    assert rebuilds == ([1] if index_type == "hnsw" else [])
+    assert vector_svc.vector_store.index.ntotal == vector_svc.count() == 68
+    check(vector_svc, live)
+    check(vector_svc, [i for i in live if int(i[3:]) % 2 == 1], filter={"source": "s1.txt"})
+    vector_svc.flush()
+    reloaded = LocalVectorStoreService(embed_svc, index_path=str(tmp_path), index_config=config)
+    check(reloaded, live)
+    reloaded.close()
+    vector_svc.close()
+
+def test_vector_store_mmap_snapshot_upgrades_legacy_pickle(tmp_path):
+    from langchain_community.vectorstores import FAISS
+    from langchain_rag_gcp.src.services.docstore import MappedDocstore
+    embed_svc = LocalEmbeddingService(size=32)
+    legacy = FAISS.from_texts(["alpha", "beta"], embed_svc.get_embeddings_model(),
+                              metadatas=[{"source": "a.txt"}, {"source": "b.txt"}], ids=["a", "b"])
+    legacy.save_local(str(tmp_path))
+
+    # Legacy pickle loads, and the next snapshot is written in the columnar format
+    vector_svc = LocalVectorStoreService(embed_svc, index_path=str(tmp_path))
+    vector_svc.add_documents([Document(page_content="gamma", id="c", metadata={"source": "c.txt"})])
+    vector_svc.flush()
+    snapshot = [e for e in os.listdir(tmp_path) if e.startswith("snapshot-")][0]
+    assert sorted(os.listdir(tmp_path / snapshot)) == ["docstore.bin", "index.faiss"]
+    assert not os.path.exists(tmp_path / "index.pkl")
+
+    # Reopened memory-mapped: documents decode lazily, and writes still work
+    reloaded = LocalVectorStoreService(embed_svc, index_path=str(tmp_path))
+    assert isinstance(reloaded.vector_store.docstore, MappedDocstore)
+    found = {d.id: d.metadata["source"] for d in reloaded.similarity_search("query", k=3)}
+    assert found == {"a": "a.txt", "b": "b.txt", "c": "c.txt"}
+    # Deleting unknown IDs (the upsert path) leaves the mapped index in place
+    mapped = reloaded.vector_store.index
+    version = reloaded.index_version
+    reloaded.delete_documents(["missing-1", "missing-2"])
+    assert reloaded.vector_store.index is mapped and reloaded.index_version == version
+    reloaded.delete_documents(["b", "missing-1"])
+    assert reloaded.vector_store.index is not mapped
+    reloaded.add_documents([Document(page_content="delta", id="d")])
+    assert reloaded.vector_store.docstore._added and reloaded.vector_store.docstore._deleted
+    reloaded.flush()
+    # The snapshot just written replaces the old mapping and its overlay
+    docstore = reloaded.vector_store.docstore
+    assert isinstance(docstore, MappedDocstore) and docstore.row_count == 3
+    assert not docstore._added and not docstore._deleted
+    assert os.path.dirname(docstore.path) == str(tmp_path / reloaded.persistence.published_snapshot())
+    assert sorted(d.id for d in reloaded.similarity_search("query", k=5)) == ["a", "c", "d"]
+    final = LocalVectorStoreService(embed_svc, index_path=str(tmp_path))
+    assert sorted(d.id for d in final.similarity_search("query", k=5)) == ["a", "c", "d"]
+
+@pytest.mark.parametrize("index_type,exact_max", [("flat", 10_000), ("flat", 0), ("hnsw", 10_000), ("ivf_flat", 0)])
+def test_vector_store_metadata_filter(tmp_path, monkeypatch, index_type, exact_max):
+    from langchain_rag_gcp.src.services import vector_search
+    from langchain_rag_gcp.src.services.ann_index import IndexConfig
+    # exact_max=0 forces the FAISS ID-selector path instead of the exact subset scan
+    monkeypatch.setattr(vector_search, "FILTER_EXACT_MAX", exact_max)
+    config = IndexConfig(index_type=index_type, nlist=4, nprobe=4, hnsw_m=8)
+    vector_svc = LocalVectorStoreService(LocalEmbeddingService(size=32), index_path=str(tmp_path), index_config=config)
+    vector_svc.add_documents([
+        Document(page_content=f"doc {i}", id=f"id-{i}", metadata={"source": f"s{i % 3}.txt", "tenant": i % 2})
+        for i in range(30)
+    ])
+
+    found = vector_svc.similarity_search("query", k=20, filter={"source": "s1.txt"})
+    assert sorted(d.id for d in found) == sorted(f"id-{i}" for i in range(1, 30, 3))
+    found = vector_svc.similarity_search("query", k=30, filter={"source": ["s0.txt", "s2.txt"], "tenant": 0})
+    assert {d.id for d in found} == {f"id-{i}" for i in range(30) if i % 3 != 1 and i % 2 == 0}
+    assert vector_svc.similarity_search("query", k=5, filter={"source": "missing.txt"}) == []
+
+    # The inverted index follows deletes (positions shift) and later adds
+    vector_svc.delete_documents(["id-1", "id-4"])
+    vector_svc.add_documents([Document(page_content="new", id="new", metadata={"source": "s1.txt"})])
+    found = vector_svc.similarity_search("query", k=20, filter={"source": "s1.txt"})
+    assert sorted(d.id for d in found) == sorted([f"id-{i}" for i in range(7, 30, 3)] + ["new"])
+    retriever = vector_svc.get_retriever(search_kwargs={"k": 2, "filter": {"source": "s2.txt"}})
+    assert all(d.metadata["source"] == "s2.txt" for d in retriever.invoke("query"))
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_vector_store_searches_during_writes(tmp_path, index_type):
+    import threading
+    from langchain_rag_gcp.src.services.ann_index import IndexConfig
+    config = IndexConfig(index_type=index_type, hnsw_m=8)
+    vector_svc = LocalVectorStoreService(
+        LocalEmbeddingService(size=32), index_path=str(tmp_path), index_config=config, flush_every=10**6,
+    )
+    vector_svc.add_documents([
+        Document(page_content=f"seed {i}", id=f"seed-{i}", metadata={"source": f"s{i % 2}.txt"}) for i in range(50)
+    ])
+    done, errors = threading.Event(), []
+
+    def search():
+        try:
+            while not done.is_set():
+                docs = vector_svc.similarity_search("query", k=5)
+                docs += vector_svc.similarity_search("query", k=5, filter={"source": "s1.txt"})
+                docs += vector_svc.hybrid_search("seed", k=5)
+                docs += vector_svc.mmr_search("query", k=3)
+                assert all(isinstance(d, Document) and d.id for d in docs)
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for t in readers:
+        t.start()
+    try:
+        for batch in range(30):
+            ids = [f"b{batch}-{i}" for i in range(20)]
+            vector_svc.add_documents([
+                Document(page_content=f"batch {batch} doc {i}", id=doc_id, metadata={"source": f"s{i % 2}.txt"})
+                for i, doc_id in enumerate(ids)
+            ])
+            vector_svc.delete_documents(ids[:10])
+    finally:
+        done.set()
+        for t in readers:
+            t.join()
+    assert errors == []
+    assert vector_svc.count() == 50 + 30 * 10
+    vector_svc.close()
+
+def test_bm25_index_matches_identifiers_and_tracks_deletes():
+    from langchain_rag_gcp.src.services.lexical_index import BM25Index, reciprocal_rank_fusion
+    index = BM25Index()
+    texts = [f"routine log line {i} about disk usage" for i in range(300)]
+    texts[42] = "disk full error ERR-4711 on node 7"
+    index.add([f"id-{i}" for i in range(300)], texts)
+
+    assert index.search("ERR-4711 disk", k=3)[0][0] == "id-42"
+    # Identifier parts are indexed too
+    assert index.search("4711", k=1)[0][0] == "id-42"
+    index.remove(["id-42"])
+    assert all(doc_id != "id-42" for doc_id, _ in index.search("ERR-4711 disk", k=10))
+    assert len(index) == 299
+
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=2) == ["a", "c"]
+
+def test_bm25_index_after_deleting_most_documents_matches_exhaustive_scoring():
+    import math
+    import random
+    from collections import Counter
+    from langchain_rag_gcp.src.services.lexical_index import BM25Index, tokenize
+    rng = random.Random(7)
+    vocab = [f"w{i}" for i in range(60)]
+    texts = {f"id-{i}": " ".join(rng.choices(vocab, k=rng.randint(5, 40))) for i in range(1000)}
+    index = BM25Index()
+    index.add(list(texts), list(texts.values()))
+    deleted = rng.sample(sorted(texts), 900)
+    for start in range(0, 900, 100):
+        index.remove(deleted[start:start + 100])
+    live = {doc_id: tokenize(text) for doc_id, text in texts.items() if doc_id not in set(deleted)}
+    assert len(index) == len(live) == 100
+
+    avgdl = sum(len(t) for t in live.values()) / len(live)
+    df = Counter(term for tokens in live.values() for term in set(tokens))
+
+    def exhaustive(query, k):
+        scores = {}
+        for doc_id, tokens in live.items():
+            tf = Counter(tokens)
+            score = sum(
+                math.log(1 + (len(live) - df[t] + 0.5) / (df[t] + 0.5))
+                * tf[t] * 2.2 / (tf[t] + 1.2 * (0.25 + 0.75 * len(tokens) / avgdl))
+                for t in set(tokenize(query)) if tf[t]
+            )
+            if score:
+                scores[doc_id] = score
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+    for query in ["w1 w2", "w7 w30 w59", "w13"]:
+        expected = exhaustive(query, 10)
+        found = index.search(query, k=10)
+        assert [doc_id for doc_id, _ in found] == [doc_id for doc_id, _ in expected]
+        assert all(score > 0 and math.isclose(score, want, rel_tol=1e-6) for (_, score), (_, want) in zip(found, expected))
+
+def test_vector_store_hybrid_retriever(tmp_path):
+    vector_svc = LocalVectorStoreService(LocalEmbeddingService(size=32), index_path=str(tmp_path))
+    docs = [Document(page_content=f"general note number {i}", id=f"id-{i}", metadata={"source": "notes.txt"}) for i in range(50)]
+    docs.append(Document(page_content="Refund issued for ticket TCK-90210", id="ticket", metadata={"source": "tickets.txt"}))
+    vector_svc.add_documents(docs)
+
+    # Fake embeddings are random, so only the lexical ranking is meaningful here:
+    # its top hit must survive fusion into the top k
+    retriever = vector_svc.get_retriever(search_type="hybrid", search_kwargs={"k": 3})
+    assert "ticket" in [d.id for d in retriever.invoke("status of TCK-90210")]
+    # Documents added after the lexical index exists are searchable right away
+    vector_svc.add_documents([Document(page_content="Order SKU-31337 shipped", id="order", metadata={"source": "orders.txt"})])
+    assert "order" in [d.id for d in vector_svc.hybrid_search("SKU-31337", k=3)]
+    filtered = vector_svc.hybrid_search("SKU-31337", k=3, filter={"source": "notes.txt"})
+    assert filtered and all(d.metadata["source"] == "notes.txt" for d in filtered)
+    with pytest.raises(ValueError):
+        vector_svc.get_retriever(search_type="unknown")
+
+class SeededEmbeddingService(LocalEmbeddingService):
+    """Deterministic per-text vectors, so two stores can be compared result for result."""
+
+    def get_embeddings_model(self):
+        import hashlib
+        import numpy as np
+        from langchain_core.embeddings import Embeddings
+        size = self.size
+
+        class SeededEmbeddings(Embeddings):
+            def embed_query(self, text):
+                seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+                return np.random.default_rng(seed).normal(size=size).tolist()
+
+            def embed_documents(self, texts):
+                return [self.embed_query(t) for t in texts]
+
+        return SeededEmbeddings()
+
+def test_sharded_vector_store_matches_single_store(tmp_path):
+    from langchain_rag_gcp.src.services.sharded_vector_search import ShardedVectorStoreService
+    embed_svc = SeededEmbeddingService(size=16)
+    single = LocalVectorStoreService(embed_svc, index_path=str(tmp_path / "single"))
+    sharded = ShardedVectorStoreService(embed_svc, index_path=str(tmp_path / "sharded"), num_shards=3)
+    docs = [
+        Document(page_content=f"note {i}", id=f"id-{i}", metadata={"source": f"s{i % 4}.txt"})
+        for i in range(60)
+    ]
+    docs.append(Document(page_content="Refund for ticket TCK-90210", id="ticket", metadata={"source": "s0.txt"}))
+    single.add_documents(docs)
+    sharded.add_documents(docs)
+    assert sharded.count() == 61
+    assert all(shard.count() for shard in sharded.shards)
+
+    def ids(results):
+        return [d.id for d in results]
+
+    # Scatter-gather over exact shards returns exactly the single-index top k
+    for query in ("alpha", "beta", "gamma"):
+        assert ids(sharded.similarity_search(query, k=7)) == ids(single.similarity_search(query, k=7))
+    assert [ids(r) for r in sharded.similarity_search_batch(["alpha", "beta"], k=5)] == \
+        [ids(r) for r in single.similarity_search_batch(["alpha", "beta"], k=5)]
+    filtered = sharded.similarity_search("alpha", k=5, filter={"source": "s1.txt"})
+    assert ids(filtered) == ids(single.similarity_search("alpha", k=5, filter={"source": "s1.txt"}))
+    assert "ticket" in ids(sharded.get_retriever(search_type="hybrid", search_kwargs={"k": 3}).invoke("TCK-90210"))
+
+    version = sharded.index_version
+    sharded.delete_documents(["ticket", "id-1", "missing"])
+    assert sharded.count() == 59 and sharded.index_version != version
+    sharded.persist()
+    reopened = ShardedVectorStoreService(embed_svc, index_path=str(tmp_path / "sharded"), num_shards=3)
+    assert reopened.count() == 59
+    # Placement depends on the shard count, so it can't change under an existing index
+    with pytest.raises(ValueError):
+        ShardedVectorStoreService(embed_svc, index_path=str(tmp_path / "sharded"), num_shards=4)
+
+def test_storage_listing_recursive_paginated_and_changed_since(tmp_path):
+    import time
+    storage = LocalStorageService(base_path=str(tmp_path / "raw"))
+    names = ["a.txt", "a-b.txt", "a/x.txt", "a/y/z.txt", "b/1.log", "b/2.log", "c.txt"]
+    for name in names:
+        storage.upload_file(name, name.encode())
+
+    # Recursive, in plain string order (so "a-b.txt" sorts before "a/...")
+    infos = list(storage.iter_files())
+    assert [i.name for i in infos] == sorted(names)
+    assert all(i.size == len(i.name) for i in infos)
+    assert storage.list_files() == sorted(names)
+    assert [i.name for i in storage.iter_files(prefix="a/")] == ["a/x.txt", "a/y/z.txt"]
+    assert [i.name for i in storage.iter_files(prefix="b/1")] == ["b/1.log"]
+
+    pages, token = [], None
+    while True:
+        page = storage.list_page(page_size=3, page_token=token)
+        pages.append([i.name for i in page.files])
+        token = page.next_page_token
+        if token is None:
+            break
+    assert [n for p in pages for n in p] == sorted(names)
+    assert [len(p) for p in pages] == [3, 3, 1]
+
+    checkpoint = time.time_ns()
+    time.sleep(0.01)
+    storage.upload_file("a/y/z.txt", b"changed")
+    storage.upload_file("d/new.txt", b"new")
+    assert [i.name for i in storage.changed_since(checkpoint)] == ["a/y/z.txt", "d/new.txt"]
+    assert [i.name for i in storage.changed_since(checkpoint, prefix="d/")] == ["d/new.txt"]
+
+    # Writes that bypass upload_file leave directory mtimes alone: an in-place edit
+    # and a file added to an existing nested directory are still found by default
+    checkpoint = time.time_ns()
+    time.sleep(0.01)
+    with open(tmp_path / "raw" / "a" / "x.txt", "r+b") as f:
+        f.write(b"A")
+    os.utime(tmp_path / "raw" / "b", ns=(checkpoint - 1, checkpoint - 1))
+    with open(tmp_path / "raw" / "b" / "3.log", "wb") as f:
+        f.write(b"3")
+    os.utime(tmp_path / "raw" / "b", ns=(checkpoint - 1, checkpoint - 1))
+    assert [i.name for i in storage.changed_since(checkpoint)] == ["a/x.txt", "b/3.log"]
+    # Directory pruning trusts directory mtimes and misses both
+    assert list(storage.changed_since(checkpoint, prune_dirs=True)) == []
+
+def test_context_packer_merges_dedups_and_fits_budget():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from langchain_rag_gcp.src.ingestion.pipeline import IngestionPipeline
+    from langchain_rag_gcp.src.services.context import ContextPacker, estimate_tokens
+
+    text = " ".join(f"word{i % 97} token{i}" for i in range(600))
+    pipeline = IngestionPipeline.__new__(IngestionPipeline)
+    pipeline.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    chunks = pipeline.split_content("a.txt", text.encode("utf-8"))
+    copy = Document(page_content=chunks[5].page_content + " edited", metadata={"source": "b.txt"}, id="other-0")
+    retrieved = [chunks[2], chunks[5], chunks[1], copy, chunks[3]]
+
+    packed = ContextPacker(max_tokens=10_000).pack(retrieved)
+    # Chunks 1-3 become one passage with the shared overlap written once; the copy
+    # of chunk 5 from another file is dropped
+    assert [d.id for d in packed] == [chunks[1].id, chunks[5].id]
+    assert packed[0].page_content in text
+    assert len(packed[0].page_content) < sum(len(c.page_content) for c in chunks[1:4])
+
+    budget = ContextPacker(max_tokens=300).format(retrieved)
+    assert estimate_tokens(budget) <= 300
+    # The best passage comes first, cut at a word boundary
+    assert budget.startswith(chunks[1].page_content[:100]) and text.find(budget) != -1
+
+def test_mmr_retriever_diversifies_and_accepts_a_scorer(tmp_path):
+    import numpy as np
+    from langchain_rag_gcp.src.services.embeddings import HashingEmbeddingService
+    from langchain_rag_gcp.src.services.reranking import TokenOverlapScorer, mmr_select
+    from langchain_rag_gcp.src.services.sharded_vector_search import ShardedVectorStoreService
+
+    docs = [
+        Document(page_content="Refunds are issued within 14 days of the return.", id="dup-0"),
+        Document(page_content="Refunds are issued within 14 days of the return!", id="dup-1"),
+        Document(page_content="Refunds are issued within 14 days of a return.", id="dup-2"),
+        Document(page_content="Store credit refunds arrive instantly after approval.", id="credit"),
+        Document(page_content="Card refunds may take a billing cycle to show.", id="card"),
+        Document(page_content="Our office is closed on public holidays.", id="office"),
+    ]
+    embed_svc = HashingEmbeddingService(size=256)
+    local = LocalVectorStoreService(embed_svc, index_path=str(tmp_path / "local"))
+    local.add_documents(docs)
+    query = "when are refunds issued after a return"
+
+    assert {d.id for d in local.similarity_search(query, k=3)} == {"dup-0", "dup-1", "dup-2"}
+    diverse = local.get_retriever(search_type="mmr", search_kwargs={"k": 3, "fetch_k": 6}).invoke(query)
+    assert diverse[0].id.startswith("dup") and len([d for d in diverse if d.id.startswith("dup")]) == 1
+    assert "office" not in [d.id for d in diverse]
+
+    # A scorer replaces the cosine relevance
+    scored = local.mmr_search("billing cycle card", k=1, fetch_k=6, scorer=TokenOverlapScorer())
+    assert [d.id for d in scored] == ["card"]
+
+    sharded = ShardedVectorStoreService(embed_svc, index_path=str(tmp_path / "sharded"), num_shards=3)
+    sharded.add_documents(docs)
+    assert [d.id for d in sharded.mmr_search(query, k=3, fetch_k=6)] == [d.id for d in diverse]
+
+    # lambda_mult=1 is plain relevance order
+    relevance = np.array([0.2, 0.9, 0.5])
+    assert mmr_select(relevance, np.eye(3), k=3, lambda_mult=1.0) == [1, 2, 0]
+
+def test_shared_index_followers_map_leader_snapshots_and_take_over(tmp_path):
+    import time
+    from langchain_rag_gcp.src.services.embeddings import HashingEmbeddingService
+
+    def wait_for(condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    embed = HashingEmbeddingService()
+    index_path = str(tmp_path / "index")
+    leader = LocalVectorStoreService(embed, index_path=index_path, shared=True, refresh_interval_s=0.01,
+                                     flush_interval_s=3600)
+    follower = LocalVectorStoreService(embed, index_path=index_path, shared=True, refresh_interval_s=0.01)
+    try:
+        assert leader.is_leader and leader.is_writable
+        assert not follower.is_leader and not follower.is_writable
+
+        leader.add_documents([Document(page_content="the invoice was paid", id="a")])
+        # Acknowledged in the log, but followers only see published snapshots
+        assert follower.count() == 0
+        leader.flush()
+        assert wait_for(lambda: follower.count() == 1)
+        assert follower.similarity_search("invoice paid", k=1)[0].id == "a"
+        # The follower serves a read-only mapping of the leader's snapshot
+        assert follower.vector_store.index is follower.persistence._mapped_index
+        with pytest.raises(RuntimeError):
+            follower.add_documents([Document(page_content="rejected", id="x")])
+
+        # Logged but never snapshotted: the new leader must replay it
+        leader.add_documents([Document(page_content="the parcel was shipped", id="b")])
+        leader.close()
+        assert wait_for(lambda: follower.is_leader)
+        assert follower.count() == 2
+        follower.add_documents([Document(page_content="the order was refunded", id="c")])
+        assert follower.similarity_search("order refunded", k=1)[0].id == "c"
+    finally:
+        leader.close()
+        follower.close()